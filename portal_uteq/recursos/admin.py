@@ -1,8 +1,14 @@
 from django.contrib import admin
+from django import forms
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import Carrera, Recurso, Perfil, Valoracion, Mision, MisionDiariaUsuario
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from .models import Carrera, Recurso, Perfil, Valoracion, Mision, MisionDiariaUsuario, CorreoPendiente
 from .forms import CustomUserCreationForm
+from . import importacion
 
 # Define un 'inline' para el modelo Perfil
 class PerfilInline(admin.StackedInline):
@@ -26,6 +32,41 @@ class UserAdmin(BaseUserAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff')
     readonly_fields = ('username',)
 
+    def get_urls(self):
+        return [
+            path(
+                'importar/',
+                self.admin_site.admin_view(self.importar_estudiantes),
+                name='auth_user_importar_estudiantes',
+            ),
+        ] + super().get_urls()
+
+    def importar_estudiantes(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:auth_user_changelist')
+        errores = []
+        form = ImportarEstudiantesForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            # Sin pool de procesos dentro de un worker web (ver importacion.py)
+            creados, errores = importacion.importar(
+                form.cleaned_data['archivo'], procesos=1, enviar_correo=form.cleaned_data['enviar_correo']
+            )
+            self.message_user(request, f"{creados} estudiante(s) importados; {len(errores)} fila(s) omitidas.")
+            if not errores:
+                return redirect('admin:auth_user_changelist')
+        return TemplateResponse(request, 'admin/auth/user/importar_estudiantes.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Importar estudiantes',
+            'form': form,
+            'errores': errores,
+        })
+
+
+class ImportarEstudiantesForm(forms.Form):
+    archivo = forms.FileField(label="Archivo CSV")
+    enviar_correo = forms.BooleanField(label="Enviar el correo de bienvenida", required=False, initial=True)
+
 # Re-registra el UserAdmin de Django
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
@@ -91,3 +132,21 @@ class MisionDiariaUsuarioAdmin(admin.ModelAdmin):
     def has_add_permission(self, request):
         return False
 
+
+@admin.register(CorreoPendiente)
+class CorreoPendienteAdmin(admin.ModelAdmin):
+    list_display = ('asunto', 'estado', 'intentos', 'proximo_intento', 'fecha_creacion', 'fecha_envio')
+    list_filter = ('estado',)
+    search_fields = ('asunto', 'destinatarios')
+    readonly_fields = ('asunto', 'cuerpo', 'remitente', 'destinatarios', 'intentos', 'ultimo_error', 'fecha_creacion', 'fecha_envio')
+    actions = ['reintentar']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description="Reintentar ahora los correos seleccionados")
+    def reintentar(self, request, queryset):
+        actualizados = queryset.exclude(estado=CorreoPendiente.ESTADO_ENVIADO).update(
+            estado=CorreoPendiente.ESTADO_PENDIENTE, intentos=0, proximo_intento=timezone.now()
+        )
+        self.message_user(request, f"{actualizados} correo(s) volverán a enviarse.")
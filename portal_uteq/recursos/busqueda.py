@@ -0,0 +1,166 @@
+# portal_uteq/recursos/busqueda.py
+"""
+Motor de búsqueda de texto completo para los recursos.
+
+Recurso.texto_busqueda guarda nombre, descripción y uso ideal ya normalizados
+(minúsculas y sin tildes, con unidecode). Sobre esa columna cada motor mantiene
+su propio índice, creado en la migración 0018:
+
+- PostgreSQL: columna generada ``busqueda_tsv`` (tsvector) con índice GIN.
+- SQLite: tabla virtual FTS5 ``recursos_recurso_fts``, sincronizada desde las
+  señales de Recurso con indexar_recurso() / desindexar_recurso().
+
+En cualquier otro motor se recurre a un ``icontains`` sobre texto_busqueda.
+
+Los filtros de carrera, tipo y estado van dentro de la misma consulta, antes
+del LIMIT: si se aplicaran después sobre los MAX_RESULTADOS mejores del
+catálogo entero, los resultados de una carrera podrían quedarse fuera.
+"""
+import hashlib
+import re
+
+import unidecode
+from django.core.cache import cache
+from django.db import connection
+
+# Número máximo de IDs que se guardan por consulta (ordenados por relevancia)
+MAX_RESULTADOS = 2000
+CACHE_TIMEOUT = 300
+CACHE_VERSION_KEY = 'busqueda:version'
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def normalizar_texto(texto):
+    """Pasa a minúsculas, quita tildes y colapsa espacios."""
+    return ' '.join(unidecode.unidecode(texto or '').lower().split())
+
+
+def texto_busqueda_de(recurso):
+    return normalizar_texto(' '.join(filter(None, [recurso.nombre, recurso.descripcion, recurso.uso_ideal])))
+
+
+def invalidar_cache():
+    """Invalida todas las búsquedas cacheadas subiendo el número de versión."""
+    try:
+        cache.incr(CACHE_VERSION_KEY)
+    except ValueError:
+        cache.set(CACHE_VERSION_KEY, 1, None)
+
+
+def indexar_recurso(recurso):
+    # En PostgreSQL la columna generada se actualiza sola
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM recursos_recurso_fts WHERE rowid = %s", [recurso.pk])
+        cursor.execute(
+            "INSERT INTO recursos_recurso_fts(rowid, texto_busqueda) VALUES (%s, %s)",
+            [recurso.pk, recurso.texto_busqueda],
+        )
+
+
+def desindexar_recurso(recurso_id):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM recursos_recurso_fts WHERE rowid = %s", [recurso_id])
+
+
+def reconstruir_indice():
+    """
+    Reconstruye el índice completo. Necesario tras cargas con bulk_create o
+    update(), que no disparan las señales.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM recursos_recurso_fts")
+            cursor.execute(
+                "INSERT INTO recursos_recurso_fts(rowid, texto_busqueda) "
+                "SELECT id, texto_busqueda FROM recursos_recurso"
+            )
+    invalidar_cache()
+
+
+def _filtros_sql(carrera_id, tipo, estado):
+    """
+    ``(join, parametros_join, condiciones, parametros_condiciones)`` para
+    filtrar la tabla de recursos, con alias ``r``.
+    """
+    join, parametros_join = '', []
+    if carrera_id is not None:
+        join = " JOIN recursos_recurso_carreras rc ON rc.recurso_id = r.id AND rc.carrera_id = %s"
+        parametros_join.append(carrera_id)
+    condiciones, parametros_condiciones = '', []
+    for columna, valor in (('tipo', tipo), ('estado', estado)):
+        if valor is not None:
+            condiciones += f" AND r.{columna} = %s"
+            parametros_condiciones.append(valor)
+    return join, parametros_join, condiciones, parametros_condiciones
+
+
+def _ids_postgresql(tokens, carrera_id, tipo, estado):
+    consulta = ' & '.join(f'{token}:*' for token in tokens)
+    join, parametros_join, condiciones, parametros_condiciones = _filtros_sql(carrera_id, tipo, estado)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT r.id FROM recursos_recurso r{join}, to_tsquery('spanish', %s) AS consulta "
+            f"WHERE r.busqueda_tsv @@ consulta{condiciones} "
+            "ORDER BY ts_rank(r.busqueda_tsv, consulta) DESC, r.id LIMIT %s",
+            [*parametros_join, consulta, *parametros_condiciones, MAX_RESULTADOS],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def _ids_sqlite(tokens, carrera_id, tipo, estado):
+    # Cada término entre comillas y como prefijo, unidos con AND implícito
+    consulta = ' '.join(f'"{token}"*' for token in tokens)
+    join, parametros_join, condiciones, parametros_condiciones = _filtros_sql(carrera_id, tipo, estado)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            # FTS5 no admite alias en MATCH ni en bm25()
+            "SELECT recursos_recurso_fts.rowid FROM recursos_recurso_fts "
+            f"JOIN recursos_recurso r ON r.id = recursos_recurso_fts.rowid{join} "
+            f"WHERE recursos_recurso_fts MATCH %s{condiciones} "
+            "ORDER BY bm25(recursos_recurso_fts), recursos_recurso_fts.rowid LIMIT %s",
+            [*parametros_join, consulta, *parametros_condiciones, MAX_RESULTADOS],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def _ids_generico(texto, carrera_id, tipo, estado):
+    from .models import Recurso
+    queryset = Recurso.objects.filter(texto_busqueda__icontains=texto)
+    if carrera_id is not None:
+        queryset = queryset.filter(carreras__id=carrera_id)
+    if tipo is not None:
+        queryset = queryset.filter(tipo=tipo)
+    if estado is not None:
+        queryset = queryset.filter(estado=estado)
+    return list(queryset.order_by('pk').values_list('pk', flat=True)[:MAX_RESULTADOS])
+
+
+def buscar_ids(texto, carrera_id=None, tipo=None, estado=None):
+    """
+    Devuelve los IDs de los recursos que coinciden con ``texto`` (y, si se
+    indican, son de esa carrera, tipo y estado), del más al menos relevante.
+    El resultado se cachea por texto normalizado y filtros.
+    """
+    texto = normalizar_texto(texto)
+    tokens = _TOKEN_RE.findall(texto)
+    if not tokens:
+        return []
+
+    version = cache.get_or_set(CACHE_VERSION_KEY, 1, None)
+    huella = hashlib.sha1(f"{' '.join(tokens)}|{carrera_id}|{tipo}|{estado}".encode()).hexdigest()
+    clave = f"busqueda:{version}:{huella}"
+    ids = cache.get(clave)
+    if ids is None:
+        if connection.vendor == 'postgresql':
+            ids = _ids_postgresql(tokens, carrera_id, tipo, estado)
+        elif connection.vendor == 'sqlite':
+            ids = _ids_sqlite(tokens, carrera_id, tipo, estado)
+        else:
+            ids = _ids_generico(texto, carrera_id, tipo, estado)
+        cache.set(clave, ids, CACHE_TIMEOUT)
+    return ids
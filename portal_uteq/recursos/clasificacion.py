@@ -0,0 +1,196 @@
+# portal_uteq/recursos/clasificacion.py
+"""
+Clasificación de puntos, global y por carrera.
+
+En lugar de ordenar todos los perfiles en cada petición, cada proceso guarda
+en memoria, por ámbito (global y cada carrera), una lista ordenada de claves
+``(-puntos, perfil_id)``. La posición de un perfil con P puntos es el número
+de claves con más puntos + 1, que se obtiene con bisect en O(log n); el top N
+es un slice. Los empates comparten posición (1, 2, 2, 4...).
+
+La lista se reconstruye con una sola consulta cuando cambia la versión de la
+caché (``invalidar()``: altas con save() completo, bajas y cambios desde el
+admin) o cuando tiene más de CLASIFICACION_REFRESCO segundos. Esa consulta
+recorre y ordena todos los perfiles, así que una petición que encuentra la
+lista vencida no la reconstruye: responde con la que hay y la reconstrucción
+se hace en request_finished, después de enviar la respuesta (como las
+misiones diferidas de misiones.py). Solo la primera lista del proceso, o una
+llamada fuera de una petición (comandos), se construye al momento. Los puntos que
+se ganan en este proceso (misiones, login) se aplican a la lista al momento
+con ``sumar_puntos()``; los otros workers los verán en su próxima
+reconstrucción. La posición del propio usuario es siempre exacta, porque se
+calcula con sus puntos actuales y no con los de la lista.
+
+Las reconstrucciones sustituyen tablas y nombres juntos bajo ``_lock`` y
+``sumar_puntos()`` modifica las tablas en su sitio, así que las lecturas
+toman una instantánea coherente (``_vigente()``) y recorren la tabla también
+bajo el lock: un hilo que reconstruye a la vez no puede dejar un top con
+perfiles que ya no están en ``perfiles``.
+"""
+import bisect
+from contextvars import ContextVar
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.dispatch import receiver
+
+from . import compartida
+
+logger = logging.getLogger(__name__)
+
+CLAVE_VERSION = 'clasificacion:version'
+
+_estado = {'version': None, 'construida': 0.0, 'global': None, 'carreras': {}, 'perfiles': {}}
+_lock = threading.Lock()
+# Versión que reconstruir al terminar la petición en curso (None: fuera de una petición)
+_pendiente = ContextVar('clasificacion_pendiente', default=None)
+
+
+class Tabla:
+    """Clasificación ordenada de un ámbito (todos los perfiles o una carrera)."""
+    __slots__ = ('claves', 'puntos')
+
+    def __init__(self, filas=()):
+        # filas: (perfil_id, puntos)
+        self.claves = sorted((-puntos, perfil_id) for perfil_id, puntos in filas)
+        self.puntos = {perfil_id: puntos for perfil_id, puntos in filas}
+
+    def __len__(self):
+        return len(self.claves)
+
+    def posicion(self, perfil_id, puntos):
+        """Posición (desde 1) de un perfil con ``puntos``, esté o no en la tabla."""
+        posicion = bisect.bisect_left(self.claves, (-puntos,)) + 1
+        anteriores = self.puntos.get(perfil_id)
+        if anteriores is not None and anteriores > puntos:
+            # La tabla aún tiene su puntuación anterior, más alta: no cuenta
+            posicion -= 1
+        return posicion
+
+    def top(self, n):
+        """Lista de (posicion, perfil_id, puntos) de los ``n`` primeros."""
+        resultado = []
+        for menos_puntos, perfil_id in self.claves[:n]:
+            posicion = bisect.bisect_left(self.claves, (menos_puntos,)) + 1
+            resultado.append((posicion, perfil_id, -menos_puntos))
+        return resultado
+
+    def actualizar(self, perfil_id, puntos):
+        anteriores = self.puntos.get(perfil_id)
+        if anteriores is not None:
+            indice = bisect.bisect_left(self.claves, (-anteriores, perfil_id))
+            del self.claves[indice]
+        bisect.insort(self.claves, (-puntos, perfil_id))
+        self.puntos[perfil_id] = puntos
+
+
+def _nombre(username, first_name, last_name):
+    if first_name:
+        return f"{first_name} {last_name[:1]}.".strip() if last_name else first_name
+    return username
+
+
+def _construir(version):
+    from .models import Perfil
+    filas = Perfil.objects.values_list(
+        'id', 'puntos', 'carrera_id', 'user__username', 'user__first_name', 'user__last_name'
+    )
+    por_carrera = {}
+    todas = []
+    perfiles = {}
+    for perfil_id, puntos, carrera_id, username, first_name, last_name in filas.iterator(chunk_size=5000):
+        todas.append((perfil_id, puntos))
+        if carrera_id is not None:
+            por_carrera.setdefault(carrera_id, []).append((perfil_id, puntos))
+        perfiles[perfil_id] = (_nombre(username, first_name, last_name), carrera_id)
+    with _lock:
+        _estado.update(
+            version=version,
+            construida=time.monotonic(),
+            carreras={carrera_id: Tabla(filas) for carrera_id, filas in por_carrera.items()},
+            perfiles=perfiles,
+        )
+        _estado['global'] = Tabla(todas)
+
+
+def _vigente():
+    """Instantánea de tablas y nombres de la misma reconstrucción."""
+    version = cache.get_or_set(CLAVE_VERSION, lambda: uuid.uuid4().hex, compartida.timeout())
+    refresco = getattr(settings, 'CLASIFICACION_REFRESCO', 120)
+    if _estado['version'] != version or time.monotonic() - _estado['construida'] > refresco:
+        pendiente = _pendiente.get()
+        if pendiente is None or _estado['global'] is None:
+            _construir(version)
+        else:
+            pendiente[:] = [version]
+    with _lock:
+        return dict(_estado)
+
+
+@receiver(request_started)
+def _abrir_peticion(sender, **kwargs):
+    _pendiente.set([])
+
+
+@receiver(request_finished)
+def _reconstruir_pendiente(sender, **kwargs):
+    pendiente = _pendiente.get()
+    _pendiente.set(None)
+    if pendiente:
+        try:
+            _construir(pendiente[0])
+        except Exception:
+            logger.exception("No se pudo reconstruir la clasificación")
+
+
+def _tabla(estado, carrera_id):
+    if carrera_id is None:
+        return estado['global']
+    return estado['carreras'].get(carrera_id) or Tabla()
+
+
+def top(n=10, carrera_id=None):
+    """Lista de dicts con posicion, perfil_id, nombre y puntos de los ``n`` primeros."""
+    estado = _vigente()
+    tabla = _tabla(estado, carrera_id)
+    with _lock:
+        filas = tabla.top(n)
+    return [
+        {'posicion': posicion, 'perfil_id': perfil_id, 'nombre': estado['perfiles'][perfil_id][0], 'puntos': puntos}
+        for posicion, perfil_id, puntos in filas
+    ]
+
+
+def posicion(perfil_id, puntos, carrera_id=None):
+    """``(posicion, total)`` del perfil con sus puntos actuales."""
+    tabla = _tabla(_vigente(), carrera_id)
+    with _lock:
+        total = len(tabla) + (perfil_id not in tabla.puntos)
+        return tabla.posicion(perfil_id, puntos), total
+
+
+def sumar_puntos(perfil_id, puntos):
+    """Aplica a las tablas de este proceso los puntos que acaba de ganar un perfil."""
+    if not puntos or _estado['global'] is None:
+        return
+    with _lock:
+        tabla = _estado['global']
+        anteriores = tabla.puntos.get(perfil_id)
+        if anteriores is None:
+            # Perfil nuevo: entra en la próxima reconstrucción
+            return
+        tabla.actualizar(perfil_id, anteriores + puntos)
+        carrera_id = _estado['perfiles'][perfil_id][1]
+        if carrera_id in _estado['carreras']:
+            _estado['carreras'][carrera_id].actualizar(perfil_id, anteriores + puntos)
+
+
+def invalidar():
+    cache.set(CLAVE_VERSION, uuid.uuid4().hex, compartida.timeout())
+    with _lock:
+        _estado['version'] = None
@@ -0,0 +1,48 @@
+# portal_uteq/recursos/compartida.py
+"""
+¿La caché la comparten todos los procesos?
+
+Varias piezas guardan en la caché estado que tiene que ser el mismo en todos
+los workers: las sesiones (sesiones.py), el buffer de visitas (visitas.py) y
+las versiones que invalidan ETag, roles, listados y el catálogo de misiones
+(condicional.py, roles.py, listados.py, misiones.py). Con Redis (REDIS_URL en
+settings) eso se cumple. Con LocMemCache cada proceso tiene su propia caché,
+así que una invalidación solo llega al worker que la hizo; en ese caso esas
+piezas pasan a un modo seguro:
+
+- las sesiones se leen y escriben solo en la base de datos (un logout en un
+  worker dejaría la sesión viva en la caché de los demás);
+- las visitas se insertan al momento, sin buffer (``vaciar_visitas`` no vería
+  los buffers de los workers y un apagado brusco los perdería);
+- las versiones y los datos cacheados caducan como mucho a los
+  CACHE_LOCAL_TIMEOUT segundos (``timeout()``), que es lo que otro worker
+  puede tardar en ver un cambio.
+
+CACHE_COMPARTIDA fuerza el resultado (por ejemplo, True en un despliegue de
+un solo proceso con LocMemCache).
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+POR_PROCESO = (LocMemCache, DummyCache)
+
+
+def cache_compartida(alias='default'):
+    forzada = getattr(settings, 'CACHE_COMPARTIDA', None)
+    if forzada is not None:
+        return forzada
+    return not isinstance(caches[alias], POR_PROCESO)
+
+
+def timeout(segundos=None, alias='default'):
+    """
+    Timeout para datos que se invalidan desde otro proceso: ``segundos`` (None
+    es sin caducidad) si la caché es compartida y, si no, como mucho
+    CACHE_LOCAL_TIMEOUT.
+    """
+    if cache_compartida(alias):
+        return segundos
+    local = getattr(settings, 'CACHE_LOCAL_TIMEOUT', 30)
+    return local if segundos is None else min(segundos, local)
@@ -0,0 +1,119 @@
+# portal_uteq/recursos/condicional.py
+"""
+GET condicional (ETag / Last-Modified) para las páginas de carreras, listados
+y detalle de recursos.
+
+Un estudiante va y viene entre un listado y el detalle de un recurso, y casi
+siempre vuelve a pedir una página que no ha cambiado. Con GetCondicionalMixin
+la vista calcula primero un ETag a partir de valores baratos (versiones
+guardadas en la caché y, en el detalle, una consulta por índice) y, si
+coincide con el If-None-Match del navegador, responde 304 sin hacer las
+consultas principales ni renderizar la plantilla.
+
+El ETag resume todo lo que puede cambiar la página:
+
+- lo que aporta cada vista en ``partes_etag()`` (versión de la carrera del
+  listado, fecha de actualización y última valoración del recurso...);
+- la versión global, que cambia al guardar o borrar carreras y grupos o al
+  cambiar los permisos de un grupo (menú lateral, lista de carreras);
+- la versión del usuario, que cambia con sus favoritos, su perfil, sus grupos
+  y permisos o sus datos (ver signals.py y toggle_favorite_resource);
+- el secreto CSRF de la cookie, porque la página lleva el token incrustado, y
+  VERSION_DESPLIEGUE, para que un despliegue con plantillas nuevas no sirva
+  páginas antiguas.
+
+Si hay mensajes pendientes (django.contrib.messages) se renderiza siempre,
+porque el 304 los dejaría sin mostrar. Las respuestas llevan
+``Cache-Control: private, no-cache``: el navegador guarda la página pero la
+revalida en cada visita.
+
+Caducidad de las versiones sin caché compartida: ver compartida.py.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import compartida, roles
+
+CLAVE_VERSION_GLOBAL = 'condicional:version'
+CLAVE_VERSION_USUARIO = 'condicional:usuario:{user_id}'
+
+
+def version_global():
+    return cache.get_or_set(CLAVE_VERSION_GLOBAL, lambda: uuid.uuid4().hex, compartida.timeout())
+
+
+def invalidar_todo():
+    cache.set(CLAVE_VERSION_GLOBAL, uuid.uuid4().hex, compartida.timeout())
+
+
+def version_usuario(user_id):
+    return cache.get_or_set(
+        CLAVE_VERSION_USUARIO.format(user_id=user_id), lambda: uuid.uuid4().hex, compartida.timeout()
+    )
+
+
+def invalidar_usuario(user_id):
+    cache.delete(CLAVE_VERSION_USUARIO.format(user_id=user_id))
+
+
+def calcular_etag(request, partes):
+    user = request.user
+    # get_token() fija ya el secreto de la cookie que va a llevar la página (si
+    # no había cookie, se envía con esta respuesta); el token que devuelve está
+    # enmascarado y cambia en cada llamada, así que se usa el secreto
+    get_token(request)
+    comunes = [
+        getattr(settings, 'VERSION_DESPLIEGUE', ''),
+        version_global(),
+        user.pk,
+        version_usuario(user.pk) if user.is_authenticated else '',
+        sorted(roles.grupos_de(user)),
+        request.META['CSRF_COOKIE'],
+    ]
+    huella = hashlib.sha1(repr((comunes, list(partes))).encode()).hexdigest()
+    return f'"{huella}"'
+
+
+class GetCondicionalMixin:
+    """
+    Las vistas definen ``partes_etag()``, que devuelve una lista de valores
+    que identifican el contenido (o None si no se puede decidir sin la vista
+    completa, por ejemplo porque el objeto no existe), y opcionalmente
+    ``ultima_modificacion()``, un datetime para Last-Modified.
+    """
+
+    def partes_etag(self):
+        raise NotImplementedError
+
+    def ultima_modificacion(self):
+        return None
+
+    def get(self, request, *args, **kwargs):
+        partes = None
+        if not len(get_messages(request)):
+            partes = self.partes_etag()
+        if partes is None:
+            respuesta = super().get(request, *args, **kwargs)
+            patch_cache_control(respuesta, private=True, no_cache=True)
+            return respuesta
+
+        etag = calcular_etag(request, partes)
+        ultima = self.ultima_modificacion()
+        ultima = int(ultima.timestamp()) if ultima else None
+        respuesta = get_conditional_response(request, etag=etag, last_modified=ultima)
+        if respuesta is None:
+            respuesta = super().get(request, *args, **kwargs)
+            if respuesta.status_code != 200:
+                return respuesta
+        respuesta['ETag'] = etag
+        if ultima:
+            respuesta['Last-Modified'] = http_date(ultima)
+        patch_cache_control(respuesta, private=True, no_cache=True)
+        return respuesta
@@ -0,0 +1,111 @@
+# portal_uteq/recursos/correo.py
+"""
+Envío de correo a través de la bandeja de salida (CorreoPendiente).
+
+``encolar()`` solo inserta una fila, así que se hace dentro de la transacción
+de la vista: si la transacción se deshace, el correo tampoco sale. El comando
+``enviar_correos`` llama a ``enviar_pendientes()``, que toma un lote de
+correos vencidos, los manda por una única conexión SMTP y reprograma los que
+fallan con espera exponencial (CORREO_ESPERA_BASE * 2^(intentos-1) segundos,
+hasta CORREO_ESPERA_MAXIMA). Tras CORREO_MAX_INTENTOS el correo queda como
+fallido y se puede reintentar desde el admin.
+
+Las filas del lote se bloquean con SELECT ... FOR UPDATE SKIP LOCKED mientras
+se envían, de modo que varios workers pueden trabajar a la vez sin repetir
+correos. La entrega es "al menos una vez": si el proceso muere después de
+enviar y antes de confirmar, ese lote se vuelve a enviar.
+"""
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CorreoPendiente
+
+logger = logging.getLogger(__name__)
+
+
+def encolar(asunto, cuerpo, destinatarios, remitente=None):
+    return CorreoPendiente.objects.create(
+        asunto=asunto,
+        cuerpo=cuerpo,
+        remitente=remitente or settings.DEFAULT_FROM_EMAIL,
+        destinatarios=list(destinatarios),
+    )
+
+
+def espera(intentos):
+    """Tiempo hasta el siguiente intento tras ``intentos`` fallos."""
+    base = getattr(settings, 'CORREO_ESPERA_BASE', 60)
+    maxima = getattr(settings, 'CORREO_ESPERA_MAXIMA', 60 * 60)
+    return timedelta(seconds=min(base * 2 ** (intentos - 1), maxima))
+
+
+def _registrar_fallo(correo, error, ahora):
+    correo.intentos += 1
+    correo.ultimo_error = f'{type(error).__name__}: {error}'[:2000]
+    if correo.intentos >= getattr(settings, 'CORREO_MAX_INTENTOS', 5):
+        correo.estado = CorreoPendiente.ESTADO_FALLIDO
+        logger.error("Correo %s descartado tras %s intentos: %s", correo.pk, correo.intentos, correo.ultimo_error)
+    else:
+        correo.proximo_intento = ahora + espera(correo.intentos)
+
+
+def enviar_pendientes(lote=None, conexion=None):
+    """
+    Envía un lote de correos vencidos. Devuelve ``(enviados, fallidos)``;
+    si ``enviados + fallidos`` es menor que el lote, no quedan más por ahora.
+    """
+    lote = lote or getattr(settings, 'CORREO_LOTE', 50)
+    ahora = timezone.now()
+    enviados = fallidos = 0
+    with transaction.atomic():
+        correos = list(
+            CorreoPendiente.objects.select_for_update(skip_locked=True)
+            .filter(estado=CorreoPendiente.ESTADO_PENDIENTE, proximo_intento__lte=ahora)
+            .order_by('proximo_intento', 'id')[:lote]
+        )
+        if not correos:
+            return 0, 0
+
+        conexion = conexion or get_connection()
+        try:
+            conexion.open()
+        except Exception as error:
+            # Sin servidor no se intenta correo por correo: todo el lote espera
+            logger.warning("No se pudo abrir la conexión de correo: %s", error)
+            for correo in correos:
+                _registrar_fallo(correo, error, ahora)
+            fallidos = len(correos)
+        else:
+            try:
+                for correo in correos:
+                    mensaje = EmailMessage(correo.asunto, correo.cuerpo, correo.remitente, correo.destinatarios)
+                    try:
+                        # Con la conexión ya abierta, send_messages no la cierra
+                        conexion.send_messages([mensaje])
+                    except Exception as error:
+                        _registrar_fallo(correo, error, ahora)
+                        fallidos += 1
+                        # La conexión puede haber quedado inservible tras el error
+                        conexion.close()
+                        try:
+                            conexion.open()
+                        except Exception:
+                            pass
+                    else:
+                        correo.estado = CorreoPendiente.ESTADO_ENVIADO
+                        correo.fecha_envio = timezone.now()
+                        # El cuerpo puede llevar la contraseña temporal: no se conserva
+                        correo.cuerpo = ''
+                        enviados += 1
+            finally:
+                conexion.close()
+
+        CorreoPendiente.objects.bulk_update(
+            correos, ['estado', 'intentos', 'proximo_intento', 'ultimo_error', 'fecha_envio', 'cuerpo']
+        )
+    return enviados, fallidos
@@ -1,11 +1,10 @@
 # portal_uteq/recursos/forms.py
 from django import forms
 from django.contrib.auth.models import User
-import unidecode
 from .models import Recurso, Carrera, Valoracion, Perfil # Importamos Recurso, Carrera, Valoracion y Perfil para los formularios
 
 from django.db import transaction
-import random
+from . import importacion
 
 class CustomUserCreationForm(forms.ModelForm):
     cedula = forms.CharField(max_length=10, label="Cédula", help_text="Tu número de cédula de 10 dígitos.")
@@ -39,42 +38,13 @@ class CustomUserCreationForm(forms.ModelForm):
         user = super().save(commit=False)
 
         # --- Lógica de generación de username (Formato solicitado) ---
+        # Las reglas se comparten con la importación masiva (importacion.py)
         first_name = self.cleaned_data.get('first_name', '')
         last_name = self.cleaned_data.get('last_name', '')
-        email = self.cleaned_data.get('email', '') 
-
-        username = ""
-        if first_name and last_name:
-            # Normalizar nombres para la generación del username
-            normalized_first_name = unidecode.unidecode(first_name.lower())
-            # Separar el apellido en partes (considerando posibles dobles apellidos)
-            normalized_last_name_parts = unidecode.unidecode(last_name.lower()).split()
-
-            if normalized_first_name and normalized_last_name_parts:
-                first_letter_first_name = normalized_first_name[0]
-                first_last_name_part = normalized_last_name_parts[0]
-                
-                if len(normalized_last_name_parts) > 1:
-                    # Si hay un segundo apellido, tomar su primera letra
-                    second_last_name_first_letter = normalized_last_name_parts[1][0]
-                    username = f"{first_letter_first_name}{first_last_name_part}{second_last_name_first_letter}"
-                else:
-                    # Si solo hay un apellido
-                    username = f"{first_letter_first_name}{first_last_name_part}"
-            else:
-                # Fallback si los nombres no se formaron correctamente después de la normalización
-                if email:
-                    username = email.split('@')[0]
-                elif normalized_first_name: # Solo el primer nombre
-                    username = normalized_first_name
-                else: # Generic fallback
-                    username = f"user_{User.objects.count()}"
-        elif email: # Fallback al email si los nombres no son suficientes
-            username = email.split('@')[0]
-        else: # Fallback definitivo
-            username = f"user_{User.objects.count()}"
-
-        # Asegurarse de que el username no esté vacío (debería estar cubierto por la lógica, pero como salvaguarda)
+        email = self.cleaned_data.get('email', '')
+        username = importacion.username_base(first_name, last_name, email)
+
+        # Asegurarse de que el username no esté vacío
         if not username:
              username = f"user_{User.objects.count()}"
 
@@ -89,8 +59,7 @@ class CustomUserCreationForm(forms.ModelForm):
 
         # --- Lógica de generación de contraseña temporal ---
         cedula = self.cleaned_data.get('cedula')
-        random_suffix = random.randint(1000, 9999)
-        temporary_password = f"{cedula}*{random_suffix}"
+        temporary_password = importacion.contrasena_temporal(cedula)
         user.set_password(temporary_password)
 
         if commit:
@@ -0,0 +1,177 @@
+# portal_uteq/recursos/imagenes.py
+"""
+Variantes redimensionadas de las imágenes de Recurso y Carrera.
+
+Las tarjetas muestran las imágenes a 60-200 px de alto, pero el original
+subido puede pesar varios MB. Para cada imagen se ofrecen versiones de
+ANCHOS píxeles de ancho en WebP y JPEG, más un marcador borroso diminuto que
+se ve mientras carga la imagen real:
+
+- Con el almacenamiento de Cloudinary (producción) no se genera nada: las
+  variantes son URLs con transformaciones (``w_480,c_limit,f_webp,q_auto``)
+  que Cloudinary produce y cachea en su CDN.
+- Con el sistema de archivos local (FileSystemStorage) las variantes se
+  generan con Pillow al subir la imagen (señales en signals.py) y se guardan
+  en ``derivados/<ruta del original>/`` junto a un manifest.json.
+- Con cualquier otro almacenamiento se usa el original tal cual.
+
+El resultado de ``variantes()`` se guarda en la caché (el nombre de un
+archivo subido no cambia de contenido), así que la plantilla no toca el
+almacenamiento en cada petición. La etiqueta ``{% imagen_responsiva %}``
+(templatetags/imagenes_extras.py) lo convierte en ``<picture>`` con srcset
+y loading="lazy".
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+import posixpath
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+ANCHOS = (120, 240, 480, 960)
+ANCHO_MARCADOR = 16
+CALIDAD_WEBP = 80
+CALIDAD_JPEG = 82
+DIRECTORIO = 'derivados'
+
+
+def _es_cloudinary(storage):
+    return type(storage).__module__.startswith('cloudinary_storage')
+
+
+def _clave(nombre):
+    return 'imagen:variantes:' + hashlib.sha1(nombre.encode()).hexdigest()
+
+
+def _ruta_derivados(nombre):
+    return posixpath.join(DIRECTORIO, posixpath.splitext(nombre)[0])
+
+
+def _transformar(url, transformacion):
+    """Inserta una transformación en una URL de entrega de Cloudinary."""
+    return url.replace('/upload/', f'/upload/{transformacion}/', 1)
+
+
+def _variantes_cloudinary(imagen):
+    url = imagen.url
+    return {
+        'webp': [(ancho, _transformar(url, f'w_{ancho},c_limit,f_webp,q_auto')) for ancho in ANCHOS],
+        'jpeg': [(ancho, _transformar(url, f'w_{ancho},c_limit,f_jpg,q_auto')) for ancho in ANCHOS],
+        'marcador': _transformar(url, f'w_{ANCHO_MARCADOR},c_limit,e_blur:200,f_jpg,q_30'),
+    }
+
+
+def _leer_manifest(imagen):
+    storage = imagen.storage
+    ruta = posixpath.join(_ruta_derivados(imagen.name), 'manifest.json')
+    try:
+        with storage.open(ruta) as archivo:
+            manifest = json.load(archivo)
+    except (OSError, ValueError):
+        return None
+    return {
+        'webp': [(ancho, storage.url(nombre)) for ancho, nombre in manifest['webp']],
+        'jpeg': [(ancho, storage.url(nombre)) for ancho, nombre in manifest['jpeg']],
+        'marcador': manifest['marcador'],
+        'ancho': manifest['ancho'],
+        'alto': manifest['alto'],
+    }
+
+
+def variantes(imagen):
+    """
+    Diccionario con ``webp`` y ``jpeg`` (listas de ``(ancho, url)`` de menor
+    a mayor), ``marcador`` (URL o data URI) y, si se conocen, ``ancho`` y
+    ``alto`` del original. None si no hay variantes para esta imagen.
+    """
+    if not imagen:
+        return None
+    clave = _clave(imagen.name)
+    resultado = cache.get(clave)
+    if resultado is not None:
+        return resultado or None
+    if _es_cloudinary(imagen.storage):
+        resultado = _variantes_cloudinary(imagen)
+    elif isinstance(imagen.storage, FileSystemStorage):
+        resultado = _leer_manifest(imagen)
+    else:
+        resultado = None
+    # Un {} cacheado evita volver a buscar un manifest que no existe; se
+    # reemplaza al generar las variantes
+    cache.set(clave, resultado or {}, None if resultado else 60 * 15)
+    return resultado
+
+
+def _codificar(imagen, formato, calidad):
+    salida = io.BytesIO()
+    if formato == 'JPEG':
+        imagen.save(salida, 'JPEG', quality=calidad, optimize=True, progressive=True)
+    else:
+        imagen.save(salida, 'WEBP', quality=calidad, method=4)
+    return salida.getvalue()
+
+
+def generar(imagen, forzar=False):
+    """
+    Genera con Pillow las variantes de una imagen en almacenamiento local.
+    Devuelve el resultado de ``variantes()``, o None si el almacenamiento no
+    es local o la imagen no se puede abrir.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    if not imagen or not isinstance(imagen.storage, FileSystemStorage):
+        return None
+    storage = imagen.storage
+    directorio = _ruta_derivados(imagen.name)
+    if not forzar and storage.exists(posixpath.join(directorio, 'manifest.json')):
+        cache.delete(_clave(imagen.name))
+        return variantes(imagen)
+
+    try:
+        with storage.open(imagen.name) as archivo:
+            original = ImageOps.exif_transpose(Image.open(archivo))
+            original.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning("No se pudo abrir la imagen %s para generar variantes", imagen.name)
+        return None
+
+    # JPEG no admite transparencia: se compone sobre fondo blanco
+    if original.mode in ('RGBA', 'LA', 'P'):
+        rgba = original.convert('RGBA')
+        opaca = Image.new('RGB', rgba.size, (255, 255, 255))
+        opaca.paste(rgba, mask=rgba.getchannel('A'))
+    else:
+        rgba = opaca = original.convert('RGB')
+
+    # Nunca se amplía: si el original es pequeño, queda una sola variante de su tamaño
+    anchos = [ancho for ancho in ANCHOS if ancho < original.width] or [original.width]
+    manifest = {'webp': [], 'jpeg': [], 'ancho': original.width, 'alto': original.height}
+    for ancho in anchos:
+        alto = max(round(original.height * ancho / original.width), 1)
+        for formato, fuente, calidad, extension in (
+            ('webp', rgba, CALIDAD_WEBP, 'webp'),
+            ('jpeg', opaca, CALIDAD_JPEG, 'jpg'),
+        ):
+            reducida = fuente.resize((ancho, alto), Image.Resampling.LANCZOS)
+            nombre = posixpath.join(directorio, f'{ancho}.{extension}')
+            if storage.exists(nombre):
+                storage.delete(nombre)
+            storage.save(nombre, ContentFile(_codificar(reducida, formato.upper(), calidad)))
+            manifest[formato].append((ancho, nombre))
+
+    alto_marcador = max(round(original.height * ANCHO_MARCADOR / original.width), 1)
+    marcador = opaca.resize((ANCHO_MARCADOR, alto_marcador), Image.Resampling.BILINEAR)
+    manifest['marcador'] = 'data:image/jpeg;base64,' + base64.b64encode(_codificar(marcador, 'JPEG', 40)).decode()
+
+    ruta_manifest = posixpath.join(directorio, 'manifest.json')
+    if storage.exists(ruta_manifest):
+        storage.delete(ruta_manifest)
+    storage.save(ruta_manifest, ContentFile(json.dumps(manifest).encode()))
+    cache.delete(_clave(imagen.name))
+    return variantes(imagen)
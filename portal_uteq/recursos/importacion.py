@@ -0,0 +1,268 @@
+# portal_uteq/recursos/importacion.py
+"""
+Importación masiva de estudiantes desde CSV.
+
+Sigue las mismas reglas que el registro (CustomUserCreationForm): el username
+sale de ``username_base`` y las colisiones se resuelven añadiendo 1, 2, 3...
+y la contraseña temporal es ``<cédula>*<4 dígitos>``. Cada estudiante recibe
+el correo de bienvenida a través de la bandeja de salida (correo.py).
+
+En lugar de consultar usuario por usuario, cada lote hace una sola consulta
+con los usernames existentes que empiezan por alguna de sus bases, calcula
+los hashes de las contraseñas en varios procesos (PBKDF2 es la parte cara) e
+inserta usuarios, perfiles y correos con bulk_create en una transacción.
+
+Los usernames se eligen antes de insertar, así que un registro simultáneo
+puede ocupar alguno: si la inserción del lote falla por integridad, se
+vuelven a resolver los usernames (y se descartan las cédulas registradas
+mientras tanto) y se reintenta; tras INTENTOS_LOTE fallos el lote se informa
+como error y la importación sigue con el siguiente.
+
+Desde el admin los hashes se calculan en el propio worker web (procesos=1):
+un ProcessPoolExecutor por petición competiría con los demás workers. Para
+archivos grandes está el comando ``importar_estudiantes``.
+
+Formato del CSV (con cabecera, separado por comas o punto y coma):
+``nombres,apellidos,email,cedula,carrera``; la carrera puede ser su nombre
+o su ID.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import io
+from itertools import islice
+import os
+import random
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+import unidecode
+
+from .models import Carrera, CorreoPendiente, Perfil
+
+COLUMNAS = ('nombres', 'apellidos', 'email', 'cedula', 'carrera')
+LOTE = 500  # Con más bases, la consulta de prefijos supera la profundidad máxima de SQLite
+MAX_USERNAME = User._meta.get_field('username').max_length - 10
+INTENTOS_LOTE = 3
+
+
+def username_base(first_name, last_name, email):
+    """
+    Username sin resolver colisiones: inicial del nombre, primer apellido e
+    inicial del segundo apellido, todo en minúsculas y sin tildes. Si no se
+    puede formar, la parte local del email; '' si tampoco hay email.
+    """
+    nombre = unidecode.unidecode((first_name or '').lower())
+    apellidos = unidecode.unidecode((last_name or '').lower()).split()
+    if first_name and last_name and nombre and apellidos:
+        username = f"{nombre[0]}{apellidos[0]}"
+        if len(apellidos) > 1:
+            username += apellidos[1][0]
+        return username
+    if email:
+        return email.split('@')[0]
+    if first_name and last_name and nombre:
+        return nombre
+    return ''
+
+
+def contrasena_temporal(cedula):
+    return f"{cedula}*{random.randint(1000, 9999)}"
+
+
+def leer_csv(archivo):
+    """
+    Devuelve ``(filas, errores)``. Cada fila es ``(linea, datos)`` y cada
+    error ``(linea, mensaje)``. ``archivo`` es texto o un archivo binario.
+    """
+    if not isinstance(archivo, io.TextIOBase):
+        archivo = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = archivo.read(4096)
+    archivo.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.DictReader(archivo, dialect=dialecto)
+    cabecera = [columna.strip().lower() for columna in lector.fieldnames or []]
+    faltantes = [columna for columna in COLUMNAS if columna not in cabecera]
+    if faltantes:
+        return [], [(1, f"Faltan columnas: {', '.join(faltantes)}")]
+    lector.fieldnames = cabecera
+
+    filas, errores = [], []
+    for linea, fila in enumerate(lector, start=2):
+        datos = {columna: (fila.get(columna) or '').strip() for columna in COLUMNAS}
+        if not any(datos.values()):
+            continue
+        if not datos['nombres'] or not datos['apellidos']:
+            errores.append((linea, "Faltan nombres o apellidos."))
+        elif not datos['cedula'] or len(datos['cedula']) > 10:
+            errores.append((linea, "La cédula debe tener hasta 10 caracteres."))
+        else:
+            if datos['email']:
+                try:
+                    validate_email(datos['email'])
+                except ValidationError:
+                    errores.append((linea, f"Email no válido: {datos['email']}"))
+                    continue
+            filas.append((linea, datos))
+    return filas, errores
+
+
+def _resolver_carreras(filas, errores):
+    carreras = list(Carrera.objects.values_list('pk', 'nombre'))
+    por_nombre = {nombre.lower(): pk for pk, nombre in carreras}
+    por_id = {str(pk): pk for pk, _ in carreras}
+    validas = []
+    for linea, datos in filas:
+        valor = datos['carrera']
+        carrera_id = por_id.get(valor) or por_nombre.get(valor.lower())
+        if valor and carrera_id is None:
+            errores.append((linea, f"Carrera desconocida: {valor}"))
+            continue
+        validas.append((linea, datos, carrera_id))
+    return validas
+
+
+def _descartar_cedulas_repetidas(filas, errores):
+    vistas = set()
+    unicas = []
+    for linea, datos, carrera_id in filas:
+        if datos['cedula'] in vistas:
+            errores.append((linea, f"Cédula repetida en el archivo: {datos['cedula']}"))
+        else:
+            vistas.add(datos['cedula'])
+            unicas.append((linea, datos, carrera_id))
+    registradas = set()
+    for desde in range(0, len(unicas), LOTE):
+        cedulas = [datos['cedula'] for _, datos, _ in unicas[desde:desde + LOTE]]
+        registradas.update(Perfil.objects.filter(cedula__in=cedulas).values_list('cedula', flat=True))
+    for linea, datos, _ in unicas:
+        if datos['cedula'] in registradas:
+            errores.append((linea, f"Esta cédula ya ha sido registrada: {datos['cedula']}"))
+    return [fila for fila in unicas if fila[1]['cedula'] not in registradas]
+
+
+def asignar_usernames(bases):
+    """
+    Usernames libres para ``bases`` (en orden), con una única consulta de los
+    usernames existentes que empiezan por alguna de las bases.
+    """
+    distintas = set(bases)
+    if not distintas:
+        return []
+    prefijos = Q()
+    for base in distintas:
+        prefijos |= Q(username__startswith=base)
+    ocupados = set(User.objects.filter(prefijos).values_list('username', flat=True))
+    siguiente = {}
+    usernames = []
+    for base in bases:
+        username = base
+        if username in ocupados:
+            contador = siguiente.get(base, 1)
+            while f"{base}{contador}" in ocupados:
+                contador += 1
+            username = f"{base}{contador}"
+            siguiente[base] = contador + 1
+        ocupados.add(username)
+        usernames.append(username)
+    return usernames
+
+
+def _importar_lote(lote, pool, enviar_correo, errores):
+    contrasenas = [contrasena_temporal(datos['cedula']) for _, datos, _ in lote]
+    if pool is None:
+        hashes = list(map(make_password, contrasenas))
+    else:
+        hashes = list(pool.map(make_password, contrasenas, chunksize=16))
+    filas = list(zip(lote, contrasenas, hashes))
+
+    for intento in range(INTENTOS_LOTE):
+        if intento:
+            # Otro proceso pudo registrar alguna de las cédulas entretanto
+            registradas = set(Perfil.objects.filter(
+                cedula__in=[datos['cedula'] for (_, datos, _), _, _ in filas]
+            ).values_list('cedula', flat=True))
+            for (linea, datos, _), _, _ in filas:
+                if datos['cedula'] in registradas:
+                    errores.append((linea, f"Esta cédula ya ha sido registrada: {datos['cedula']}"))
+            filas = [fila for fila in filas if fila[0][1]['cedula'] not in registradas]
+            if not filas:
+                return 0
+        try:
+            return _insertar_lote(filas, enviar_correo)
+        except IntegrityError:
+            continue
+    for (linea, _, _), _, _ in filas:
+        errores.append((linea, f"No se pudo importar el lote tras {INTENTOS_LOTE} intentos; vuelva a importar la fila."))
+    return 0
+
+
+def _insertar_lote(filas, enviar_correo):
+    bases = [
+        (username_base(datos['nombres'], datos['apellidos'], datos['email']) or f"user_{datos['cedula']}")[:MAX_USERNAME]
+        for (_, datos, _), _, _ in filas
+    ]
+    usuarios = [
+        User(
+            username=username, first_name=datos['nombres'], last_name=datos['apellidos'],
+            email=datos['email'], password=hash_contrasena,
+        )
+        for ((_, datos, _), _, hash_contrasena), username in zip(filas, asignar_usernames(bases))
+    ]
+    with transaction.atomic():
+        User.objects.bulk_create(usuarios)
+        Perfil.objects.bulk_create([
+            Perfil(user_id=user.pk, cedula=datos['cedula'], carrera_id=carrera_id)
+            for ((_, datos, carrera_id), _, _), user in zip(filas, usuarios)
+        ])
+        if enviar_correo:
+            asunto = render_to_string('registration/email_subject.txt').strip()
+            CorreoPendiente.objects.bulk_create([
+                CorreoPendiente(
+                    asunto=asunto,
+                    cuerpo=render_to_string('registration/email_body.txt', {
+                        'user': user, 'temporary_password': contrasena,
+                    }),
+                    remitente='no-reply@uteq.edu.ec',
+                    destinatarios=[user.email],
+                )
+                for user, (_, contrasena, _) in zip(usuarios, filas) if user.email
+            ])
+    return len(usuarios)
+
+
+def importar(archivo, procesos=None, enviar_correo=True, progreso=None):
+    """
+    Importa los estudiantes del CSV. Devuelve ``(creados, errores)``; las
+    filas con errores se omiten y el resto se importa igualmente.
+    ``progreso(creados, total)`` se llama tras cada lote.
+    """
+    filas, errores = leer_csv(archivo)
+    filas = _descartar_cedulas_repetidas(_resolver_carreras(filas, errores), errores)
+    if procesos is None:
+        procesos = getattr(settings, 'IMPORTACION_PROCESOS', None) or os.cpu_count() or 1
+
+    creados = 0
+    pool = None
+    if procesos > 1 and len(filas) > 1:
+        pool = ProcessPoolExecutor(max_workers=procesos, initializer=django.setup)
+    try:
+        iterador = iter(filas)
+        while lote := list(islice(iterador, LOTE)):
+            creados += _importar_lote(lote, pool, enviar_correo, errores)
+            if progreso:
+                progreso(creados, len(filas))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    errores.sort()
+    return creados, errores
@@ -0,0 +1,297 @@
+# portal_uteq/recursos/listados.py
+"""
+Páginas de los listados de recursos por carrera.
+
+Cada página es una consulta keyset sobre los índices parciales de Recurso:
+``WHERE clave < cursor ORDER BY clave DESC LIMIT n``, con la clave
+(puntuación,) fecha_creacion, id. La parte común a todos los usuarios (los
+IDs de una página de una carrera, tipo y orden) se guarda en caché bajo una
+clave que incluye una versión por carrera, igual que el conteo aproximado
+que usa la paginación clásica. Las señales cambian esa versión cuando se
+guarda o borra un recurso, cambian sus carreras (incluido el paso de estado)
+o cambian sus valoraciones; actualizar_tendencias la cambia cuando recalcula
+las puntuaciones de popularidad y tendencia.
+
+Los favoritos de cada usuario van primero: se paginan con su propia consulta
+keyset (acotada a sus favoritos) y, cuando se acaban, se sigue con las
+páginas comunes descartando los favoritos que aparezcan en ellas. Con
+búsqueda el orden es la relevancia y la lista es la que devuelve busqueda.py,
+acotada a MAX_RESULTADOS.
+
+Caducidad sin caché compartida: ver compartida.py.
+"""
+from datetime import datetime
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from django.db.models import F, FloatField, ExpressionWrapper, Q, Value
+from django.db.models.functions import Coalesce, NullIf
+
+from . import busqueda, compartida
+from .paginacion import desde_microsegundos, microsegundos
+
+CACHE_TIMEOUT = 60 * 15
+
+# Órdenes por una puntuación precalculada (con índice parcial en Recurso);
+# populares y tendencia las mantiene actualizar_tendencias (ver tendencias.py)
+ORDEN_PUNTUACION = {
+    'valorados': 'puntuacion_bayesiana',
+    'populares': 'puntuacion_popularidad',
+    'tendencia': 'puntuacion_tendencia',
+}
+
+
+def _clave_version(carrera_id):
+    return f'listado:version:{carrera_id}'
+
+
+def version_carrera(carrera_id):
+    return cache.get_or_set(_clave_version(carrera_id), lambda: uuid.uuid4().hex, compartida.timeout())
+
+
+def invalidar_carreras(carrera_ids):
+    cache.set_many(
+        {_clave_version(carrera_id): uuid.uuid4().hex for carrera_id in carrera_ids}, compartida.timeout()
+    )
+
+
+def invalidar_recurso(recurso_id):
+    """Invalida los listados de todas las carreras a las que pertenece el recurso."""
+    from .models import Recurso
+    carrera_ids = Recurso.carreras.through.objects.filter(recurso_id=recurso_id).values_list('carrera_id', flat=True)
+    invalidar_carreras(list(carrera_ids))
+
+
+def anotar_promedio(queryset):
+    """El promedio sale de los contadores desnormalizados, sin JOIN con Valoracion."""
+    return queryset.annotate(
+        avg_rating=Coalesce(
+            ExpressionWrapper(
+                F('suma_puntuaciones') * 1.0 / NullIf(F('num_valoraciones'), 0),
+                output_field=FloatField()
+            ),
+            Value(0.0)
+        )
+    )
+
+
+def _campos(sort_by):
+    """Columnas de la clave de ordenación (todas descendentes)."""
+    if sort_by in ORDEN_PUNTUACION:
+        return [ORDEN_PUNTUACION[sort_by], 'fecha_creacion', 'id']
+    return ['fecha_creacion', 'id']  # 'recientes' o cualquier otro valor
+
+
+def _clave_valida(clave, longitud):
+    return (
+        clave is not None and len(clave) == longitud
+        and all(isinstance(valor, (int, float)) and not isinstance(valor, bool) for valor in clave)
+        and all(isinstance(valor, int) for valor in clave[-2:])
+    )
+
+
+def _despues_de(queryset, campos, clave, limite):
+    """
+    Hasta ``limite`` entradas ``(id, clave)`` de ``queryset`` con clave menor
+    que ``clave``, en orden descendente. Las fechas van en microsegundos.
+    """
+    if clave is not None:
+        filtro, iguales = Q(), {}
+        for campo, valor in zip(campos, clave):
+            if campo == 'fecha_creacion':
+                valor = desde_microsegundos(valor)
+            filtro |= Q(**iguales, **{f'{campo}__lt': valor})
+            iguales[campo] = valor
+        queryset = queryset.filter(filtro)
+    filas = queryset.order_by(*(f'-{campo}' for campo in campos)).values_list('pk', *campos)[:limite]
+    return [
+        (pk, tuple(microsegundos(valor) if isinstance(valor, datetime) else valor for valor in clave))
+        for pk, *clave in filas
+    ]
+
+
+def _aprobados(carrera_id, tipo):
+    from .models import Recurso
+    return Recurso.objects.filter(carreras__id=carrera_id, tipo=tipo, estado=Recurso.ESTADO_APROBADO)
+
+
+def _ranking(carrera_id, tipo, query):
+    from .models import Recurso
+    # La carrera, el tipo y el estado se filtran en la propia búsqueda
+    return busqueda.buscar_ids(query, carrera_id=carrera_id, tipo=tipo, estado=Recurso.ESTADO_APROBADO)
+
+
+def _clave_cache(carrera_id, *partes):
+    huella = hashlib.sha1('|'.join(str(parte) for parte in partes).encode()).hexdigest()
+    return f'listado:{carrera_id}:{version_carrera(carrera_id)}:{huella}'
+
+
+def entradas_listado(carrera_id, tipo, sort_by, query='', despues_de=None, limite=100):
+    """
+    Hasta ``limite`` entradas ``(id, clave)`` de los recursos aprobados del
+    listado que siguen a la clave ``despues_de``, en el orden común a todos
+    los usuarios (descendente por ``clave``). La clave sirve de cursor para la
+    paginación keyset (ver paginacion.py); con búsqueda es ``(-posición, id)``.
+    """
+    query = busqueda.normalizar_texto(query)
+    campos = [] if query else _campos(sort_by)
+    if not _clave_valida(despues_de, len(campos) or 2):
+        despues_de = None
+    clave = _clave_cache(carrera_id, tipo, sort_by, query, despues_de, limite)
+    entradas = cache.get(clave)
+    if entradas is not None:
+        return entradas
+
+    if query:
+        inicio = 1 - despues_de[0] if despues_de is not None else 0
+        ranking = _ranking(carrera_id, tipo, query)
+        entradas = [(pk, (-posicion, pk)) for posicion, pk in enumerate(ranking[inicio:inicio + limite], inicio)]
+    else:
+        entradas = _despues_de(_aprobados(carrera_id, tipo), campos, despues_de, limite)
+    cache.set(clave, entradas, compartida.timeout(CACHE_TIMEOUT))
+    return entradas
+
+
+def contar_listado(carrera_id, tipo, query=''):
+    """Número de recursos del listado, cacheado como las páginas (puede ir algo atrasado)."""
+    query = busqueda.normalizar_texto(query)
+    clave = _clave_cache(carrera_id, tipo, 'conteo', query)
+    total = cache.get(clave)
+    if total is None:
+        total = len(_ranking(carrera_id, tipo, query)) if query else _aprobados(carrera_id, tipo).count()
+        cache.set(clave, total, compartida.timeout(CACHE_TIMEOUT))
+    return total
+
+
+class ListadoRecursos:
+    """
+    Listado perezoso de una carrera y tipo, con los favoritos de ``perfil_id``
+    primero. El modo cursor pide una página con pagina_despues_de(); el
+    Paginator de ``?page=N`` solo pide len() y un slice. En ambos casos se
+    hace una única consulta con los recursos visibles.
+
+    El cursor es ``(fase, *clave)``: fase 1 mientras quedan favoritos y 0 en
+    el resto, así que sigue siendo descendente en todo el listado.
+    """
+
+    def __init__(self, carrera_id, tipo, sort_by, query='', perfil_id=None):
+        self.carrera_id = carrera_id
+        self.tipo = tipo
+        self.sort_by = sort_by
+        self.query = busqueda.normalizar_texto(query)
+        self.perfil_id = perfil_id
+        self.campos = _campos(sort_by)
+
+    def __len__(self):
+        return self.count()
+
+    def count(self):
+        return contar_listado(self.carrera_id, self.tipo, self.query)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            inicio, fin, _ = indice.indices(self.count())
+            return self._cargar(*self._porcion(inicio, fin))
+        return self[indice:indice + 1][0]
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def _favoritos(self):
+        return _aprobados(self.carrera_id, self.tipo).filter(favorito_de__id=self.perfil_id)
+
+    def _ids_favoritos(self, ids):
+        """Los de ``ids`` que son favoritos del perfil."""
+        from .models import Perfil
+        if self.perfil_id is None or not ids:
+            return set()
+        return set(
+            Perfil.recursos_favoritos.through.objects.filter(perfil_id=self.perfil_id, recurso_id__in=ids)
+            .values_list('recurso_id', flat=True)
+        )
+
+    def _busqueda(self):
+        """Entradas ``(id, (fase, -posición, id))`` de la búsqueda, favoritos primero."""
+        ranking = _ranking(self.carrera_id, self.tipo, self.query)
+        favoritos = set(self._favoritos().values_list('pk', flat=True)) if self.perfil_id is not None else set()
+        entradas = [(pk, (int(pk in favoritos), -posicion, pk)) for posicion, pk in enumerate(ranking)]
+        return sorted(entradas, key=lambda entrada: entrada[1], reverse=True)
+
+    def _porcion(self, inicio, fin):
+        """``(ids, favoritos)`` de las posiciones ``inicio:fin`` (paginación clásica)."""
+        if self.query:
+            entradas = self._busqueda()[inicio:fin]
+            return [pk for pk, _ in entradas], {pk for pk, clave in entradas if clave[0]}
+        orden = [f'-{campo}' for campo in self.campos]
+        favoritos = self._favoritos() if self.perfil_id is not None else None
+        num_favoritos = favoritos.count() if favoritos is not None else 0
+        ids = []
+        if inicio < num_favoritos:
+            ids += favoritos.order_by(*orden).values_list('pk', flat=True)[inicio:min(fin, num_favoritos)]
+        favoritos_mostrados = set(ids)
+        if fin > num_favoritos:
+            resto = _aprobados(self.carrera_id, self.tipo)
+            if favoritos is not None:
+                resto = resto.exclude(pk__in=favoritos.values('pk'))
+            ids += resto.order_by(*orden).values_list('pk', flat=True)[max(inicio - num_favoritos, 0):fin - num_favoritos]
+        return ids, favoritos_mostrados
+
+    def _resto(self, clave, limite, favoritos=None):
+        """
+        Entradas comunes tras ``clave`` que no son favoritos del perfil. Si
+        ya se conocen todos sus favoritos (``favoritos``), no se consultan.
+        """
+        resultado = []
+        while len(resultado) < limite:
+            bloque = entradas_listado(self.carrera_id, self.tipo, self.sort_by, despues_de=clave, limite=limite)
+            descartados = favoritos if favoritos is not None else self._ids_favoritos([pk for pk, _ in bloque])
+            resultado += [(pk, (0,) + clave_bloque) for pk, clave_bloque in bloque if pk not in descartados]
+            if len(bloque) < limite:
+                break
+            clave = bloque[-1][1]
+        return resultado[:limite]
+
+    def pagina_despues_de(self, cursor, tamano):
+        """Devuelve (recursos, clave_siguiente) para la página que sigue a ``cursor``."""
+        longitud = 3 if self.query else 1 + len(self.campos)
+        if not (_clave_valida(cursor, longitud) and cursor[0] in (0, 1)):
+            # Un cursor de otro orden o con otra forma empieza desde el principio
+            cursor = None
+        if self.query:
+            entradas = self._busqueda()
+            inicio = 0 if cursor is None else next(
+                (i for i, (_, clave) in enumerate(entradas) if clave < tuple(cursor)), len(entradas)
+            )
+            entradas = entradas[inicio:inicio + tamano + 1]
+        else:
+            fase, clave = (1, None) if cursor is None else (cursor[0], tuple(cursor[1:]))
+            entradas, favoritos = [], None
+            if fase == 1 and self.perfil_id is not None:
+                entradas = [
+                    (pk, (1,) + clave_favorito)
+                    for pk, clave_favorito in _despues_de(self._favoritos(), self.campos, clave, tamano + 1)
+                ]
+                if clave is None:
+                    # Desde el principio y sin llenar la página: son todos sus favoritos
+                    favoritos = {pk for pk, _ in entradas}
+            if fase == 1:
+                clave = None
+                if self.perfil_id is None:
+                    favoritos = set()
+            if len(entradas) <= tamano:
+                entradas += self._resto(clave, tamano + 1 - len(entradas), favoritos)
+        pagina = entradas[:tamano]
+        siguiente = tuple(pagina[-1][1]) if len(entradas) > tamano else None
+        return self._cargar([pk for pk, _ in pagina], {pk for pk, clave in pagina if clave[0]}), siguiente
+
+    def _cargar(self, ids, favoritos):
+        from .models import Recurso
+        recursos = anotar_promedio(Recurso.objects.filter(pk__in=ids)).in_bulk()
+        resultado = []
+        for pk in ids:
+            recurso = recursos.get(pk)
+            if recurso is not None:
+                recurso.is_favorite = pk in favoritos
+                resultado.append(recurso)
+        return resultado
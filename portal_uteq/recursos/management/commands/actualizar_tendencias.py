@@ -0,0 +1,31 @@
+# portal_uteq/recursos/management/commands/actualizar_tendencias.py
+import time
+
+from django.core.management.base import BaseCommand
+from portal_uteq.recursos import tendencias
+
+
+class Command(BaseCommand):
+    help = (
+        "Suma a las puntuaciones de popularidad y tendencia las visitas, favoritos y valoraciones "
+        "nuevos desde la última ejecución, con decaimiento exponencial."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cada',
+            type=int,
+            default=0,
+            help="Si se indica, vuelve a actualizar cada N segundos hasta interrumpir el proceso.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                actualizados = tendencias.actualizar()
+                self.stdout.write(self.style.SUCCESS(f"{actualizados} recurso(s) actualizados."))
+                if not options['cada']:
+                    break
+                time.sleep(options['cada'])
+            except KeyboardInterrupt:
+                break
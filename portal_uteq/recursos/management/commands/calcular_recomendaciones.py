@@ -0,0 +1,33 @@
+# portal_uteq/recursos/management/commands/calcular_recomendaciones.py
+import time
+
+from django.core.management.base import BaseCommand
+from portal_uteq.recursos import recomendaciones
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula los recursos similares (coseno sobre visitas, favoritos y valoraciones) y guarda "
+        "los vecinos de cada recurso. Por defecto solo recalcula los recursos con interacciones nuevas "
+        "y los que los tenían como vecino."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help="Recalcula todos los recursos, aunque sus interacciones no hayan cambiado.",
+        )
+        parser.add_argument(
+            '--vecinos',
+            type=int,
+            default=recomendaciones.VECINOS,
+            help="Vecinos que se guardan por recurso.",
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        recalculados, aprobados = recomendaciones.calcular(completo=options['completo'], vecinos=options['vecinos'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{recalculados} de {aprobados} recurso(s) recalculados en {time.monotonic() - inicio:.1f} s."
+        ))
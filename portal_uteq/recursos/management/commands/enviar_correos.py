@@ -0,0 +1,49 @@
+# portal_uteq/recursos/management/commands/enviar_correos.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from portal_uteq.recursos import correo
+
+
+class Command(BaseCommand):
+    help = (
+        "Envía los correos pendientes de la bandeja de salida por lotes, "
+        "reutilizando una conexión SMTP por lote y reintentando los fallidos con espera exponencial."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote',
+            type=int,
+            default=None,
+            help="Correos por lote (por defecto CORREO_LOTE).",
+        )
+        parser.add_argument(
+            '--cada',
+            type=int,
+            default=0,
+            help="Si se indica, vuelve a revisar la bandeja cada N segundos hasta interrumpir el proceso.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                enviados, fallidos = self.vaciar(options['lote'])
+                self.stdout.write(self.style.SUCCESS(f"{enviados} correo(s) enviados, {fallidos} con error."))
+                if not options['cada']:
+                    break
+                time.sleep(options['cada'])
+            except KeyboardInterrupt:
+                break
+
+    def vaciar(self, lote):
+        """Envía lotes mientras los lotes salgan llenos."""
+        lote = lote or settings.CORREO_LOTE
+        total_enviados = total_fallidos = 0
+        while True:
+            enviados, fallidos = correo.enviar_pendientes(lote)
+            total_enviados += enviados
+            total_fallidos += fallidos
+            if enviados + fallidos < lote:
+                return total_enviados, total_fallidos
@@ -0,0 +1,445 @@
+# portal_uteq/recursos/management/commands/generar_datos_sinteticos.py
+"""
+Llena la base de datos con datos sintéticos de volumen de producción para
+pruebas de carga.
+
+La popularidad sigue una distribución tipo Zipf: pocos recursos concentran
+la mayoría de visitas, valoraciones y favoritos, y pocos usuarios concentran
+la mayor parte de la actividad. Las filas se producen con generadores y se
+insertan con bulk_create por lotes, así que la memoria no depende del total
+(solo se guardan en arrays compactos los IDs de recursos y perfiles).
+
+La salida es determinista para una misma --semilla y --fecha-referencia:
+cada usuario usa su propio generador aleatorio derivado de la semilla.
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time as dt_time, timedelta
+import hashlib
+import io
+from itertools import accumulate, islice
+import random
+import time
+
+import django
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX, make_password
+from django.contrib.auth.models import Group, User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from portal_uteq.recursos import busqueda, listados, misiones, roles
+from portal_uteq.recursos.models import (
+    Carrera, Recurso, Perfil, Valoracion, Mision, MisionDiariaUsuario, HistorialVisitas, UltimaVisita
+)
+
+ESTADOS = [
+    (Recurso.ESTADO_APROBADO, 85),
+    (Recurso.ESTADO_PENDIENTE, 10),
+    (Recurso.ESTADO_RECHAZADO, 5),
+]
+# Sesgo de las puntuaciones: la mayoría de valoraciones son positivas
+PESOS_PUNTUACION = [5, 8, 17, 35, 35]
+PALABRAS = (
+    'inteligencia artificial programación diseño datos análisis estadística redes '
+    'matemáticas bases simulación cálculo investigación escritura presentación '
+    'laboratorio colaboración proyectos gestión contabilidad biología química física'
+).split()
+
+
+def _en_lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+def _pesos_acumulados_zipf(n, exponente):
+    return list(accumulate(1.0 / (rango + 1) ** exponente for rango in range(n)))
+
+
+def _cuotas_zipf(total, n, exponente):
+    """Reparte ``total`` entre ``n`` elementos según Zipf; la suma es exacta."""
+    if n <= 0:
+        return
+    suma_pesos = sum(1.0 / (rango + 1) ** exponente for rango in range(n))
+    acumulado = 0.0
+    emitido = 0
+    for rango in range(n):
+        acumulado += total * (1.0 / (rango + 1) ** exponente) / suma_pesos
+        cuota = round(acumulado) - emitido
+        emitido += cuota
+        yield cuota
+
+
+def _rng(semilla, *partes):
+    return random.Random(':'.join(map(str, (semilla,) + partes)))
+
+
+def _distintos_zipf(rng, ids, pesos, k):
+    """``k`` IDs distintos elegidos con probabilidad Zipf."""
+    k = min(k, len(ids))
+    if k > len(ids) // 2:
+        return rng.sample(list(ids), k)
+    elegidos = set()
+    while len(elegidos) < k:
+        elegidos.update(rng.choices(ids, cum_weights=pesos, k=k - len(elegidos)))
+    return sorted(elegidos)
+
+
+def _hashear(argumentos):
+    contrasena, sal = argumentos
+    return make_password(contrasena, sal)
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera carreras, recursos, usuarios con perfil, valoraciones, visitas, favoritos y "
+        "misiones diarias sintéticos, con popularidad sesgada (Zipf) y salida determinista."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--carreras', type=int, default=20)
+        parser.add_argument('--recursos', type=int, default=2000)
+        parser.add_argument('--usuarios', type=int, default=10000)
+        parser.add_argument('--valoraciones', type=int, default=100000)
+        parser.add_argument('--visitas', type=int, default=1000000)
+        parser.add_argument('--favoritos', type=int, default=100000)
+        parser.add_argument('--dias-misiones', type=int, default=7, help="Días de historial de misiones por usuario.")
+        parser.add_argument('--dias-historial', type=int, default=180, help="Antigüedad máxima de recursos, valoraciones y visitas.")
+        parser.add_argument('--docentes', type=float, default=0.05, help="Fracción de usuarios en el grupo Docente.")
+        parser.add_argument('--gestores', type=float, default=0.005, help="Fracción de usuarios en el grupo Gestor de Contenido.")
+        parser.add_argument('--zipf', type=float, default=1.1, help="Exponente de la distribución de popularidad.")
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument(
+            '--fecha-referencia',
+            help="Fecha (AAAA-MM-DD) desde la que se cuentan los días hacia atrás. Por defecto, hoy.",
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--contrasena', default='uteq2026', help="Contraseña común de los usuarios generados.")
+        parser.add_argument(
+            '--sin-contrasena',
+            action='store_true',
+            help="No calcula ningún hash: los usuarios quedan con contraseña inutilizable.",
+        )
+        parser.add_argument(
+            '--contrasenas-distintas',
+            action='store_true',
+            help="Cada usuario recibe '<contrasena><n>'. Los hashes se calculan en paralelo con --procesos.",
+        )
+        parser.add_argument('--procesos', type=int, default=4)
+
+    def handle(self, *args, **options):
+        self.opciones = options
+        self.semilla = options['semilla']
+        self.batch_size = options['batch_size']
+        self.exponente = options['zipf']
+
+        fecha = parse_date(options['fecha_referencia']) if options['fecha_referencia'] else timezone.localdate()
+        if fecha is None:
+            raise CommandError("--fecha-referencia debe tener el formato AAAA-MM-DD.")
+        self.referencia = timezone.make_aware(datetime.combine(fecha, dt_time.min))
+        if options['recursos'] < 1 or options['usuarios'] < 1 or options['carreras'] < 1:
+            raise CommandError("Se necesita al menos una carrera, un recurso y un usuario.")
+
+        if Carrera.objects.filter(nombre__startswith=f"Carrera sintética {self.semilla}-").exists():
+            raise CommandError(f"Ya existen datos sintéticos con la semilla {self.semilla}; usa otra --semilla.")
+
+        inicio = time.monotonic()
+        self.misiones = self._misiones()
+        carrera_ids = self._carreras()
+        self.recurso_ids = self._recursos(carrera_ids)
+        self.pesos_recursos = _pesos_acumulados_zipf(len(self.recurso_ids), self.exponente)
+        self.perfil_ids, self.user_ids = self._usuarios()
+        self._roles()
+        self._valoraciones()
+        self._favoritos()
+        self._visitas()
+        self._misiones_diarias()
+        self._finalizar(carrera_ids)
+        self.stdout.write(self.style.SUCCESS(f"Datos sintéticos generados en {time.monotonic() - inicio:.1f} s."))
+
+    # --- Utilidades ---
+
+    def _insertar(self, modelo, filas, nombre, **kwargs):
+        total = 0
+        inicio = time.monotonic()
+        for lote in _en_lotes(filas, self.batch_size):
+            modelo.objects.bulk_create(lote, batch_size=self.batch_size, **kwargs)
+            total += len(lote)
+        self.stdout.write(f"  {nombre}: {total} fila(s) en {time.monotonic() - inicio:.1f} s")
+        return total
+
+    def _fecha_pasada(self, rng, dias):
+        return self.referencia - timedelta(seconds=rng.random() * dias * 86400)
+
+    def _sal(self, *partes):
+        return hashlib.sha256(':'.join(map(str, (self.semilla,) + partes)).encode()).hexdigest()[:22]
+
+    # --- Catálogo ---
+
+    def _misiones(self):
+        for key, nombre in Mision.KEY_CHOICES:
+            Mision.objects.get_or_create(key=key, defaults={'nombre': nombre, 'descripcion': nombre})
+        return list(Mision.objects.filter(activa=True).order_by('pk').values_list('id', 'key', 'puntos_recompensa'))
+
+    def _carreras(self):
+        self._insertar(Carrera, (
+            Carrera(nombre=f"Carrera sintética {self.semilla}-{i:04d}", descripcion="Carrera generada para pruebas de carga.")
+            for i in range(self.opciones['carreras'])
+        ), 'Carreras')
+        return list(
+            Carrera.objects.filter(nombre__startswith=f"Carrera sintética {self.semilla}-")
+            .order_by('nombre').values_list('pk', flat=True)
+        )
+
+    def _recursos(self, carrera_ids):
+        tipos = [tipo for tipo, _ in Recurso.TIPO_CHOICES]
+        estados = [estado for estado, _ in ESTADOS]
+        pesos_estado = [peso for _, peso in ESTADOS]
+        pesos_carreras = _pesos_acumulados_zipf(len(carrera_ids), self.exponente)
+        recurso_ids = array('q')
+        relaciones = 0
+        inicio = time.monotonic()
+
+        def nuevos(desde, hasta):
+            for i in range(desde, hasta):
+                rng = _rng(self.semilla, 'recurso', i)
+                palabras = rng.sample(PALABRAS, 6)
+                recurso = Recurso(
+                    nombre=f"Recurso sintético {self.semilla}-{i:08d}",
+                    descripcion=f"Recurso de {' '.join(palabras)}.",
+                    uso_ideal='\n'.join(palabras[:3]),
+                    url_externa=f"https://example.com/recursos/{i}",
+                    tipo=rng.choice(tipos),
+                    estado=rng.choices(estados, weights=pesos_estado)[0],
+                )
+                # pre_save no se dispara en bulk_create
+                recurso.texto_busqueda = busqueda.texto_busqueda_de(recurso)
+                yield recurso, self._fecha_pasada(rng, self.opciones['dias_historial']), rng
+
+        for desde in range(0, self.opciones['recursos'], self.batch_size):
+            lote = list(nuevos(desde, min(desde + self.batch_size, self.opciones['recursos'])))
+            Recurso.objects.bulk_create([recurso for recurso, _, _ in lote])
+            # auto_now_add pisa la fecha en el INSERT: se corrige después
+            for recurso, fecha, _ in lote:
+                recurso.fecha_creacion = recurso.fecha_actualizacion = fecha
+            Recurso.objects.bulk_update([recurso for recurso, _, _ in lote], ['fecha_creacion', 'fecha_actualizacion'])
+
+            enlaces = []
+            for recurso, _, rng in lote:
+                numero = 1 + min(int(rng.expovariate(1.5)), len(carrera_ids) - 1)
+                for carrera_id in _distintos_zipf(rng, carrera_ids, pesos_carreras, numero):
+                    enlaces.append(Recurso.carreras.through(recurso_id=recurso.pk, carrera_id=carrera_id))
+            Recurso.carreras.through.objects.bulk_create(enlaces, batch_size=self.batch_size)
+            relaciones += len(enlaces)
+            recurso_ids.extend(recurso.pk for recurso, _, _ in lote)
+
+        self.stdout.write(
+            f"  Recursos: {len(recurso_ids)} fila(s) y {relaciones} relación(es) con carreras "
+            f"en {time.monotonic() - inicio:.1f} s"
+        )
+        return recurso_ids
+
+    # --- Usuarios ---
+
+    def _hashes(self, desde, hasta):
+        if self.opciones['sin_contrasena']:
+            return [f"{UNUSABLE_PASSWORD_PREFIX}{self._sal('sin', i)}" for i in range(desde, hasta)]
+        if not self.opciones['contrasenas_distintas']:
+            if not hasattr(self, '_hash_comun'):
+                self._hash_comun = make_password(self.opciones['contrasena'], self._sal('comun'))
+            return [self._hash_comun] * (hasta - desde)
+        argumentos = [(f"{self.opciones['contrasena']}{i}", self._sal('usuario', i)) for i in range(desde, hasta)]
+        if self.opciones['procesos'] <= 1:
+            return list(map(_hashear, argumentos))
+        return list(self._pool.map(_hashear, argumentos, chunksize=64))
+
+    def _plan_misiones(self, indice):
+        """(mision_id, fecha, completada, fecha_completado, puntos) de los días generados."""
+        rng = _rng(self.semilla, 'misiones', indice)
+        login = next((m for m in self.misiones if m[1] == 'login_diario'), None)
+        otras = [m for m in self.misiones if m is not login]
+        plan = []
+        for dia in range(self.opciones['dias_misiones']):
+            if rng.random() > 0.6:  # No todos los usuarios entran cada día
+                continue
+            fecha = (self.referencia - timedelta(days=dia)).date()
+            elegidas = ([login] if login else []) + rng.sample(otras, min(1, len(otras)))
+            for mision_id, key, puntos in elegidas:
+                completada = key == 'login_diario' or rng.random() < 0.4
+                momento = timezone.make_aware(datetime.combine(fecha, dt_time(8))) + timedelta(seconds=rng.randrange(14 * 3600))
+                plan.append((mision_id, fecha, completada, momento if completada else None, puntos if completada else 0))
+        return plan
+
+    def _usuarios(self):
+        total = self.opciones['usuarios']
+        perfil_ids = array('q')
+        user_ids = array('q')
+        carrera_ids = list(
+            Carrera.objects.filter(nombre__startswith=f"Carrera sintética {self.semilla}-")
+            .order_by('nombre').values_list('pk', flat=True)
+        )
+        pesos_carreras = _pesos_acumulados_zipf(len(carrera_ids), self.exponente)
+        inicio = time.monotonic()
+
+        self._pool = None
+        if self.opciones['contrasenas_distintas'] and not self.opciones['sin_contrasena'] and self.opciones['procesos'] > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.opciones['procesos'], initializer=django.setup)
+        try:
+            for desde in range(0, total, self.batch_size):
+                hasta = min(desde + self.batch_size, total)
+                hashes = self._hashes(desde, hasta)
+                usuarios = []
+                for i, hash_contrasena in zip(range(desde, hasta), hashes):
+                    rng = _rng(self.semilla, 'usuario', i)
+                    usuarios.append(User(
+                        username=f"sintetico_{self.semilla}_{i:08d}",
+                        email=f"sintetico_{self.semilla}_{i:08d}@example.com",
+                        first_name=rng.choice(['Ana', 'Luis', 'María', 'José', 'Carla', 'Pedro', 'Sofía', 'Diego']),
+                        last_name=rng.choice(['Mora', 'Vera', 'Zambrano', 'Cedeño', 'Loor', 'Macías', 'Intriago']),
+                        password=hash_contrasena,
+                        date_joined=self._fecha_pasada(rng, self.opciones['dias_historial']),
+                    ))
+                User.objects.bulk_create(usuarios)
+
+                perfiles = []
+                for i, user in zip(range(desde, hasta), usuarios):
+                    rng = _rng(self.semilla, 'perfil', i)
+                    perfiles.append(Perfil(
+                        user_id=user.pk,
+                        cedula=f"{(self.semilla * 100_000_000 + i) % 10 ** 10:010d}",
+                        carrera_id=rng.choices(carrera_ids, cum_weights=pesos_carreras)[0],
+                        puntos=sum(paso[4] for paso in self._plan_misiones(i)),
+                        racha_actual=rng.randrange(0, 8),
+                    ))
+                Perfil.objects.bulk_create(perfiles)
+                user_ids.extend(user.pk for user in usuarios)
+                perfil_ids.extend(perfil.pk for perfil in perfiles)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+
+        self.stdout.write(f"  Usuarios y perfiles: {total} fila(s) en {time.monotonic() - inicio:.1f} s")
+        return perfil_ids, user_ids
+
+    def _roles(self):
+        grupos = [
+            (Group.objects.get_or_create(name='Docente')[0], self.opciones['docentes']),
+            (Group.objects.get_or_create(name='Gestor de Contenido')[0], self.opciones['gestores']),
+        ]
+
+        def filas():
+            for i, user_id in enumerate(self.user_ids):
+                rng = _rng(self.semilla, 'rol', i)
+                sorteo = rng.random()
+                acumulado = 0.0
+                for grupo, fraccion in grupos:
+                    acumulado += fraccion
+                    if sorteo < acumulado:
+                        yield User.groups.through(user_id=user_id, group_id=grupo.pk)
+                        break
+
+        self._insertar(User.groups.through, filas(), 'Pertenencias a grupos')
+
+    # --- Actividad ---
+
+    def _valoraciones(self):
+        puntuaciones = [1, 2, 3, 4, 5]
+
+        def filas():
+            cuotas = _cuotas_zipf(self.opciones['valoraciones'], len(self.user_ids), self.exponente)
+            for i, (user_id, cuota) in enumerate(zip(self.user_ids, cuotas)):
+                rng = _rng(self.semilla, 'valoraciones', i)
+                for recurso_id in _distintos_zipf(rng, self.recurso_ids, self.pesos_recursos, cuota):
+                    valoracion = Valoracion(
+                        recurso_id=recurso_id,
+                        user_id=user_id,
+                        puntuacion=rng.choices(puntuaciones, weights=PESOS_PUNTUACION)[0],
+                        comentario=f"Me sirvió para {' y '.join(rng.sample(PALABRAS, 2))}.",
+                    )
+                    valoracion.fecha_sintetica = self._fecha_pasada(rng, self.opciones['dias_historial'])
+                    yield valoracion
+
+        total = 0
+        inicio = time.monotonic()
+        for lote in _en_lotes(filas(), self.batch_size):
+            Valoracion.objects.bulk_create(lote)
+            for valoracion in lote:
+                valoracion.fecha_creacion = valoracion.fecha_sintetica
+            Valoracion.objects.bulk_update(lote, ['fecha_creacion'])
+            total += len(lote)
+        self.stdout.write(f"  Valoraciones: {total} fila(s) en {time.monotonic() - inicio:.1f} s")
+
+    def _favoritos(self):
+        def filas():
+            cuotas = _cuotas_zipf(self.opciones['favoritos'], len(self.perfil_ids), self.exponente)
+            for i, (perfil_id, cuota) in enumerate(zip(self.perfil_ids, cuotas)):
+                rng = _rng(self.semilla, 'favoritos', i)
+                for recurso_id in _distintos_zipf(rng, self.recurso_ids, self.pesos_recursos, cuota):
+                    yield Perfil.recursos_favoritos.through(perfil_id=perfil_id, recurso_id=recurso_id)
+
+        self._insertar(Perfil.recursos_favoritos.through, filas(), 'Favoritos')
+
+    def _visitas(self):
+        ultimas = []
+
+        def filas():
+            cuotas = _cuotas_zipf(self.opciones['visitas'], len(self.perfil_ids), self.exponente)
+            for i, (perfil_id, cuota) in enumerate(zip(self.perfil_ids, cuotas)):
+                if not cuota:
+                    continue
+                rng = _rng(self.semilla, 'visitas', i)
+                mas_recientes = {}
+                for recurso_id in rng.choices(self.recurso_ids, cum_weights=self.pesos_recursos, k=cuota):
+                    fecha = self._fecha_pasada(rng, self.opciones['dias_historial'])
+                    if recurso_id not in mas_recientes or fecha > mas_recientes[recurso_id]:
+                        mas_recientes[recurso_id] = fecha
+                    yield HistorialVisitas(perfil_id=perfil_id, recurso_id=recurso_id, fecha_visita=fecha)
+                # La última visita de cada par sale del mismo recorrido por usuario
+                ultimas.extend(
+                    UltimaVisita(perfil_id=perfil_id, recurso_id=recurso_id, fecha_visita=fecha)
+                    for recurso_id, fecha in mas_recientes.items()
+                )
+
+        total = 0
+        total_ultimas = 0
+        inicio = time.monotonic()
+        for lote in _en_lotes(filas(), self.batch_size):
+            HistorialVisitas.objects.bulk_create(lote)
+            total += len(lote)
+            if len(ultimas) >= self.batch_size:
+                UltimaVisita.objects.bulk_create(ultimas, batch_size=self.batch_size)
+                total_ultimas += len(ultimas)
+                ultimas.clear()
+        UltimaVisita.objects.bulk_create(ultimas, batch_size=self.batch_size)
+        total_ultimas += len(ultimas)
+        self.stdout.write(
+            f"  Visitas: {total} fila(s) de historial y {total_ultimas} de última visita "
+            f"en {time.monotonic() - inicio:.1f} s"
+        )
+
+    def _misiones_diarias(self):
+        def filas():
+            for i, perfil_id in enumerate(self.perfil_ids):
+                for mision_id, fecha, completada, fecha_completado, _ in self._plan_misiones(i):
+                    yield MisionDiariaUsuario(
+                        perfil_id=perfil_id, mision_id=mision_id, fecha_asignacion=fecha,
+                        completada=completada, fecha_completado=fecha_completado,
+                    )
+
+        self._insertar(MisionDiariaUsuario, filas(), 'Misiones diarias')
+
+    # --- Agregados y cachés ---
+
+    def _finalizar(self, carrera_ids):
+        # bulk_create no dispara señales: se rehacen los agregados, el índice
+        # de búsqueda y se invalidan las cachés que dependen de ellas
+        salida = io.StringIO()
+        call_command('recalcular_valoraciones', batch_size=self.batch_size, stdout=salida)
+        self.stdout.write(f"  {salida.getvalue().strip().splitlines()[-1]}")
+        self.stdout.write("  Reconstruyendo el índice de búsqueda...")
+        busqueda.reconstruir_indice()
+        listados.invalidar_carreras(carrera_ids)
+        misiones.invalidar_catalogo()
+        roles.invalidar_todos()
@@ -0,0 +1,28 @@
+# portal_uteq/recursos/management/commands/generar_variantes_imagenes.py
+from django.core.management.base import BaseCommand
+from portal_uteq.recursos import imagenes
+from portal_uteq.recursos.models import Carrera, Recurso
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las variantes WebP/JPEG y el marcador borroso de las imágenes de recursos y carreras "
+        "ya subidas. Solo hace falta con almacenamiento local: con Cloudinary las variantes son transformaciones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--forzar',
+            action='store_true',
+            help="Regenera también las imágenes que ya tienen variantes.",
+        )
+
+    def handle(self, *args, **options):
+        generadas = omitidas = 0
+        for modelo in (Carrera, Recurso):
+            for objeto in modelo.objects.exclude(imagen='').exclude(imagen__isnull=True).only('pk', 'imagen').iterator():
+                if imagenes.generar(objeto.imagen, forzar=options['forzar']):
+                    generadas += 1
+                else:
+                    omitidas += 1
+        self.stdout.write(self.style.SUCCESS(f"{generadas} imagen(es) con variantes, {omitidas} omitidas."))
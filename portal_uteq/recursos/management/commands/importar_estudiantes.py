@@ -0,0 +1,51 @@
+# portal_uteq/recursos/management/commands/importar_estudiantes.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from portal_uteq.recursos import importacion
+
+
+class Command(BaseCommand):
+    help = (
+        "Crea usuarios y perfiles de estudiantes a partir de un CSV con las columnas "
+        "nombres, apellidos, email, cedula y carrera (nombre o ID). Cada estudiante recibe "
+        "su contraseña temporal por correo (bandeja de salida, ver enviar_correos)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Ruta del CSV (UTF-8).")
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            default=None,
+            help="Procesos para calcular los hashes de las contraseñas (por defecto IMPORTACION_PROCESOS o los núcleos).",
+        )
+        parser.add_argument(
+            '--sin-correo',
+            action='store_true',
+            help="No encola los correos de bienvenida.",
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        try:
+            archivo = open(options['archivo'], encoding='utf-8-sig', newline='')
+        except OSError as e:
+            raise CommandError(f"No se pudo abrir {options['archivo']}: {e}")
+
+        def progreso(creados, total):
+            self.stdout.write(f"  {creados}/{total} estudiante(s)...")
+
+        with archivo:
+            creados, errores = importacion.importar(
+                archivo,
+                procesos=options['procesos'],
+                enviar_correo=not options['sin_correo'],
+                progreso=progreso if options['verbosity'] > 1 else None,
+            )
+
+        for linea, mensaje in errores:
+            self.stderr.write(f"Línea {linea}: {mensaje}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{creados} estudiante(s) importados en {time.monotonic() - inicio:.1f} s; {len(errores)} fila(s) omitidas."
+        ))
@@ -0,0 +1,62 @@
+# portal_uteq/recursos/management/commands/recalcular_valoraciones.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum, Q
+from portal_uteq.recursos.models import Recurso, Valoracion
+
+CAMPOS_AGREGADOS = [
+    'num_valoraciones', 'suma_puntuaciones',
+    'valoraciones_1', 'valoraciones_2', 'valoraciones_3', 'valoraciones_4', 'valoraciones_5',
+    'puntuacion_bayesiana',
+]
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde la tabla de valoraciones los agregados desnormalizados de cada recurso."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verificar',
+            action='store_true',
+            help="Solo compara los contadores con las valoraciones reales; no escribe nada y falla si hay diferencias.",
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        esperados = {
+            fila['recurso']: fila
+            for fila in Valoracion.objects.order_by().values('recurso').annotate(
+                num_valoraciones=Count('id'),
+                suma_puntuaciones=Sum('puntuacion'),
+                **{f'valoraciones_{e}': Count('id', filter=Q(puntuacion=e)) for e in range(1, 6)},
+            )
+        }
+
+        desfasados = []
+        with transaction.atomic():
+            recursos = Recurso.objects.select_for_update().only('pk', *CAMPOS_AGREGADOS)
+            for recurso in recursos.iterator(chunk_size=options['batch_size']):
+                fila = esperados.get(recurso.pk, {})
+                valores = {campo: fila.get(campo, 0) for campo in CAMPOS_AGREGADOS[:-1]}
+                valores['puntuacion_bayesiana'] = Recurso.calcular_puntuacion_bayesiana(
+                    valores['suma_puntuaciones'], valores['num_valoraciones']
+                )
+                diferencias = [
+                    campo for campo in CAMPOS_AGREGADOS
+                    if abs(getattr(recurso, campo) - valores[campo]) > 1e-9
+                ]
+                if diferencias:
+                    self.stdout.write(f"Recurso {recurso.pk}: desfase en {', '.join(diferencias)}")
+                    for campo, valor in valores.items():
+                        setattr(recurso, campo, valor)
+                    desfasados.append(recurso)
+
+            if options['verificar']:
+                if desfasados:
+                    raise CommandError(f"{len(desfasados)} recurso(s) con agregados desfasados.")
+                self.stdout.write(self.style.SUCCESS("Todos los agregados de valoraciones son correctos."))
+                return
+
+            Recurso.objects.bulk_update(desfasados, CAMPOS_AGREGADOS, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f"Agregados recalculados para {len(desfasados)} recurso(s)."))
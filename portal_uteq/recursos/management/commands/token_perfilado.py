@@ -0,0 +1,25 @@
+# portal_uteq/recursos/management/commands/token_perfilado.py
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from portal_uteq.recursos import perfilado
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera el parámetro ?perfilar=<token> con el que un usuario del personal pide "
+        "un volcado de cProfile de una petición (ver recursos/perfilado.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help="Nombre de usuario (debe ser del personal).")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario '{options['usuario']}'.")
+        if not user.is_staff:
+            raise CommandError("Solo los usuarios del personal pueden pedir perfiles.")
+        minutos = perfilado.VIGENCIA_TOKEN // 60
+        self.stdout.write(f"?{perfilado.PARAMETRO}={perfilado.token_perfilado(user)}")
+        self.stdout.write(self.style.SUCCESS(f"Válido durante {minutos} minutos para {user.username}."))
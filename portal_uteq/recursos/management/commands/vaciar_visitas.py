@@ -0,0 +1,32 @@
+# portal_uteq/recursos/management/commands/vaciar_visitas.py
+import time
+
+from django.core.management.base import BaseCommand
+from portal_uteq.recursos import visitas
+
+
+class Command(BaseCommand):
+    help = (
+        "Vuelca a HistorialVisitas las visitas pendientes en el buffer de la caché compartida. "
+        "Con --cada N se deja corriendo para que el buffer no espere al siguiente clic."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cada',
+            type=int,
+            default=0,
+            help="Si se indica, repite el volcado cada N segundos hasta interrumpir el proceso.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            insertadas = visitas.vaciar_buffer()
+            self.stdout.write(self.style.SUCCESS(f"{insertadas} visita(s) volcadas a la base de datos."))
+            if not options['cada']:
+                break
+            try:
+                time.sleep(options['cada'])
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.SUCCESS(f"{visitas.vaciar_buffer()} visita(s) volcadas al salir."))
+                break
@@ -0,0 +1,79 @@
+# Generated by Django 6.0 on 2026-10-17 17:09
+
+from django.db import migrations, models
+from django.db.models import Count, Sum, Q
+
+
+def poblar_agregados(apps, schema_editor):
+    Recurso = apps.get_model('recursos', 'Recurso')
+    Valoracion = apps.get_model('recursos', 'Valoracion')
+    # Mismos parámetros que Recurso.BAYES_PESO_PREVIO / BAYES_MEDIA_PREVIA
+    peso, media = 5, 3.0
+    filas = Valoracion.objects.order_by().values('recurso').annotate(
+        num=Count('id'),
+        suma=Sum('puntuacion'),
+        **{f'v{e}': Count('id', filter=Q(puntuacion=e)) for e in range(1, 6)},
+    )
+    for fila in filas:
+        Recurso.objects.filter(pk=fila['recurso']).update(
+            num_valoraciones=fila['num'],
+            suma_puntuaciones=fila['suma'],
+            valoraciones_1=fila['v1'],
+            valoraciones_2=fila['v2'],
+            valoraciones_3=fila['v3'],
+            valoraciones_4=fila['v4'],
+            valoraciones_5=fila['v5'],
+            puntuacion_bayesiana=(peso * media + fila['suma']) / (peso + fila['num']),
+        )
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recursos', '0016_historialvisitas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurso',
+            name='num_valoraciones',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Número de Valoraciones'),
+        ),
+        migrations.AddField(
+            model_name='recurso',
+            name='puntuacion_bayesiana',
+            field=models.FloatField(db_index=True, default=3.0, editable=False, verbose_name='Puntuación Bayesiana'),
+        ),
+        migrations.AddField(
+            model_name='recurso',
+            name='suma_puntuaciones',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Suma de Puntuaciones'),
+        ),
+        migrations.AddField(
+            model_name='recurso',
+            name='valoraciones_1',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Valoraciones de 1 Estrella'),
+        ),
+        migrations.AddField(
+            model_name='recurso',
+            name='valoraciones_2',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Valoraciones de 2 Estrellas'),
+        ),
+        migrations.AddField(
+            model_name='recurso',
+            name='valoraciones_3',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Valoraciones de 3 Estrellas'),
+        ),
+        migrations.AddField(
+            model_name='recurso',
+            name='valoraciones_4',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Valoraciones de 4 Estrellas'),
+        ),
+        migrations.AddField(
+            model_name='recurso',
+            name='valoraciones_5',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Valoraciones de 5 Estrellas'),
+        ),
+        migrations.RunPython(poblar_agregados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 6.0 on 2026-10-17 17:20
+
+import unidecode
+from django.db import migrations, models
+
+
+def normalizar(*partes):
+    return ' '.join(unidecode.unidecode(' '.join(filter(None, partes))).lower().split())
+
+
+def poblar_texto_busqueda(apps, schema_editor):
+    Recurso = apps.get_model('recursos', 'Recurso')
+    for recurso in Recurso.objects.only('nombre', 'descripcion', 'uso_ideal').iterator():
+        Recurso.objects.filter(pk=recurso.pk).update(
+            texto_busqueda=normalizar(recurso.nombre, recurso.descripcion, recurso.uso_ideal)
+        )
+
+
+SQL_POSTGRESQL = [
+    "ALTER TABLE recursos_recurso ADD COLUMN busqueda_tsv tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('spanish'::regconfig, texto_busqueda)) STORED",
+    "CREATE INDEX recursos_recurso_busqueda_gin ON recursos_recurso USING GIN (busqueda_tsv)",
+]
+SQL_POSTGRESQL_REVERSO = [
+    "DROP INDEX IF EXISTS recursos_recurso_busqueda_gin",
+    "ALTER TABLE recursos_recurso DROP COLUMN IF EXISTS busqueda_tsv",
+]
+
+# En SQLite la tabla FTS5 guarda su propia copia del texto y la mantiene
+# busqueda.indexar_recurso() desde las señales. No se usan triggers porque
+# SQLite reconstruye la tabla de recursos en cada AddField y los perdería.
+SQL_SQLITE = [
+    "CREATE VIRTUAL TABLE recursos_recurso_fts USING fts5("
+    "texto_busqueda, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO recursos_recurso_fts(rowid, texto_busqueda) SELECT id, texto_busqueda FROM recursos_recurso",
+]
+SQL_SQLITE_REVERSO = [
+    "DROP TABLE IF EXISTS recursos_recurso_fts",
+]
+
+
+def _ejecutar(schema_editor, sentencias_por_motor):
+    for sentencia in sentencias_por_motor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sentencia)
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': SQL_POSTGRESQL, 'sqlite': SQL_SQLITE})
+
+
+def eliminar_indice_busqueda(apps, schema_editor):
+    _ejecutar(schema_editor, {'postgresql': SQL_POSTGRESQL_REVERSO, 'sqlite': SQL_SQLITE_REVERSO})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recursos', '0017_recurso_agregados_valoraciones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recurso',
+            name='texto_busqueda',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Texto de Búsqueda'),
+        ),
+        migrations.RunPython(poblar_texto_busqueda, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice_busqueda, eliminar_indice_busqueda),
+    ]
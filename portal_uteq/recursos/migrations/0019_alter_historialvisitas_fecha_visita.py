@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 17:13
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recursos', '0018_recurso_texto_busqueda'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historialvisitas',
+            name='fecha_visita',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha de Visita'),
+        ),
+    ]
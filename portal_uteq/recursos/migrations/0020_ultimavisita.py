@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-17 17:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def poblar_ultimas_visitas(apps, schema_editor):
+    HistorialVisitas = apps.get_model('recursos', 'HistorialVisitas')
+    UltimaVisita = apps.get_model('recursos', 'UltimaVisita')
+    filas = (
+        HistorialVisitas.objects.order_by()
+        .values('perfil_id', 'recurso_id')
+        .annotate(ultima=Max('fecha_visita'))
+    )
+    UltimaVisita.objects.bulk_create(
+        (UltimaVisita(perfil_id=f['perfil_id'], recurso_id=f['recurso_id'], fecha_visita=f['ultima']) for f in filas.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recursos', '0019_alter_historialvisitas_fecha_visita'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UltimaVisita',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_visita', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha de la Última Visita')),
+                ('perfil', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ultimas_visitas', to='recursos.perfil')),
+                ('recurso', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ultimas_visitas', to='recursos.recurso')),
+            ],
+            options={
+                'verbose_name': 'Última Visita',
+                'verbose_name_plural': 'Últimas Visitas',
+                'ordering': ['-fecha_visita'],
+                'indexes': [models.Index(fields=['perfil', '-fecha_visita'], name='ultima_visita_perfil_fecha')],
+                'constraints': [models.UniqueConstraint(fields=('perfil', 'recurso'), name='ultima_visita_perfil_recurso_unica')],
+            },
+        ),
+        migrations.RunPython(poblar_ultimas_visitas, migrations.RunPython.noop),
+    ]
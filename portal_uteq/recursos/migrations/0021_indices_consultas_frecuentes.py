@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-17 17:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recursos', '0020_ultimavisita'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historialvisitas',
+            index=models.Index(fields=['perfil', '-fecha_visita'], name='historial_perfil_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='misiondiariausuario',
+            index=models.Index(fields=['perfil', '-fecha_asignacion'], name='mision_diaria_perfil_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='misiondiariausuario',
+            index=models.Index(condition=models.Q(('completada', False)), fields=['perfil', 'fecha_asignacion', 'mision'], name='mision_diaria_pendiente'),
+        ),
+        migrations.AddIndex(
+            model_name='recurso',
+            index=models.Index(fields=['estado', 'tipo'], name='recurso_estado_tipo'),
+        ),
+        migrations.AddIndex(
+            model_name='recurso',
+            index=models.Index(condition=models.Q(('estado', 'aprobado')), fields=['tipo', '-fecha_creacion', '-id'], name='recurso_aprobado_tipo_fecha'),
+        ),
+        migrations.AddIndex(
+            model_name='recurso',
+            index=models.Index(condition=models.Q(('estado', 'aprobado')), fields=['tipo', '-puntuacion_bayesiana', '-fecha_creacion', '-id'], name='recurso_aprobado_tipo_bayes'),
+        ),
+        migrations.AddIndex(
+            model_name='valoracion',
+            index=models.Index(fields=['recurso', '-fecha_creacion'], name='valoracion_recurso_fecha'),
+        ),
+    ]
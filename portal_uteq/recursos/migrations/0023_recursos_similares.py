@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-17 17:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recursos', '0022_bandeja_correo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecursoSimilares',
+            fields=[
+                ('recurso', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similares', serialize=False, to='recursos.recurso')),
+                ('vecinos', models.JSONField(default=list, help_text='Lista de [recurso_id, similitud], de mayor a menor.', verbose_name='Vecinos')),
+                ('firma', models.CharField(max_length=40, verbose_name='Firma de las Interacciones')),
+                ('fecha_calculo', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Fecha de Cálculo')),
+            ],
+            options={
+                'verbose_name': 'Recursos Similares',
+                'verbose_name_plural': 'Recursos Similares',
+            },
+        ),
+    ]
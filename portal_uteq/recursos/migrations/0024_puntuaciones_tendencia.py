@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-17 17:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recursos', '0023_recursos_similares'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PuntoControlTendencias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_base', models.DateTimeField(verbose_name='Fecha Base')),
+                ('ultima_visita_id', models.PositiveBigIntegerField(default=0, verbose_name='Última Visita Sumada')),
+                ('ultima_valoracion_id', models.PositiveBigIntegerField(default=0, verbose_name='Última Valoración Sumada')),
+                ('fecha_actualizacion', models.DateTimeField(blank=True, null=True, verbose_name='Última Actualización')),
+            ],
+            options={
+                'verbose_name': 'Punto de Control de Tendencias',
+                'verbose_name_plural': 'Puntos de Control de Tendencias',
+            },
+        ),
+        migrations.AddField(
+            model_name='recurso',
+            name='favoritos_contados',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Favoritos Contados'),
+        ),
+        migrations.AddField(
+            model_name='recurso',
+            name='puntuacion_popularidad',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='Puntuación de Popularidad'),
+        ),
+        migrations.AddField(
+            model_name='recurso',
+            name='puntuacion_tendencia',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='Puntuación de Tendencia'),
+        ),
+        migrations.AddIndex(
+            model_name='recurso',
+            index=models.Index(condition=models.Q(('estado', 'aprobado')), fields=['tipo', '-puntuacion_popularidad', '-fecha_creacion', '-id'], name='recurso_aprobado_tipo_pop'),
+        ),
+        migrations.AddIndex(
+            model_name='recurso',
+            index=models.Index(condition=models.Q(('estado', 'aprobado')), fields=['tipo', '-puntuacion_tendencia', '-fecha_creacion', '-id'], name='recurso_aprobado_tipo_tend'),
+        ),
+    ]
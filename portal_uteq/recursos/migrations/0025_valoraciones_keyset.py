@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-17 18:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recursos', '0024_puntuaciones_tendencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='valoracion',
+            name='valoracion_recurso_fecha',
+        ),
+        migrations.AddIndex(
+            model_name='valoracion',
+            index=models.Index(fields=['recurso', '-fecha_creacion', '-id'], name='valoracion_recurso_fecha'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-17 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recursos', '0025_valoraciones_keyset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='puntocontroltendencias',
+            name='huecos_valoraciones',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Valoraciones Pendientes'),
+        ),
+        migrations.AddField(
+            model_name='puntocontroltendencias',
+            name='huecos_visitas',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Visitas Pendientes'),
+        ),
+    ]
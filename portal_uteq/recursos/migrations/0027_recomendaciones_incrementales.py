@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-17 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recursos', '0026_tendencias_huecos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PuntoControlRecomendaciones',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultima_visita_id', models.PositiveBigIntegerField(default=0, verbose_name='Última Visita Revisada')),
+                ('ultima_valoracion_id', models.PositiveBigIntegerField(default=0, verbose_name='Última Valoración Revisada')),
+                ('ultimo_favorito_id', models.PositiveBigIntegerField(default=0, verbose_name='Último Favorito Revisado')),
+                ('huecos_visitas', models.JSONField(blank=True, default=dict, verbose_name='Visitas Pendientes')),
+                ('huecos_valoraciones', models.JSONField(blank=True, default=dict, verbose_name='Valoraciones Pendientes')),
+                ('huecos_favoritos', models.JSONField(blank=True, default=dict, verbose_name='Favoritos Pendientes')),
+                ('fecha_calculo', models.DateTimeField(blank=True, null=True, verbose_name='Último Cálculo')),
+            ],
+            options={
+                'verbose_name': 'Punto de Control de Recomendaciones',
+                'verbose_name_plural': 'Puntos de Control de Recomendaciones',
+            },
+        ),
+        migrations.RemoveField(
+            model_name='recursosimilares',
+            name='firma',
+        ),
+        migrations.AddField(
+            model_name='recursosimilares',
+            name='favoritos',
+            field=models.PositiveIntegerField(default=0, verbose_name='Favoritos Contados'),
+        ),
+        migrations.AddField(
+            model_name='recursosimilares',
+            name='norma',
+            field=models.FloatField(default=0.0, verbose_name='Norma del Vector'),
+        ),
+        migrations.AddField(
+            model_name='recursosimilares',
+            name='valoraciones',
+            field=models.PositiveIntegerField(default=0, verbose_name='Valoraciones Contadas'),
+        ),
+    ]
@@ -0,0 +1,121 @@
+# portal_uteq/recursos/misiones.py
+"""
+Utilidades de gamificación compartidas por las señales y las vistas.
+
+El catálogo de misiones activas cambia muy poco, así que se guarda en memoria
+del proceso. Para que un cambio hecho en un worker invalide la copia de los
+demás se guarda un identificador de versión en la caché de Django, que las
+señales de Mision renuevan (caducidad sin caché compartida: ver compartida.py).
+"""
+from collections import namedtuple
+from contextvars import ContextVar
+import logging
+import threading
+import uuid
+
+from django.core.cache import cache
+from django.core.signals import request_started, request_finished
+from django.db import transaction
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import clasificacion, compartida
+
+logger = logging.getLogger(__name__)
+
+CLAVE_VERSION_CATALOGO = 'misiones:catalogo:version'
+
+MisionActiva = namedtuple('MisionActiva', ['id', 'key', 'puntos_recompensa'])
+
+_catalogo = {'version': None, 'misiones': ()}
+_catalogo_lock = threading.Lock()
+
+
+def catalogo_activo():
+    """Tupla de MisionActiva con las misiones activas, sin consultar la BD si está cacheada."""
+    version = cache.get_or_set(CLAVE_VERSION_CATALOGO, lambda: uuid.uuid4().hex, compartida.timeout())
+    if _catalogo['version'] != version:
+        from .models import Mision
+        misiones = tuple(
+            MisionActiva(*fila)
+            for fila in Mision.objects.filter(activa=True).order_by('pk').values_list('id', 'key', 'puntos_recompensa')
+        )
+        with _catalogo_lock:
+            _catalogo['version'] = version
+            _catalogo['misiones'] = misiones
+    return _catalogo['misiones']
+
+
+def invalidar_catalogo():
+    cache.set(CLAVE_VERSION_CATALOGO, uuid.uuid4().hex, compartida.timeout())
+    with _catalogo_lock:
+        _catalogo['version'] = None
+
+
+# --- Completado de misiones diarias ---
+# Un UPDATE condicional marca la misión (solo gana quien la encuentra pendiente)
+# y otro suma los puntos con F(), ambos en la misma transacción. No se lee ni
+# la asignación ni el perfil, así que no hay carreras de lectura-escritura.
+#
+# Con diferida=True, dentro de una petición el trabajo se aplaza hasta
+# request_finished, es decir, después de enviar la respuesta al cliente.
+# ``al_terminar(puntos)`` se llama solo cuando el completado se ejecutó sin
+# errores, sea al momento o en diferido.
+
+_pendientes = ContextVar('misiones_pendientes', default=None)
+
+
+def completar_mision(perfil_id, key, diferida=False, al_terminar=None):
+    """
+    Completa la misión ``key`` de hoy del perfil si está pendiente.
+    Devuelve los puntos otorgados (0 si no había nada que completar), o
+    None si el trabajo quedó diferido.
+    """
+    if diferida:
+        pendientes = _pendientes.get()
+        if pendientes is not None:
+            pendientes.append((perfil_id, key, al_terminar))
+            return None
+
+    puntos = _completar(perfil_id, key)
+    if al_terminar is not None:
+        al_terminar(puntos)
+    return puntos
+
+
+def _completar(perfil_id, key):
+    mision = next((m for m in catalogo_activo() if m.key == key), None)
+    if mision is None or not perfil_id:
+        return 0
+
+    from .models import MisionDiariaUsuario, Perfil
+    ahora = timezone.now()
+    with transaction.atomic():
+        completadas = MisionDiariaUsuario.objects.filter(
+            perfil_id=perfil_id,
+            fecha_asignacion=timezone.localdate(ahora),
+            mision_id=mision.id,
+            completada=False,
+        ).update(completada=True, fecha_completado=ahora)
+        if not completadas:
+            return 0
+        Perfil.objects.filter(pk=perfil_id).update(puntos=F('puntos') + mision.puntos_recompensa)
+        transaction.on_commit(lambda: clasificacion.sumar_puntos(perfil_id, mision.puntos_recompensa))
+    return mision.puntos_recompensa
+
+
+@receiver(request_started)
+def _abrir_cola_diferida(sender, **kwargs):
+    _pendientes.set([])
+
+
+@receiver(request_finished)
+def _procesar_cola_diferida(sender, **kwargs):
+    pendientes = _pendientes.get()
+    _pendientes.set(None)
+    for perfil_id, key, al_terminar in pendientes or ():
+        try:
+            completar_mision(perfil_id, key, al_terminar=al_terminar)
+        except Exception:
+            logger.exception("No se pudo completar la misión diferida %s del perfil %s", key, perfil_id)
@@ -1,5 +1,6 @@
 # portal_uteq/recursos/models.py
 from django.db import models
+from django.db.models import F, Q, Value, FloatField, ExpressionWrapper
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -59,14 +60,100 @@ class Recurso(models.Model):
         verbose_name="Estado de Aprobación"
     )
 
+    # Parámetros del promedio bayesiano: equivale a sumar BAYES_PESO_PREVIO
+    # valoraciones "virtuales" de BAYES_MEDIA_PREVIA estrellas a cada recurso.
+    BAYES_PESO_PREVIO = 5
+    BAYES_MEDIA_PREVIA = 3.0
+
+    # Agregados de valoraciones desnormalizados (mantenidos por signals.py)
+    num_valoraciones = models.PositiveIntegerField(default=0, editable=False, verbose_name="Número de Valoraciones")
+    suma_puntuaciones = models.PositiveIntegerField(default=0, editable=False, verbose_name="Suma de Puntuaciones")
+    valoraciones_1 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Valoraciones de 1 Estrella")
+    valoraciones_2 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Valoraciones de 2 Estrellas")
+    valoraciones_3 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Valoraciones de 3 Estrellas")
+    valoraciones_4 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Valoraciones de 4 Estrellas")
+    valoraciones_5 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Valoraciones de 5 Estrellas")
+    puntuacion_bayesiana = models.FloatField(default=BAYES_MEDIA_PREVIA, editable=False, db_index=True, verbose_name="Puntuación Bayesiana")
+
+    # Puntuaciones con decaimiento exponencial de los órdenes "populares" y
+    # "tendencia" (mantenidas por el comando actualizar_tendencias, ver tendencias.py)
+    puntuacion_popularidad = models.FloatField(default=0.0, editable=False, verbose_name="Puntuación de Popularidad")
+    puntuacion_tendencia = models.FloatField(default=0.0, editable=False, verbose_name="Puntuación de Tendencia")
+    favoritos_contados = models.PositiveIntegerField(default=0, editable=False, verbose_name="Favoritos Contados")
+
+    # Texto normalizado para el motor de búsqueda (ver busqueda.py)
+    texto_busqueda = models.TextField(blank=True, default='', editable=False, verbose_name="Texto de Búsqueda")
+
     class Meta:
         verbose_name = "Recurso Digital"
         verbose_name_plural = "Recursos Digitales"
         ordering = ['nombre']
+        indexes = [
+            # Conteos y filtros por estado (dashboard, revisión de sugerencias)
+            models.Index(fields=['estado', 'tipo'], name='recurso_estado_tipo'),
+            # Índices parciales: solo los aprobados se listan a los estudiantes,
+            # uno por cada orden del listado (recientes y mejor valorados)
+            models.Index(
+                fields=['tipo', '-fecha_creacion', '-id'],
+                name='recurso_aprobado_tipo_fecha',
+                condition=Q(estado='aprobado'),
+            ),
+            models.Index(
+                fields=['tipo', '-puntuacion_bayesiana', '-fecha_creacion', '-id'],
+                name='recurso_aprobado_tipo_bayes',
+                condition=Q(estado='aprobado'),
+            ),
+            models.Index(
+                fields=['tipo', '-puntuacion_popularidad', '-fecha_creacion', '-id'],
+                name='recurso_aprobado_tipo_pop',
+                condition=Q(estado='aprobado'),
+            ),
+            models.Index(
+                fields=['tipo', '-puntuacion_tendencia', '-fecha_creacion', '-id'],
+                name='recurso_aprobado_tipo_tend',
+                condition=Q(estado='aprobado'),
+            ),
+        ]
 
     def __str__(self):
         return self.nombre
 
+    @property
+    def promedio_valoraciones(self):
+        """Promedio simple de las valoraciones, o None si no tiene ninguna."""
+        if not self.num_valoraciones:
+            return None
+        return self.suma_puntuaciones / self.num_valoraciones
+
+    @property
+    def histograma_valoraciones(self):
+        """Diccionario {estrellas: cantidad} de 1 a 5."""
+        return {estrellas: getattr(self, f'valoraciones_{estrellas}') for estrellas in range(1, 6)}
+
+    @classmethod
+    def calcular_puntuacion_bayesiana(cls, suma, cantidad):
+        return (cls.BAYES_PESO_PREVIO * cls.BAYES_MEDIA_PREVIA + suma) / (cls.BAYES_PESO_PREVIO + cantidad)
+
+    @classmethod
+    def ajustar_valoraciones(cls, recurso_id, puntuacion, signo):
+        """
+        Suma (signo=1) o resta (signo=-1) una valoración a los agregados del
+        recurso con un único UPDATE basado en F(), sin leer la fila antes.
+        """
+        puntuacion = int(puntuacion)  # ValoracionForm la entrega como cadena
+        nueva_suma = F('suma_puntuaciones') + signo * puntuacion
+        nueva_cantidad = F('num_valoraciones') + signo
+        return cls.objects.filter(pk=recurso_id).update(
+            num_valoraciones=nueva_cantidad,
+            suma_puntuaciones=nueva_suma,
+            **{f'valoraciones_{puntuacion}': F(f'valoraciones_{puntuacion}') + signo},
+            puntuacion_bayesiana=ExpressionWrapper(
+                (Value(cls.BAYES_PESO_PREVIO * cls.BAYES_MEDIA_PREVIA) + nueva_suma)
+                / (Value(float(cls.BAYES_PESO_PREVIO)) + nueva_cantidad),
+                output_field=FloatField(),
+            ),
+        )
+
 # Modelo para extender la información del usuario
 class Perfil(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='perfil')
@@ -108,6 +195,11 @@ class Valoracion(models.Model):
         ordering = ['-fecha_creacion']
         # Un usuario solo puede valorar un recurso una vez
         unique_together = ('recurso', 'user')
+        indexes = [
+            # Reseñas de un recurso, de la más reciente a la más antigua; el id
+            # desempata la paginación por cursor
+            models.Index(fields=['recurso', '-fecha_creacion', '-id'], name='valoracion_recurso_fecha'),
+        ]
 
     def __str__(self):
         return f"Valoración de {self.user.username} para {self.recurso.nombre}"
@@ -152,6 +244,17 @@ class MisionDiariaUsuario(models.Model):
         unique_together = ('perfil', 'mision', 'fecha_asignacion') # Un usuario, una misión, por día
         verbose_name = "Misión Diaria de Usuario"
         verbose_name_plural = "Misiones Diarias de Usuarios"
+        indexes = [
+            # Misiones del día de un perfil (dashboard y señal de login)
+            models.Index(fields=['perfil', '-fecha_asignacion'], name='mision_diaria_perfil_fecha'),
+            # Índice parcial con solo las pendientes, para el UPDATE condicional
+            # de misiones.completar_mision(); las completadas no ocupan espacio
+            models.Index(
+                fields=['perfil', 'fecha_asignacion', 'mision'],
+                name='mision_diaria_pendiente',
+                condition=Q(completada=False),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.perfil.user.username} - {self.mision.nombre} ({'Completada' if self.completada else 'Pendiente'}) el {self.fecha_asignacion}"
@@ -162,12 +265,144 @@ class HistorialVisitas(models.Model):
     """
     perfil = models.ForeignKey(Perfil, on_delete=models.CASCADE, related_name='historial_visitas')
     recurso = models.ForeignKey(Recurso, on_delete=models.CASCADE, related_name='visitas')
-    fecha_visita = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Visita")
+    # Sin auto_now_add: las visitas llegan en lote y conservan la hora del clic
+    fecha_visita = models.DateTimeField(default=timezone.now, verbose_name="Fecha de Visita")
 
     class Meta:
         ordering = ['-fecha_visita']
         verbose_name = "Historial de Visita"
         verbose_name_plural = "Historiales de Visitas"
+        indexes = [
+            models.Index(fields=['perfil', '-fecha_visita'], name='historial_perfil_fecha'),
+        ]
 
     def __str__(self):
         return f"{self.perfil.user.username} visitó {self.recurso.nombre} el {self.fecha_visita}"
+
+class UltimaVisita(models.Model):
+    """
+    Última visita de cada usuario a cada recurso. Se actualiza (upsert) al volcar
+    el buffer de visitas, para que "recursos visitados recientemente" sea una
+    consulta acotada por índice sin importar lo largo que sea el historial.
+    """
+    perfil = models.ForeignKey(Perfil, on_delete=models.CASCADE, related_name='ultimas_visitas')
+    recurso = models.ForeignKey(Recurso, on_delete=models.CASCADE, related_name='ultimas_visitas')
+    fecha_visita = models.DateTimeField(default=timezone.now, verbose_name="Fecha de la Última Visita")
+
+    class Meta:
+        ordering = ['-fecha_visita']
+        verbose_name = "Última Visita"
+        verbose_name_plural = "Últimas Visitas"
+        constraints = [
+            models.UniqueConstraint(fields=['perfil', 'recurso'], name='ultima_visita_perfil_recurso_unica'),
+        ]
+        indexes = [
+            models.Index(fields=['perfil', '-fecha_visita'], name='ultima_visita_perfil_fecha'),
+        ]
+
+    def __str__(self):
+        return f"{self.perfil.user.username} visitó por última vez {self.recurso.nombre} el {self.fecha_visita}"
+
+class CorreoPendiente(models.Model):
+    """
+    Bandeja de salida. Las vistas guardan aquí los correos dentro de su propia
+    transacción y el comando ``enviar_correos`` los manda por lotes (ver
+    correo.py), así que la respuesta no espera al servidor SMTP.
+    """
+    ESTADO_PENDIENTE = 'pendiente'
+    ESTADO_ENVIADO = 'enviado'
+    ESTADO_FALLIDO = 'fallido'
+    ESTADO_CHOICES = [
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_ENVIADO, 'Enviado'),
+        (ESTADO_FALLIDO, 'Fallido'),
+    ]
+
+    asunto = models.CharField(max_length=255, verbose_name="Asunto")
+    cuerpo = models.TextField(blank=True, verbose_name="Cuerpo")
+    remitente = models.CharField(max_length=254, verbose_name="Remitente")
+    destinatarios = models.JSONField(default=list, verbose_name="Destinatarios")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE, verbose_name="Estado")
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name="Intentos")
+    proximo_intento = models.DateTimeField(default=timezone.now, verbose_name="Próximo Intento")
+    ultimo_error = models.TextField(blank=True, verbose_name="Último Error")
+    fecha_creacion = models.DateTimeField(auto_now_add=True, verbose_name="Fecha de Creación")
+    fecha_envio = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de Envío")
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        verbose_name = "Correo Pendiente"
+        verbose_name_plural = "Correos Pendientes"
+        indexes = [
+            # Lo que consulta el worker en cada lote
+            models.Index(
+                fields=['proximo_intento', 'id'], name='correo_pendiente_proximo',
+                condition=Q(estado='pendiente'),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.asunto} para {', '.join(self.destinatarios)} ({self.get_estado_display()})"
+
+class RecursoSimilares(models.Model):
+    """
+    Vecinos más parecidos de cada recurso, precalculados por el comando
+    ``calcular_recomendaciones`` (ver recomendaciones.py). ``norma`` es la
+    del vector del recurso en el último cálculo y ``favoritos`` y
+    ``valoraciones`` sus conteos entonces, para detectar las bajas.
+    """
+    recurso = models.OneToOneField(Recurso, on_delete=models.CASCADE, primary_key=True, related_name='similares')
+    vecinos = models.JSONField(default=list, verbose_name="Vecinos", help_text="Lista de [recurso_id, similitud], de mayor a menor.")
+    norma = models.FloatField(default=0.0, verbose_name="Norma del Vector")
+    favoritos = models.PositiveIntegerField(default=0, verbose_name="Favoritos Contados")
+    valoraciones = models.PositiveIntegerField(default=0, verbose_name="Valoraciones Contadas")
+    fecha_calculo = models.DateTimeField(default=timezone.now, verbose_name="Fecha de Cálculo")
+
+    class Meta:
+        verbose_name = "Recursos Similares"
+        verbose_name_plural = "Recursos Similares"
+
+    def __str__(self):
+        return f"Similares a {self.recurso_id} ({len(self.vecinos)})"
+
+class PuntoControlTendencias(models.Model):
+    """
+    Fila única con el estado de actualizar_tendencias: hasta qué visita y
+    valoración se han sumado a las puntuaciones, los IDs por debajo de esa
+    marca que aún no se han visto (``{id: fecha en que se detectó}``) y el
+    instante de referencia en el que están expresadas (ver tendencias.py).
+    """
+    fecha_base = models.DateTimeField(verbose_name="Fecha Base")
+    ultima_visita_id = models.PositiveBigIntegerField(default=0, verbose_name="Última Visita Sumada")
+    ultima_valoracion_id = models.PositiveBigIntegerField(default=0, verbose_name="Última Valoración Sumada")
+    huecos_visitas = models.JSONField(default=dict, blank=True, verbose_name="Visitas Pendientes")
+    huecos_valoraciones = models.JSONField(default=dict, blank=True, verbose_name="Valoraciones Pendientes")
+    fecha_actualizacion = models.DateTimeField(null=True, blank=True, verbose_name="Última Actualización")
+
+    class Meta:
+        verbose_name = "Punto de Control de Tendencias"
+        verbose_name_plural = "Puntos de Control de Tendencias"
+
+    def __str__(self):
+        return f"Tendencias hasta la visita {self.ultima_visita_id} y la valoración {self.ultima_valoracion_id}"
+
+class PuntoControlRecomendaciones(models.Model):
+    """
+    Fila única con el estado de calcular_recomendaciones: hasta qué visita,
+    valoración y favorito se han revisado y los IDs por debajo de cada marca
+    que aún no se han visto, igual que en PuntoControlTendencias.
+    """
+    ultima_visita_id = models.PositiveBigIntegerField(default=0, verbose_name="Última Visita Revisada")
+    ultima_valoracion_id = models.PositiveBigIntegerField(default=0, verbose_name="Última Valoración Revisada")
+    ultimo_favorito_id = models.PositiveBigIntegerField(default=0, verbose_name="Último Favorito Revisado")
+    huecos_visitas = models.JSONField(default=dict, blank=True, verbose_name="Visitas Pendientes")
+    huecos_valoraciones = models.JSONField(default=dict, blank=True, verbose_name="Valoraciones Pendientes")
+    huecos_favoritos = models.JSONField(default=dict, blank=True, verbose_name="Favoritos Pendientes")
+    fecha_calculo = models.DateTimeField(null=True, blank=True, verbose_name="Último Cálculo")
+
+    class Meta:
+        verbose_name = "Punto de Control de Recomendaciones"
+        verbose_name_plural = "Puntos de Control de Recomendaciones"
+
+    def __str__(self):
+        return f"Recomendaciones hasta la visita {self.ultima_visita_id} y la valoración {self.ultima_valoracion_id}"
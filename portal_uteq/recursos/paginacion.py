@@ -0,0 +1,124 @@
+# portal_uteq/recursos/paginacion.py
+"""
+Paginación por cursor (keyset) para los listados.
+
+El cursor es la clave de ordenación del último elemento mostrado, firmada con
+django.core.signing. La página siguiente son los elementos con clave menor
+(todos los listados se ordenan de forma descendente), así que pedir la página
+100 cuesta lo mismo que pedir la primera y no hace falta un COUNT(*).
+
+El modo por cursor es el predeterminado; si llega ``?page=N`` se usa la
+paginación clásica de Django.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core import signing
+from django.db.models import Q
+
+SALT = 'recursos.paginacion'
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def microsegundos(fecha):
+    """Fecha como entero exacto de microsegundos, apto para claves de cursor."""
+    return (fecha - _EPOCH) // timedelta(microseconds=1)
+
+
+def desde_microsegundos(valor):
+    return _EPOCH + timedelta(microseconds=valor)
+
+
+def codificar_cursor(clave):
+    return signing.dumps(list(clave), salt=SALT, compress=True)
+
+
+def decodificar_cursor(token):
+    """Clave del cursor como tupla, o None si no hay cursor o no es válido."""
+    if not token:
+        return None
+    try:
+        return tuple(signing.loads(token, salt=SALT))
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def pagina_por_fecha(queryset, cursor, tamano):
+    """
+    Página keyset de un queryset ordenado por ``('-fecha_creacion', '-id')``.
+    Devuelve ``(objetos, clave_siguiente)``, como espera
+    ``PaginacionCursorMixin.pagina_por_cursor``.
+    """
+    if cursor is not None:
+        try:
+            fecha_us, ultimo_id = (int(valor) for valor in cursor)
+        except (TypeError, ValueError):
+            fecha_us, ultimo_id = None, None
+        if fecha_us is not None:
+            fecha = desde_microsegundos(fecha_us)
+            queryset = queryset.filter(Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=ultimo_id))
+    objetos = list(queryset[:tamano + 1])
+    if len(objetos) > tamano:
+        ultimo = objetos[tamano - 1]
+        return objetos[:tamano], (microsegundos(ultimo.fecha_creacion), ultimo.pk)
+    return objetos, None
+
+
+class PaginaCursor:
+    """Objeto mínimo compatible con ``page_obj`` en las plantillas."""
+
+    def __init__(self, object_list, cursor_siguiente):
+        self.object_list = object_list
+        self.cursor_siguiente = cursor_siguiente
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_previous(self):
+        return False
+
+    def has_other_pages(self):
+        return self.has_next()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class PaginacionCursorMixin:
+    """
+    Mixin para ListView. La vista implementa ``pagina_por_cursor(queryset,
+    cursor, tamano)``, que devuelve ``(objetos, clave_siguiente)``.
+    Con ``?fragmento=1`` se renderiza ``template_fragmento`` (solo las tarjetas),
+    que usa el botón "Cargar más".
+    """
+    template_fragmento = None
+
+    def usa_cursor(self):
+        return 'page' not in self.request.GET
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.usa_cursor():
+            return super().paginate_queryset(queryset, page_size)
+        cursor = decodificar_cursor(self.request.GET.get('cursor'))
+        objetos, clave_siguiente = self.pagina_por_cursor(queryset, cursor, page_size)
+        pagina = PaginaCursor(objetos, codificar_cursor(clave_siguiente) if clave_siguiente is not None else None)
+        return (None, pagina, objetos, pagina.has_next())
+
+    def get_template_names(self):
+        if self.request.GET.get('fragmento') and self.template_fragmento:
+            return [self.template_fragmento]
+        return super().get_template_names()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Siempre definida: en la última página la plantilla no la busca en vano
+        context['url_cargar_mas'] = None
+        pagina = context.get('page_obj')
+        if isinstance(pagina, PaginaCursor) and pagina.has_next():
+            parametros = self.request.GET.copy()
+            parametros['cursor'] = pagina.cursor_siguiente
+            parametros['fragmento'] = '1'
+            context['url_cargar_mas'] = f'{self.request.path}?{parametros.urlencode()}'
+        return context
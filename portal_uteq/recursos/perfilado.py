@@ -0,0 +1,245 @@
+# portal_uteq/recursos/perfilado.py
+"""
+Middleware de perfilado de peticiones (opcional).
+
+Con PERFILADO_ACTIVO = True mide en cada petición el número y el tiempo de
+las consultas SQL, el tiempo de renderizado de plantillas y los aciertos y
+fallos de caché, y lo envía en la cabecera ``Server-Timing`` (solo al
+personal o con DEBUG). Además guarda un volcado de cProfile (.prof, legible
+con pstats o snakeviz) en PERFILADO_DIRECTORIO, del que se conservan los
+PERFILADO_MAX_ARCHIVOS más recientes, cuando:
+
+- la petición sale en el muestreo (PERFILADO_MUESTREO, fracción de 0 a 1);
+- tarda más de PERFILADO_UMBRAL_MS (esto obliga a perfilar todas las
+  peticiones y descartar las rápidas, así que conviene usarlo con cuidado);
+- un usuario del personal lo pide con ``?perfilar=<token>``. El token se
+  obtiene con ``python manage.py token_perfilado <usuario>`` y caduca en una
+  hora; el nombre del volcado vuelve en la cabecera ``X-Perfil``.
+
+Desactivado, el middleware se retira de la cadena (MiddlewareNotUsed) y la
+instrumentación de plantillas y caché no llega a instalarse.
+"""
+from contextlib import ExitStack
+from contextvars import ContextVar
+import cProfile
+import logging
+import os
+from pathlib import Path
+import random
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+from django.utils.text import slugify
+
+logger = logging.getLogger(__name__)
+
+SALT = 'recursos.perfilado'
+PARAMETRO = 'perfilar'
+VIGENCIA_TOKEN = 60 * 60
+
+_medicion = ContextVar('perfilado_medicion', default=None)
+_AUSENTE = object()
+
+
+class Medicion:
+    __slots__ = ('consultas', 'tiempo_sql', 'tiempo_plantillas', 'aciertos_cache', 'fallos_cache')
+
+    def __init__(self):
+        self.consultas = 0
+        self.tiempo_sql = 0.0
+        self.tiempo_plantillas = 0.0
+        self.aciertos_cache = 0
+        self.fallos_cache = 0
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.tiempo_sql * 1000:.1f};desc="{self.consultas} consultas"',
+            f'tpl;dur={self.tiempo_plantillas * 1000:.1f};desc="Plantillas"',
+            f'cache;desc="{self.aciertos_cache} aciertos, {self.fallos_cache} fallos"',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def token_perfilado(user):
+    return signing.dumps(user.pk, salt=SALT)
+
+
+def _usuario_del_token(token):
+    try:
+        return signing.loads(token, salt=SALT, max_age=VIGENCIA_TOKEN)
+    except signing.BadSignature:
+        return None
+
+
+# --- Instrumentación ---
+# Las consultas se miden con execute_wrapper solo durante la petición. Las
+# plantillas y la caché se envuelven una vez por proceso al activar el
+# middleware; fuera de una petición medida, los envoltorios solo consultan
+# la ContextVar.
+
+def _medir_sql(execute, sql, params, many, context):
+    medicion = _medicion.get()
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if medicion is not None:
+            medicion.consultas += 1
+            medicion.tiempo_sql += time.perf_counter() - inicio
+
+
+def _envolver_plantillas():
+    # Solo la plantilla de nivel superior: los {% include %} ya están dentro
+    from django.template.backends.django import Template
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        medicion = _medicion.get()
+        if medicion is None:
+            return original(self, context, request)
+        inicio = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            medicion.tiempo_plantillas += time.perf_counter() - inicio
+
+    Template.render = render
+
+
+def _envolver_cache(clase):
+    get_original = clase.get
+
+    def get(self, key, default=None, version=None):
+        medicion = _medicion.get()
+        if medicion is None:
+            return get_original(self, key, default, version)
+        valor = get_original(self, key, _AUSENTE, version)
+        if valor is _AUSENTE:
+            medicion.fallos_cache += 1
+            return default
+        medicion.aciertos_cache += 1
+        return valor
+
+    clase.get = get
+
+    # El get_many genérico de BaseCache llama a get(): solo se envuelve si el
+    # backend tiene uno propio, para no contar dos veces
+    if 'get_many' in vars(clase):
+        get_many_original = clase.get_many
+
+        def get_many(self, keys, version=None):
+            encontrados = get_many_original(self, keys, version)
+            medicion = _medicion.get()
+            if medicion is not None:
+                medicion.aciertos_cache += len(encontrados)
+                medicion.fallos_cache += len(keys) - len(encontrados)
+            return encontrados
+
+        clase.get_many = get_many
+
+
+_instalada = False
+
+
+def _instalar():
+    global _instalada
+    if _instalada:
+        return
+    _envolver_plantillas()
+    clases = {type(caches[alias]) for alias in settings.CACHES}
+    for clase in clases:
+        _envolver_cache(clase)
+    _instalada = True
+
+
+class PerfiladoMiddleware:
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFILADO_ACTIVO', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.muestreo = getattr(settings, 'PERFILADO_MUESTREO', 0.0)
+        self.umbral = getattr(settings, 'PERFILADO_UMBRAL_MS', 0) / 1000
+        self.directorio = Path(getattr(settings, 'PERFILADO_DIRECTORIO', settings.BASE_DIR / 'perfiles'))
+        self.max_archivos = getattr(settings, 'PERFILADO_MAX_ARCHIVOS', 200)
+        _instalar()
+
+    def __call__(self, request):
+        solicitado_por = None
+        if PARAMETRO in request.GET:
+            solicitado_por = _usuario_del_token(request.GET[PARAMETRO])
+        muestreada = random.random() < self.muestreo
+        perfil = None
+        if solicitado_por is not None or muestreada or self.umbral:
+            perfil = cProfile.Profile()
+
+        medicion = Medicion()
+        token = _medicion.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pila:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(_medir_sql))
+                perfil = self._activar(perfil)
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if perfil is not None:
+                        perfil.disable()
+        finally:
+            _medicion.reset(token)
+        total = time.perf_counter() - inicio
+
+        user = getattr(request, 'user', None)
+        es_personal = bool(user is not None and user.is_authenticated and user.is_staff)
+        bajo_demanda = es_personal and solicitado_por == user.pk
+        if perfil is not None and (bajo_demanda or muestreada or (self.umbral and total >= self.umbral)):
+            nombre = self._guardar(perfil, request, total)
+            if bajo_demanda and nombre:
+                response['X-Perfil'] = nombre
+
+        if es_personal or settings.DEBUG:
+            response['Server-Timing'] = medicion.server_timing(total)
+        return response
+
+    def _activar(self, perfil):
+        if perfil is None:
+            return None
+        try:
+            perfil.enable()
+        except ValueError:
+            # Ya hay otro perfilador activo en este hilo
+            return None
+        return perfil
+
+    def _guardar(self, perfil, request, total):
+        nombre = '{}-{}-{}-{}ms.prof'.format(
+            timezone.now().strftime('%Y%m%d-%H%M%S-%f'),
+            request.method.lower(),
+            slugify(request.path.replace('/', ' '))[:60] or 'raiz',
+            round(total * 1000),
+        )
+        try:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            perfil.dump_stats(self.directorio / nombre)
+            self._rotar()
+        except OSError:
+            logger.exception("No se pudo guardar el perfil %s", nombre)
+            return None
+        return nombre
+
+    def _rotar(self):
+        archivos = sorted(
+            (entrada for entrada in os.scandir(self.directorio) if entrada.name.endswith('.prof')),
+            key=lambda entrada: entrada.stat().st_mtime,
+        )
+        for entrada in archivos[:max(len(archivos) - self.max_archivos, 0)]:
+            try:
+                os.remove(entrada.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,289 @@
+# portal_uteq/recursos/recomendaciones.py
+"""
+Recomendaciones ítem a ítem ("recursos similares" y "recomendados para ti").
+
+Cada recurso aprobado se representa como un vector disperso sobre los
+perfiles que interactuaron con él, con un peso por interacción:
+log(1 + visitas) * PESO_VISITA, PESO_FAVORITO si es favorito y
+PESO_VALORACION * puntuación / 5 si lo valoró. Dos recursos se parecen según
+la similitud del coseno de sus vectores.
+
+El cálculo se hace fuera de línea con ``calcular_recomendaciones``: los
+vectores se guardan en diccionarios (perfil -> peso) y un índice invertido
+(perfil -> recursos) limita los productos a los pares que comparten algún
+perfil, así que no hace falta NumPy/SciPy. Los VECINOS más parecidos de
+cada recurso se guardan en RecursoSimilares junto a la norma de su vector.
+
+Una ejecución incremental no lee todas las interacciones. Los recursos que
+cambiaron salen de las visitas, valoraciones y favoritos con ID posterior a
+la marca del PuntoControlRecomendaciones (con los mismos huecos que en
+tendencias.py) y de comparar los conteos de favoritos y valoraciones, que
+delatan las bajas. Se recalculan esos recursos y los que los tenían como
+vecino o tienen un vecino que ya no está aprobado. Para ello solo se cargan
+las interacciones de los perfiles que usaron alguno de ellos; las normas de
+los demás recursos son las guardadas. Un recurso que cambió también entra en
+la lista de otro si ahora supera al último de sus vecinos. Los borrados de
+visitas (al eliminar un usuario) esperan al siguiente --completo.
+
+Las vistas solo leen las listas precalculadas (y las guardan en caché).
+"""
+from collections import defaultdict
+import heapq
+from itertools import islice
+import math
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import tendencias
+
+PESO_VISITA = 1.0
+PESO_FAVORITO = 3.0
+PESO_VALORACION = 2.0
+# Perfiles muy activos: solo cuentan sus recursos de más peso, para que el
+# número de pares no crezca con el cuadrado de su historial
+MAX_POR_PERFIL = 100
+VECINOS = 10
+CACHE_TIMEOUT = 60 * 15
+CLAVE_VERSION = 'recomendaciones:version'
+
+
+def version():
+    return cache.get_or_set(CLAVE_VERSION, lambda: uuid.uuid4().hex, None)
+
+
+def invalidar():
+    cache.set(CLAVE_VERSION, uuid.uuid4().hex, None)
+
+
+# --- Cálculo fuera de línea ---
+
+def _lotes(ids, tamano=500):
+    ids = sorted(ids)
+    for i in range(0, len(ids), tamano):
+        yield ids[i:i + tamano]
+
+
+def _interacciones(aprobados, recursos=None, perfiles=None):
+    """
+    recurso_id -> {perfil_id: peso} de los recursos ``aprobados``. Con
+    ``recursos`` o ``perfiles`` solo se leen las interacciones de esos
+    recursos o de esos perfiles.
+    """
+    from .models import HistorialVisitas, Perfil, Valoracion
+
+    if recursos is not None:
+        filtros = [(Q(recurso_id__in=lote), Q(recurso_id__in=lote)) for lote in _lotes(recursos)]
+    elif perfiles is not None:
+        filtros = [(Q(perfil_id__in=lote), Q(user__perfil__in=lote)) for lote in _lotes(perfiles)]
+    else:
+        filtros = [(Q(), Q())]
+    vectores = defaultdict(dict)
+
+    def sumar(perfil_id, recurso_id, peso):
+        if perfil_id is not None and recurso_id in aprobados:
+            vector = vectores[recurso_id]
+            vector[perfil_id] = vector.get(perfil_id, 0.0) + peso
+
+    for por_perfil, por_usuario in filtros:
+        visitas = (
+            HistorialVisitas.objects.filter(por_perfil).order_by().values('perfil_id', 'recurso_id')
+            .annotate(n=Count('id')).values_list('perfil_id', 'recurso_id', 'n')
+        )
+        for perfil_id, recurso_id, n in visitas.iterator(chunk_size=5000):
+            sumar(perfil_id, recurso_id, PESO_VISITA * math.log1p(n))
+        favoritos = Perfil.recursos_favoritos.through.objects.filter(por_perfil).values_list('perfil_id', 'recurso_id')
+        for perfil_id, recurso_id in favoritos.iterator(chunk_size=5000):
+            sumar(perfil_id, recurso_id, PESO_FAVORITO)
+        valoraciones = Valoracion.objects.filter(por_usuario).values_list('user__perfil', 'recurso_id', 'puntuacion')
+        for perfil_id, recurso_id, puntuacion in valoraciones.iterator(chunk_size=5000):
+            sumar(perfil_id, recurso_id, PESO_VALORACION * puntuacion / 5)
+    return vectores
+
+
+def _norma(vector):
+    return math.sqrt(sum(peso * peso for peso in vector.values()))
+
+
+def calcular(completo=False, vecinos=VECINOS):
+    """
+    Recalcula los vecinos de los recursos que cambiaron y de los que los
+    tenían como vecino (o de todos con ``completo``). Devuelve
+    ``(recalculados, aprobados)``.
+    """
+    from .models import HistorialVisitas, Perfil, PuntoControlRecomendaciones, Recurso, RecursoSimilares, Valoracion
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        # El bloqueo de la fila evita que dos ejecuciones se pisen
+        control, creado = PuntoControlRecomendaciones.objects.select_for_update().get_or_create(pk=1)
+        completo = completo or creado
+        valoraciones = dict(
+            Recurso.objects.filter(estado=Recurso.ESTADO_APROBADO).values_list('pk', 'num_valoraciones')
+        )
+        aprobados = valoraciones.keys()
+        favoritos = dict(
+            Perfil.recursos_favoritos.through.objects.order_by().values('recurso_id')
+            .annotate(n=Count('id')).values_list('recurso_id', 'n')
+        )
+        anteriores = {} if completo else {
+            recurso_id: (norma, vecinos_previos, conteos)
+            for recurso_id, norma, vecinos_previos, *conteos in RecursoSimilares.objects.values_list(
+                'recurso_id', 'norma', 'vecinos', 'favoritos', 'valoraciones'
+            ).iterator(chunk_size=5000)
+            if recurso_id in aprobados
+        }
+
+        tocados = set()
+        control.ultima_visita_id, control.huecos_visitas = tendencias.recorrer_eventos(
+            HistorialVisitas.objects.values_list('pk', 'recurso_id'),
+            control.ultima_visita_id, control.huecos_visitas, ahora, tocados.add,
+        )
+        control.ultima_valoracion_id, control.huecos_valoraciones = tendencias.recorrer_eventos(
+            Valoracion.objects.values_list('pk', 'recurso_id'),
+            control.ultima_valoracion_id, control.huecos_valoraciones, ahora, tocados.add,
+        )
+        control.ultimo_favorito_id, control.huecos_favoritos = tendencias.recorrer_eventos(
+            Perfil.recursos_favoritos.through.objects.values_list('pk', 'recurso_id'),
+            control.ultimo_favorito_id, control.huecos_favoritos, ahora, tocados.add,
+        )
+
+        if completo:
+            cambiados = pendientes = set(aprobados)
+            vectores = _interacciones(aprobados)
+        else:
+            cambiados = {
+                recurso_id for recurso_id in aprobados
+                if recurso_id in tocados or recurso_id not in anteriores
+                or anteriores[recurso_id][2] != [favoritos.get(recurso_id, 0), valoraciones[recurso_id]]
+            }
+            # Los que tenían como vecino uno que cambió o que dejó de estar aprobado
+            pendientes = cambiados | {
+                recurso_id for recurso_id, (_, vecinos_previos, _) in anteriores.items()
+                if any(otro_id in cambiados or otro_id not in aprobados for otro_id, _ in vecinos_previos)
+            }
+            perfiles = set()
+            for vector in _interacciones(aprobados, recursos=pendientes).values():
+                perfiles.update(vector)
+            # Vectores completos de los pendientes y, de los demás, solo lo que comparten con ellos
+            vectores = _interacciones(aprobados, perfiles=perfiles)
+
+        normas = {recurso_id: norma for recurso_id, (norma, _, _) in anteriores.items()}
+        normas.update((recurso_id, _norma(vectores.get(recurso_id, {}))) for recurso_id in pendientes)
+        por_perfil = defaultdict(list)
+        for recurso_id, vector in vectores.items():
+            for perfil_id, peso in vector.items():
+                por_perfil[perfil_id].append((peso, recurso_id))
+        for lista in por_perfil.values():
+            if len(lista) > MAX_POR_PERFIL:
+                lista.sort(reverse=True)
+                del lista[MAX_POR_PERFIL:]
+
+        filas = {}
+        candidatos = defaultdict(list)
+        for recurso_id in pendientes:
+            productos = defaultdict(float)
+            for perfil_id, peso in vectores.get(recurso_id, {}).items():
+                for peso_otro, otro_id in por_perfil[perfil_id]:
+                    if otro_id != recurso_id:
+                        productos[otro_id] += peso * peso_otro
+            similitudes = [
+                (round(producto / (normas[recurso_id] * normas[otro_id]), 4), otro_id)
+                for otro_id, producto in productos.items()
+            ]
+            filas[recurso_id] = RecursoSimilares(
+                recurso_id=recurso_id,
+                vecinos=[[otro_id, similitud] for similitud, otro_id in heapq.nlargest(vecinos, similitudes)],
+                norma=normas[recurso_id],
+                favoritos=favoritos.get(recurso_id, 0),
+                valoraciones=valoraciones[recurso_id],
+                fecha_calculo=ahora,
+            )
+            if recurso_id in cambiados and not completo:
+                for similitud, otro_id in similitudes:
+                    if otro_id not in pendientes:
+                        candidatos[otro_id].append((similitud, recurso_id))
+
+        # Los demás no cambiaron, pero un recurso que cambió puede entrar en su lista
+        for recurso_id, nuevos in candidatos.items():
+            norma, vecinos_previos, (num_favoritos, num_valoraciones) = anteriores[recurso_id]
+            previos = [(similitud, otro_id) for otro_id, similitud in vecinos_previos]
+            mejores = heapq.nlargest(vecinos, previos + nuevos)
+            if mejores != previos:
+                filas[recurso_id] = RecursoSimilares(
+                    recurso_id=recurso_id,
+                    vecinos=[[otro_id, similitud] for similitud, otro_id in mejores],
+                    norma=norma,
+                    favoritos=num_favoritos,
+                    valoraciones=num_valoraciones,
+                    fecha_calculo=ahora,
+                )
+
+        # Los que dejaron de estar aprobados no se recomiendan ni tienen vecinos
+        RecursoSimilares.objects.exclude(recurso__estado=Recurso.ESTADO_APROBADO).delete()
+        iterador = iter(filas.values())
+        while lote := list(islice(iterador, 1000)):
+            RecursoSimilares.objects.bulk_create(
+                lote, update_conflicts=True, unique_fields=['recurso'],
+                update_fields=['vecinos', 'norma', 'favoritos', 'valoraciones', 'fecha_calculo'],
+            )
+        control.fecha_calculo = ahora
+        control.save()
+    invalidar()
+    return len(pendientes), len(aprobados)
+
+
+# --- Consultas de las vistas ---
+
+def _cargar(ids, n):
+    """Los ``n`` primeros recursos aprobados de ``ids``, en ese orden."""
+    from .models import Recurso
+    # Se piden algunos de más por si alguno dejó de estar aprobado
+    candidatos = ids[:n * 2]
+    recursos = Recurso.objects.filter(pk__in=candidatos, estado=Recurso.ESTADO_APROBADO).in_bulk()
+    return [recursos[pk] for pk in candidatos if pk in recursos][:n]
+
+
+def similares(recurso_id, n=4):
+    """Recursos más parecidos a ``recurso_id``."""
+    from .models import RecursoSimilares
+
+    clave = f'recomendaciones:similares:{version()}:{recurso_id}:{n}'
+    recursos = cache.get(clave)
+    if recursos is None:
+        vecinos = next(iter(RecursoSimilares.objects.filter(pk=recurso_id).values_list('vecinos', flat=True)), [])
+        recursos = _cargar([otro_id for otro_id, _ in vecinos], n)
+        cache.set(clave, recursos, CACHE_TIMEOUT)
+    return recursos
+
+
+def para_perfil(perfil_id, n=6):
+    """
+    Recomendaciones a partir de las últimas visitas y los favoritos del
+    perfil: se suman las similitudes de sus vecinos y se descartan los
+    recursos que ya conoce.
+    """
+    from .models import Perfil, RecursoSimilares, UltimaVisita
+
+    clave = f'recomendaciones:perfil:{version()}:{perfil_id}:{n}'
+    recursos = cache.get(clave)
+    if recursos is not None:
+        return recursos
+
+    semillas = list(
+        UltimaVisita.objects.filter(perfil_id=perfil_id).order_by('-fecha_visita').values_list('recurso_id', flat=True)[:10]
+    )
+    semillas += Perfil.recursos_favoritos.through.objects.filter(perfil_id=perfil_id).values_list('recurso_id', flat=True)[:20]
+    puntuaciones = defaultdict(float)
+    if semillas:
+        for vecinos in RecursoSimilares.objects.filter(pk__in=semillas).values_list('vecinos', flat=True):
+            for otro_id, similitud in vecinos:
+                puntuaciones[otro_id] += similitud
+    conocidos = set(semillas)
+    ordenados = sorted((pk for pk in puntuaciones if pk not in conocidos), key=lambda pk: (-puntuaciones[pk], pk))
+    recursos = _cargar(ordenados, n) if ordenados else []
+    cache.set(clave, recursos, CACHE_TIMEOUT)
+    return recursos
@@ -0,0 +1,167 @@
+# portal_uteq/recursos/registros.py
+"""
+Lectura del archivo de log para el visor del personal.
+
+El archivo lo rota logrotate, fuera de la aplicación, renombrándolo
+(django_errors.log, .1, .2, ...; ver LOGGING en settings), así que una
+posición se identifica con el inodo del archivo y un offset en bytes:
+``"<inodo>:<offset>"``. Si el archivo rotó desde la última lectura, el inodo
+se encuentra en alguna copia (.1, .2, ...) y se continúa leyendo desde ahí
+hasta llegar al archivo actual. Una rotación con copytruncate conservaría el
+inodo y no se podría seguir.
+
+Todo se lee por bloques de tamaño fijo y las entradas multilínea (trazas de
+excepciones) se acumulan con un límite, así que la memoria usada no depende
+del tamaño del log.
+"""
+import logging
+import os
+import re
+
+from django.conf import settings
+
+TAMANO_BLOQUE = 64 * 1024
+MAX_ENTRADA = 64 * 1024
+COLA_POR_DEFECTO = 64 * 1024
+
+NIVELES = {nombre: logging.getLevelName(nombre) for nombre in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')}
+# Cabecera de cada entrada según el formato 'detallado' de LOGGING
+_CABECERA_RE = re.compile(rb'^\d{4}-\d{2}-\d{2} [\d:,.]+ (DEBUG|INFO|WARNING|ERROR|CRITICAL) ')
+
+
+def archivos():
+    """Rutas del log, de la copia más antigua al archivo actual."""
+    base = str(settings.LOG_ARCHIVO)
+    copias = [f'{base}.{n}' for n in range(getattr(settings, 'LOG_COPIAS', 5), 0, -1)]
+    return [ruta for ruta in copias if os.path.exists(ruta)] + [base]
+
+
+def posicion(ruta, offset):
+    return f'{os.stat(ruta).st_ino}:{offset}'
+
+
+def _fin_de_linea(ruta, fin):
+    """
+    Offset justo después del último salto de línea antes de ``fin``, para no
+    cortar una línea que se está escribiendo (se leerá entera la próxima vez).
+    """
+    inicio = max(fin - TAMANO_BLOQUE, 0)
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        indice = archivo.read(fin - inicio).rfind(b'\n')
+    return inicio + indice + 1 if indice >= 0 else fin
+
+
+def _tramos(desde, cola):
+    """
+    Lista de (ruta, inicio, fin) a leer. ``desde`` es una posición devuelta
+    por una lectura anterior; sin ella se leen los últimos ``cola`` bytes del
+    archivo actual. ``fin`` es el tamaño en este momento: lo que se escriba
+    mientras tanto se leerá en la siguiente petición.
+    """
+    rutas = archivos()
+    actual = rutas[-1]
+    if not os.path.exists(actual):
+        return [], None
+    fin_actual = _fin_de_linea(actual, os.stat(actual).st_size)
+
+    if desde:
+        try:
+            inodo, offset = (int(parte) for parte in desde.split(':'))
+        except ValueError:
+            inodo, offset = None, 0
+        for indice, ruta in enumerate(rutas):
+            try:
+                estado = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            if estado.st_ino == inodo:
+                if ruta == actual:
+                    return [(actual, min(offset, fin_actual), fin_actual)], posicion(actual, fin_actual)
+                tramos = [(ruta, min(offset, estado.st_size), estado.st_size)]
+                tramos += [(siguiente, 0, os.stat(siguiente).st_size) for siguiente in rutas[indice + 1:-1]]
+                return tramos + [(actual, 0, fin_actual)], posicion(actual, fin_actual)
+        # El inodo ya no existe (rotó más veces que copias hay): desde el
+        # principio de la copia más antigua que queda
+        tramos = [(ruta, 0, os.stat(ruta).st_size) for ruta in rutas[:-1]]
+        return tramos + [(actual, 0, fin_actual)], posicion(actual, fin_actual)
+
+    return [(actual, max(fin_actual - cola, 0), fin_actual)], posicion(actual, fin_actual)
+
+
+def _lineas(ruta, inicio, fin):
+    """Líneas (bytes, con su salto) entre dos offsets, leyendo por bloques."""
+    with open(ruta, 'rb') as archivo:
+        if inicio:
+            # Empezamos a mitad de una línea: se descarta hasta el siguiente salto
+            archivo.seek(inicio - 1)
+            if archivo.read(1) != b'\n':
+                descartado = archivo.readline(fin - inicio)
+                inicio += len(descartado)
+        pendiente = fin - inicio
+        resto = b''
+        while pendiente > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE, pendiente))
+            if not bloque:
+                break
+            pendiente -= len(bloque)
+            partes = (resto + bloque).split(b'\n')
+            resto = partes.pop()
+            if len(resto) > MAX_ENTRADA:
+                partes.append(resto[:MAX_ENTRADA] + b' [...]')
+                resto = b''
+            for parte in partes:
+                yield parte + b'\n'
+        if resto:
+            yield resto + b'\n'
+
+
+def leer(desde=None, nivel=None, contiene=None, cola=COLA_POR_DEFECTO):
+    """
+    Devuelve ``(siguiente, generador)``. ``siguiente`` es la posición desde la
+    que continuar en la próxima llamada y el generador produce las entradas
+    (texto) con nivel >= ``nivel`` que contienen ``contiene``.
+    """
+    tramos, siguiente = _tramos(desde, cola)
+    nivel_minimo = NIVELES.get((nivel or '').upper(), 0)
+    aguja = (contiene or '').lower().encode()
+
+    def entradas():
+        entrada = []
+        tamano = 0
+        nivel_entrada = 0
+        con_cabecera = False
+
+        def emitir():
+            if entrada and nivel_entrada >= nivel_minimo:
+                texto = b''.join(entrada)
+                if not aguja or aguja in texto.lower():
+                    return texto.decode('utf-8', errors='replace')
+            return None
+
+        for ruta, inicio, fin in tramos:
+            try:
+                lineas = _lineas(ruta, inicio, fin)
+                for linea in lineas:
+                    cabecera = _CABECERA_RE.match(linea)
+                    # Una línea sin cabecera continúa la entrada anterior (p. ej.
+                    # una traza); si tampoco la tenía, cada línea va por separado
+                    # y se trata como DEBUG (formato antiguo o entrada cortada)
+                    if cabecera or not con_cabecera:
+                        texto = emitir()
+                        if texto:
+                            yield texto
+                        entrada, tamano = [], 0
+                        con_cabecera = bool(cabecera)
+                        nivel_entrada = NIVELES[cabecera.group(1).decode()] if cabecera else logging.DEBUG
+                    if tamano < MAX_ENTRADA:
+                        entrada.append(linea)
+                        tamano += len(linea)
+            except FileNotFoundError:
+                # Rotó justo mientras leíamos: lo que falte sale en la siguiente petición
+                continue
+        texto = emitir()
+        if texto:
+            yield texto
+
+    return siguiente, entradas()
@@ -0,0 +1,56 @@
+# portal_uteq/recursos/roles.py
+"""
+Resolución de roles (grupos) de usuario.
+
+Los nombres de grupo de un usuario se cargan una sola vez por petición (se
+memorizan en el propio objeto ``request.user``) y se guardan en la caché de
+Django entre peticiones. Las claves llevan una versión global que cambia al
+renombrar o borrar un Group; los cambios de pertenencia (m2m_changed sobre
+User.groups) borran la entrada del usuario afectado. Ver signals.py.
+Caducidad sin caché compartida: ver compartida.py.
+"""
+import uuid
+
+from django.core.cache import cache
+
+from . import compartida
+
+CLAVE_VERSION = 'roles:version'
+CACHE_TIMEOUT = 60 * 60
+_ATRIBUTO_MEMO = '_grupos_resueltos'
+
+
+def _clave(user_id):
+    version = cache.get_or_set(CLAVE_VERSION, lambda: uuid.uuid4().hex, compartida.timeout())
+    return f'roles:{version}:{user_id}'
+
+
+def grupos_de(user):
+    """frozenset con los nombres de los grupos del usuario."""
+    if not getattr(user, 'is_authenticated', False):
+        return frozenset()
+    grupos = getattr(user, _ATRIBUTO_MEMO, None)
+    if grupos is None:
+        clave = _clave(user.pk)
+        grupos = cache.get(clave)
+        if grupos is None:
+            grupos = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(clave, grupos, compartida.timeout(CACHE_TIMEOUT))
+        setattr(user, _ATRIBUTO_MEMO, grupos)
+    return grupos
+
+
+def en_grupo(user, nombre):
+    return nombre in grupos_de(user)
+
+
+def en_alguno(user, nombres):
+    return not grupos_de(user).isdisjoint(nombres)
+
+
+def invalidar_usuario(user_id):
+    cache.delete(_clave(user_id))
+
+
+def invalidar_todos():
+    cache.set(CLAVE_VERSION, uuid.uuid4().hex, compartida.timeout())
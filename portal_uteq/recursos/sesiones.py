@@ -0,0 +1,108 @@
+# portal_uteq/recursos/sesiones.py
+"""
+Motor de sesiones con caducidad deslizante y pocas escrituras.
+
+Con SESSION_SAVE_EVERY_REQUEST cada petición guarda la sesión para mover su
+caducidad. Este motor (SESSION_ENGINE = 'portal_uteq.recursos.sesiones')
+mantiene ese comportamiento, pero:
+
+- Los datos se leen de la caché (SESSION_CACHE_ALIAS); la base de datos solo
+  se consulta si la entrada no está en caché.
+- Si los datos cambian (login, logout, cualquier ``request.session[...] =``)
+  se escriben en la caché y en la base de datos en el mismo momento.
+- Si solo hay que mover la caducidad, se actualiza la entrada de la caché en
+  cada petición y la fila de ``django_session`` se reescribe después, cuando
+  ha pasado SESION_FRACCION_ESCRITURA de la vida de la sesión desde la última
+  escritura (con 0.1 y 30 minutos, como mucho una escritura cada 3 minutos).
+
+La caché manda mientras tiene la entrada, así que el tiempo de inactividad
+sigue siendo exactamente SESSION_COOKIE_AGE. Si la entrada se pierde, vale la
+caducidad de la base de datos, que como mucho se queda atrás esa fracción.
+
+Sin caché compartida se comporta como el motor de base de datos (ver compartida.py).
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+
+from . import compartida
+
+KEY_PREFIX = 'recursos.sesiones:'
+
+
+class SessionStore(DBStore):
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        self._usa_cache = compartida.cache_compartida(settings.SESSION_CACHE_ALIAS)
+        # Momento (time.time()) de la última escritura de la fila en la base de datos
+        self._ultima_escritura = None
+
+    @property
+    def cache_key(self):
+        return KEY_PREFIX + self._get_or_create_session_key()
+
+    def _intervalo_escritura(self):
+        fraccion = getattr(settings, 'SESION_FRACCION_ESCRITURA', 0.1)
+        return self.get_session_cookie_age() * fraccion
+
+    def load(self):
+        if not self._usa_cache:
+            return super().load()
+        try:
+            entrada = self._cache.get(self.cache_key)
+        except Exception:
+            # Sin caché disponible se sigue con la base de datos
+            entrada = None
+        if entrada is not None and entrada['expira'] > time.time():
+            self._ultima_escritura = entrada['escrito']
+            return entrada['datos']
+
+        s = self._get_session_from_db()
+        if not s:
+            self._session_key = None
+            return {}
+        datos = self.decode(s.session_data)
+        # La fila no guarda cuándo se escribió: se deduce de su caducidad
+        self._ultima_escritura = s.expire_date.timestamp() - self.get_session_cookie_age()
+        self._guardar_en_cache(datos, s.expire_date.timestamp())
+        return datos
+
+    def save(self, must_create=False):
+        if not self._usa_cache:
+            return super().save(must_create=must_create)
+        if self.session_key is None:
+            return self.create()
+        ahora = time.time()
+        if (
+            must_create or self.modified or self._ultima_escritura is None
+            or ahora - self._ultima_escritura >= self._intervalo_escritura()
+        ):
+            super().save(must_create=must_create)
+            self._ultima_escritura = ahora
+        self._guardar_en_cache(self._get_session(no_load=must_create), ahora + self.get_expiry_age())
+
+    def _guardar_en_cache(self, datos, expira):
+        entrada = {'datos': datos, 'expira': expira, 'escrito': self._ultima_escritura}
+        try:
+            self._cache.set(self.cache_key, entrada, max(int(expira - time.time()), 1))
+        except Exception:
+            pass
+
+    def exists(self, session_key):
+        if not self._usa_cache:
+            return super().exists(session_key)
+        return KEY_PREFIX + session_key in self._cache or super().exists(session_key)
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        if not self._usa_cache:
+            return
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(KEY_PREFIX + session_key)
@@ -1,77 +1,271 @@
 # portal_uteq/recursos/signals.py
 from django.contrib.auth.signals import user_logged_in
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from datetime import date, timedelta
+from datetime import timedelta
 from django.utils import timezone
-from .models import Perfil, Mision, MisionDiariaUsuario
+from django.db.models import F
+from .models import Carrera, Perfil, Mision, MisionDiariaUsuario, Recurso, Valoracion
+from . import busqueda, clasificacion, condicional, imagenes, listados, misiones, roles, visitas
+from django.core.cache import cache
 import random
 
 from django.db import transaction
 
 @receiver(user_logged_in)
 def update_streak_and_assign_missions(sender, request, user, **kwargs):
-    if hasattr(user, 'perfil'):
-        with transaction.atomic():
-            profile = Perfil.objects.select_for_update().get(pk=user.perfil.pk)
-            current_datetime = timezone.now()
-            
-            # Convertir a la zona horaria local para obtener la fecha correcta
-            local_datetime = timezone.localtime(current_datetime)
-            current_date = local_datetime.date()
-
-            # --- Lógica de Racha Temporal por Minutos ---
-            if profile.ultima_conexion_racha:
-                time_difference = current_datetime - profile.ultima_conexion_racha
-                
-                if timedelta(seconds=0) < time_difference <= timedelta(minutes=5):
-                    profile.racha_actual += 1
-                elif time_difference > timedelta(minutes=5):
-                    profile.racha_actual = 1
-            else:
+    """
+    Actualiza la racha, asigna las misiones del día y completa la de login.
+    Hace un número fijo de consultas (ver tests.LoginSignalQueryCountTests):
+    bloqueo del perfil, misiones de hoy, un bulk_create si aún no hay
+    ninguna (o un UPDATE condicional si la de login quedó pendiente) y el
+    guardado del perfil. El catálogo de misiones sale de misiones.py.
+    """
+    with transaction.atomic():
+        profile = Perfil.objects.select_for_update().filter(user_id=user.pk).first()
+        if profile is None:
+            return
+        current_datetime = timezone.now()
+
+        # Convertir a la zona horaria local para obtener la fecha correcta
+        local_datetime = timezone.localtime(current_datetime)
+        current_date = local_datetime.date()
+
+        # --- Lógica de Racha Temporal por Minutos ---
+        if profile.ultima_conexion_racha:
+            time_difference = current_datetime - profile.ultima_conexion_racha
+
+            if timedelta(seconds=0) < time_difference <= timedelta(minutes=5):
+                profile.racha_actual += 1
+            elif time_difference > timedelta(minutes=5):
                 profile.racha_actual = 1
-            
-            profile.ultima_conexion_racha = current_datetime
-            
-            # --- Lógica de Asignación de Misiones Diarias ---
-            login_mission = Mision.objects.filter(key='login_diario', activa=True).first()
-
-            if not MisionDiariaUsuario.objects.filter(perfil=profile, fecha_asignacion=current_date).exists():
-                assigned_missions_keys = set()
-
-                if login_mission:
-                    MisionDiariaUsuario.objects.get_or_create(
-                        perfil=profile,
-                        mision=login_mission,
-                        fecha_asignacion=current_date,
-                        defaults={'completada': False}
-                    )
-                    assigned_missions_keys.add(login_mission.key)
-
-                available_missions_for_random = list(Mision.objects.filter(activa=True).exclude(key__in=assigned_missions_keys))
-                num_additional_missions = 2 - len(assigned_missions_keys)
-                
-                if num_additional_missions > 0 and available_missions_for_random:
-                    missions_for_today_random = random.sample(available_missions_for_random, min(num_additional_missions, len(available_missions_for_random)))
-                    for mision_obj in missions_for_today_random:
-                        MisionDiariaUsuario.objects.get_or_create(
-                            perfil=profile,
-                            mision=mision_obj,
-                            fecha_asignacion=current_date,
-                            defaults={'completada': False}
-                        )
-            
+        else:
+            profile.racha_actual = 1
+
+        profile.ultima_conexion_racha = current_datetime
+
+        # --- Lógica de Asignación de Misiones Diarias ---
+        catalogo = misiones.catalogo_activo()
+        login_mission = next((m for m in catalogo if m.key == 'login_diario'), None)
+        asignadas_hoy = dict(
+            MisionDiariaUsuario.objects.filter(perfil=profile, fecha_asignacion=current_date)
+            .values_list('mision_id', 'completada')
+        )
+        puntos_ganados = 0
+
+        if not asignadas_hoy:
+            # La misión de login se crea ya completada: este mismo login la cumple
+            nuevas = []
+            if login_mission:
+                nuevas.append(MisionDiariaUsuario(
+                    perfil=profile,
+                    mision_id=login_mission.id,
+                    fecha_asignacion=current_date,
+                    completada=True,
+                    fecha_completado=current_datetime,
+                ))
+                puntos_ganados += login_mission.puntos_recompensa
+
+            available_missions_for_random = [m for m in catalogo if m is not login_mission]
+            num_additional_missions = 2 - len(nuevas)
+
+            if num_additional_missions > 0 and available_missions_for_random:
+                missions_for_today_random = random.sample(available_missions_for_random, min(num_additional_missions, len(available_missions_for_random)))
+                nuevas.extend(
+                    MisionDiariaUsuario(perfil=profile, mision_id=m.id, fecha_asignacion=current_date, completada=False)
+                    for m in missions_for_today_random
+                )
+
+            # El bloqueo del perfil serializa los logins del mismo usuario;
+            # ignore_conflicts solo cubre asignaciones hechas por otras vías.
+            MisionDiariaUsuario.objects.bulk_create(nuevas, ignore_conflicts=True)
+
+        elif login_mission and asignadas_hoy.get(login_mission.id) is False:
             # --- Marcar la misión de "Login Diario" como completada y otorgar puntos ---
-            daily_login_mission_user = MisionDiariaUsuario.objects.filter(
+            completadas = MisionDiariaUsuario.objects.filter(
                 perfil=profile,
                 fecha_asignacion=current_date,
-                mision__key='login_diario',
+                mision_id=login_mission.id,
                 completada=False
-            ).first()
-
-            if daily_login_mission_user:
-                daily_login_mission_user.completada = True
-                daily_login_mission_user.fecha_completado = current_datetime
-                daily_login_mission_user.save()
-                profile.puntos += daily_login_mission_user.mision.puntos_recompensa
-            
-            profile.save()
\ No newline at end of file
+            ).update(completada=True, fecha_completado=current_datetime)
+            if completadas:
+                puntos_ganados += login_mission.puntos_recompensa
+
+        update_fields = ['racha_actual', 'ultima_conexion_racha']
+        if puntos_ganados:
+            profile.puntos = F('puntos') + puntos_ganados
+            update_fields.append('puntos')
+        profile.save(update_fields=update_fields)
+        if puntos_ganados:
+            transaction.on_commit(lambda: clasificacion.sumar_puntos(profile.pk, puntos_ganados))
+
+
+# --- Agregados de valoraciones desnormalizados en Recurso ---
+# Las valoraciones no se editan (ni desde el admin ni desde las vistas), así que
+# basta con reaccionar a altas y bajas. post_delete también se dispara en los
+# borrados masivos del admin y en las cascadas al borrar un usuario.
+
+@receiver(post_save, sender=Valoracion)
+def sumar_valoracion_a_recurso(sender, instance, created, **kwargs):
+    if created and not kwargs.get('raw'):
+        Recurso.ajustar_valoraciones(instance.recurso_id, instance.puntuacion, 1)
+
+
+@receiver(post_delete, sender=Valoracion)
+def restar_valoracion_a_recurso(sender, instance, **kwargs):
+    Recurso.ajustar_valoraciones(instance.recurso_id, instance.puntuacion, -1)
+
+
+# --- Índice de búsqueda de texto completo ---
+
+@receiver(pre_save, sender=Recurso)
+def actualizar_texto_busqueda(sender, instance, **kwargs):
+    instance.texto_busqueda = busqueda.texto_busqueda_de(instance)
+
+
+@receiver(post_save, sender=Recurso)
+def indexar_recurso_busqueda(sender, instance, **kwargs):
+    busqueda.indexar_recurso(instance)
+    busqueda.invalidar_cache()
+
+
+@receiver(post_delete, sender=Recurso)
+def desindexar_recurso_busqueda(sender, instance, **kwargs):
+    busqueda.desindexar_recurso(instance.pk)
+    busqueda.invalidar_cache()
+
+
+@receiver(post_save, sender=Perfil)
+@receiver(post_delete, sender=Perfil)
+def invalidar_perfil_cacheado(sender, instance, **kwargs):
+    cache.delete(visitas.CLAVE_PERFIL.format(user_id=instance.user_id))
+
+
+@receiver(post_save, sender=Perfil)
+@receiver(post_delete, sender=Perfil)
+def invalidar_clasificacion(sender, instance, update_fields=None, **kwargs):
+    # Los guardados parciales (racha y puntos del login) no cambian quién está
+    # en la clasificación; los puntos ganados se suman con sumar_puntos()
+    if update_fields is None:
+        transaction.on_commit(clasificacion.invalidar)
+
+
+@receiver(post_save, sender=Mision)
+@receiver(post_delete, sender=Mision)
+def invalidar_catalogo_misiones(sender, **kwargs):
+    misiones.invalidar_catalogo()
+
+
+# --- Caché de roles (ver roles.py) ---
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidar_roles_por_pertenencia(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        # user.groups.add/remove/clear(...)
+        roles.invalidar_usuario(instance.pk)
+    elif pk_set:
+        # group.user_set.add/remove(...)
+        for user_id in pk_set:
+            roles.invalidar_usuario(user_id)
+    else:
+        # group.user_set.clear(): no sabemos a quién afectó
+        roles.invalidar_todos()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidar_roles_por_grupo(sender, **kwargs):
+    roles.invalidar_todos()
+
+
+# --- Versiones de los listados por carrera (ver listados.py) ---
+# Guardar un recurso cubre también los cambios de estado; el borrado se
+# atiende en pre_delete porque en post_delete ya no quedan sus carreras.
+
+@receiver(post_save, sender=Recurso)
+@receiver(pre_delete, sender=Recurso)
+def invalidar_listados_por_recurso(sender, instance, **kwargs):
+    listados.invalidar_recurso(instance.pk)
+
+
+@receiver(m2m_changed, sender=Recurso.carreras.through)
+def invalidar_listados_por_carreras(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        # recurso.carreras.clear(): invalidamos las carreras que tenía
+        listados.invalidar_recurso(instance.pk)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if reverse:
+            # carrera.recursos.add/remove/clear(...)
+            listados.invalidar_carreras([instance.pk])
+        elif pk_set:
+            listados.invalidar_carreras(pk_set)
+
+
+@receiver(post_save, sender=Valoracion)
+@receiver(post_delete, sender=Valoracion)
+def invalidar_listados_por_valoracion(sender, instance, **kwargs):
+    listados.invalidar_recurso(instance.recurso_id)
+
+
+@receiver(post_save, sender=Recurso)
+@receiver(post_save, sender=Carrera)
+def generar_variantes_imagen(sender, instance, update_fields=None, **kwargs):
+    # Solo hace algo con almacenamiento local; si las variantes ya existen,
+    # generar() se limita a comprobar el manifest
+    if instance.imagen and (update_fields is None or 'imagen' in update_fields):
+        imagen = instance.imagen
+        transaction.on_commit(lambda: imagenes.generar(imagen))
+
+
+# --- Versiones del GET condicional (ver condicional.py) ---
+
+@receiver(post_save, sender=Carrera)
+@receiver(post_delete, sender=Carrera)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidar_paginas_condicionales(sender, **kwargs):
+    condicional.invalidar_todo()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidar_paginas_por_permisos_de_grupo(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        condicional.invalidar_todo()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_paginas_del_usuario(sender, instance, **kwargs):
+    condicional.invalidar_usuario(instance.pk)
+
+
+@receiver(post_save, sender=Perfil)
+@receiver(post_delete, sender=Perfil)
+def invalidar_paginas_del_perfil(sender, instance, **kwargs):
+    condicional.invalidar_usuario(instance.user_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Perfil.recursos_favoritos.through)
+def invalidar_paginas_por_relaciones(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        # user.groups.add(...), perfil.recursos_favoritos.add(...)...
+        user_id = instance.user_id if isinstance(instance, Perfil) else instance.pk
+        condicional.invalidar_usuario(user_id)
+    elif pk_set and sender is not Perfil.recursos_favoritos.through:
+        # group.user_set.add(...): pk_set son usuarios
+        for user_id in pk_set:
+            condicional.invalidar_usuario(user_id)
+    elif pk_set:
+        # recurso.favorito_de.add(...): pk_set son perfiles
+        for user_id in Perfil.objects.filter(pk__in=pk_set).values_list('user_id', flat=True):
+            condicional.invalidar_usuario(user_id)
+    else:
+        # .clear() desde el otro lado: no sabemos a quién afectó
+        condicional.invalidar_todo()
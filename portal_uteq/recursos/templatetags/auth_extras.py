@@ -1,5 +1,5 @@
 from django import template
-from django.contrib.auth.models import Group
+from portal_uteq.recursos import roles
 
 register = template.Library()
 
@@ -8,9 +8,6 @@ def in_group(user, group_name):
     """
     Verifica si un usuario pertenece a un grupo específico.
     Uso en la plantilla: {% if user|in_group:"NombreDelGrupo" %}
+    Los grupos se resuelven una vez por petición y se cachean (ver roles.py).
     """
-    try:
-        group = Group.objects.get(name=group_name)
-        return group in user.groups.all()
-    except Group.DoesNotExist:
-        return False
+    return roles.en_grupo(user, group_name)
@@ -0,0 +1,41 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from portal_uteq.recursos import imagenes
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagen_responsiva(imagen, sizes='100vw', alt='', clase='', estilo='', ancho=480):
+    """
+    Imagen con variantes WebP/JPEG en srcset, marcador borroso y carga diferida.
+    ``ancho`` es el ancho de la variante JPEG que se usa como src de respaldo.
+    Uso en la plantilla:
+    {% imagen_responsiva recurso.imagen sizes="60px" alt=recurso.nombre clase="ai-icon" %}
+    Los tamaños disponibles se explican en imagenes.py.
+    """
+    if not imagen:
+        return ''
+    variantes = imagenes.variantes(imagen)
+    if variantes is None:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" style="{}" loading="lazy" decoding="async">',
+            imagen.url, alt, clase, estilo,
+        )
+
+    def srcset(lista):
+        return format_html_join(', ', '{1} {0}w', lista)
+
+    respaldo = next((url for w, url in variantes['jpeg'] if w >= ancho), variantes['jpeg'][-1][1])
+    estilo = f"{estilo}{';' if estilo and not estilo.endswith(';') else ''}background: url('{variantes['marcador']}') center / cover;"
+    dimensiones = ''
+    if variantes.get('ancho'):
+        dimensiones = format_html(' width="{}" height="{}"', variantes['ancho'], variantes['alto'])
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" style="{}"{} loading="lazy" decoding="async">'
+        '</picture>',
+        srcset(variantes['webp']), sizes,
+        respaldo, srcset(variantes['jpeg']), sizes, alt, clase, estilo, dimensiones,
+    )
@@ -0,0 +1,183 @@
+# portal_uteq/recursos/tendencias.py
+"""
+Puntuaciones de popularidad y tendencia con decaimiento exponencial.
+
+Cada evento suma un peso a la puntuación del recurso (PESO_VISITA por visita,
+PESO_VALORACION por valoración y PESO_FAVORITO por cada favorito ganado, o lo
+resta si se pierde) que se reduce a la mitad cada POPULARIDAD_VIDA_MEDIA_DIAS
+o TENDENCIA_VIDA_MEDIA_DIAS días. La tendencia es la misma suma con una vida
+media corta, así que premia la actividad reciente.
+
+Multiplicar todas las filas por el decaimiento en cada ejecución obligaría a
+reescribir la tabla entera. En su lugar las puntuaciones se guardan
+expresadas en un instante fijo, ``fecha_base`` del PuntoControlTendencias: un
+evento de peso w en el instante t suma ``w * 2 ** ((t - base) / vida_media)``.
+El factor común ``2 ** (-(ahora - base) / vida_media)`` no cambia el orden,
+de modo que ordenar por la columna (con índice parcial, igual que la
+puntuación bayesiana) ya es ordenar por la puntuación actual. Cuando el
+factor se acerca al límite de un float, se reescala todo una vez y se mueve
+la base.
+
+El comando ``actualizar_tendencias`` solo suma lo nuevo desde el último punto
+de control: las visitas y valoraciones con ID mayor que el último sumado (las
+visitas llegan en lote con la hora del clic, así que la fecha no sirve de
+marca) y la diferencia entre los favoritos actuales y ``favoritos_contados``.
+Solo se escriben los recursos con eventos nuevos.
+
+El orden de los IDs no es el orden de commit: en PostgreSQL una transacción
+que tomó un ID menor puede confirmarse después de que otra con un ID mayor
+ya se haya sumado. Por eso cada hueco por debajo de la marca se guarda en el
+punto de control y se vuelve a consultar en las siguientes ejecuciones hasta
+que aparece o pasan VENTANA_HUECOS (entonces era un rollback o un borrado).
+Se prefiere esto a una ventana de solapamiento por ID, que obligaría a
+recordar qué IDs ya se sumaron, o a una marca de commit propia de PostgreSQL.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+import math
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from . import listados
+
+PESO_VISITA = 1.0
+PESO_FAVORITO = 5.0
+PESO_VALORACION = 3.0
+# Con más de 2 ** LIMITE_EXPONENTE de crecimiento se reescala (un float llega a 2 ** 1023)
+LIMITE_EXPONENTE = 256
+# Ninguna transacción que inserte eventos dura tanto; un hueco más antiguo no se llenará
+VENTANA_HUECOS = timedelta(minutes=10)
+# Tope de huecos pendientes por tipo de evento (van en un IN de la consulta)
+MAX_HUECOS = 900
+
+
+def _vidas_medias():
+    return (
+        timedelta(days=getattr(settings, 'POPULARIDAD_VIDA_MEDIA_DIAS', 30)),
+        timedelta(days=getattr(settings, 'TENDENCIA_VIDA_MEDIA_DIAS', 3)),
+    )
+
+
+def _exponente(instante, base, vida_media):
+    return (instante - base) / vida_media
+
+
+def _reescalar(control, ahora, vidas_medias):
+    """Mueve la base a ``ahora`` si alguna puntuación crecería demasiado."""
+    from .models import Recurso
+
+    exponentes = [_exponente(ahora, control.fecha_base, vida_media) for vida_media in vidas_medias]
+    if max(exponentes) < LIMITE_EXPONENTE:
+        return
+    factor_popularidad, factor_tendencia = (math.pow(2.0, -exponente) for exponente in exponentes)
+    Recurso.objects.exclude(puntuacion_popularidad=0, puntuacion_tendencia=0).update(
+        puntuacion_popularidad=F('puntuacion_popularidad') * factor_popularidad,
+        puntuacion_tendencia=F('puntuacion_tendencia') * factor_tendencia,
+    )
+    control.fecha_base = ahora
+
+
+def recorrer_eventos(eventos, ultimo_id, huecos, ahora, procesar):
+    """
+    Llama a ``procesar`` con el resto de cada fila de ``eventos`` (un
+    values_list cuyo primer campo es el ID) con ID mayor que ``ultimo_id`` o
+    pendiente en ``huecos``. Devuelve la nueva marca y los huecos que siguen
+    abiertos. También la usa recomendaciones.py.
+    """
+    pendientes = {
+        int(pk): detectado for pk, detectado in huecos.items()
+        if ahora - datetime.fromisoformat(detectado) <= VENTANA_HUECOS
+    }
+    filtro = Q(pk__gt=ultimo_id)
+    if pendientes:
+        filtro |= Q(pk__in=list(pendientes))
+    for pk, *fila in eventos.filter(filtro).order_by('pk').iterator(chunk_size=5000):
+        if pk in pendientes:
+            del pendientes[pk]
+        else:
+            if ultimo_id:
+                # En la primera ejecución no hay huecos: todo lo anterior se suma ahora
+                detectado = ahora.isoformat()
+                pendientes.update((hueco, detectado) for hueco in range(max(ultimo_id + 1, pk - MAX_HUECOS), pk))
+            ultimo_id = pk
+        procesar(*fila)
+    # Si hay demasiados, se abandonan los más antiguos
+    return ultimo_id, {str(pk): pendientes[pk] for pk in sorted(pendientes)[-MAX_HUECOS:]}
+
+
+def actualizar(ahora=None):
+    """
+    Suma a las puntuaciones los eventos nuevos desde el último punto de
+    control. Devuelve el número de recursos actualizados.
+    """
+    from .models import HistorialVisitas, Perfil, PuntoControlTendencias, Recurso, Valoracion
+
+    ahora = ahora or timezone.now()
+    vidas_medias = _vidas_medias()
+    with transaction.atomic():
+        # El bloqueo de la fila evita que dos ejecuciones sumen lo mismo
+        control, _ = PuntoControlTendencias.objects.select_for_update().get_or_create(
+            pk=1, defaults={'fecha_base': ahora}
+        )
+        _reescalar(control, ahora, vidas_medias)
+        incrementos = defaultdict(lambda: [0.0, 0.0])
+
+        def sumar(recurso_id, peso, instante):
+            # Un reloj adelantado no debe dar más peso que un evento de ahora
+            instante = min(instante, ahora)
+            incremento = incrementos[recurso_id]
+            for i, vida_media in enumerate(vidas_medias):
+                incremento[i] += peso * math.pow(2.0, _exponente(instante, control.fecha_base, vida_media))
+
+        control.ultima_visita_id, control.huecos_visitas = recorrer_eventos(
+            HistorialVisitas.objects.values_list('pk', 'recurso_id', 'fecha_visita'),
+            control.ultima_visita_id, control.huecos_visitas, ahora,
+            lambda recurso_id, fecha: sumar(recurso_id, PESO_VISITA, fecha),
+        )
+        control.ultima_valoracion_id, control.huecos_valoraciones = recorrer_eventos(
+            Valoracion.objects.values_list('pk', 'recurso_id', 'fecha_creacion'),
+            control.ultima_valoracion_id, control.huecos_valoraciones, ahora,
+            lambda recurso_id, fecha: sumar(recurso_id, PESO_VALORACION, fecha),
+        )
+
+        # Los favoritos no tienen fecha: se suma la diferencia con el último conteo
+        favoritos = dict(
+            Perfil.recursos_favoritos.through.objects.order_by().values('recurso_id')
+            .annotate(n=Count('id')).values_list('recurso_id', 'n')
+        )
+        contados = dict(Recurso.objects.exclude(favoritos_contados=0).order_by().values_list('pk', 'favoritos_contados'))
+        nuevos_conteos = {}
+        for recurso_id in favoritos.keys() | contados.keys():
+            diferencia = favoritos.get(recurso_id, 0) - contados.get(recurso_id, 0)
+            if diferencia:
+                sumar(recurso_id, PESO_FAVORITO * diferencia, ahora)
+                nuevos_conteos[recurso_id] = favoritos.get(recurso_id, 0)
+
+        recursos = Recurso.objects.order_by().only(
+            'puntuacion_popularidad', 'puntuacion_tendencia', 'favoritos_contados'
+        ).in_bulk(list(incrementos))
+        for recurso_id, (popularidad, tendencia) in incrementos.items():
+            recurso = recursos.get(recurso_id)
+            if recurso is None:
+                continue
+            # Quitar un favorito antiguo resta más de lo que queda de él
+            recurso.puntuacion_popularidad = max(recurso.puntuacion_popularidad + popularidad, 0.0)
+            recurso.puntuacion_tendencia = max(recurso.puntuacion_tendencia + tendencia, 0.0)
+            recurso.favoritos_contados = nuevos_conteos.get(recurso_id, recurso.favoritos_contados)
+        Recurso.objects.bulk_update(
+            recursos.values(), ['puntuacion_popularidad', 'puntuacion_tendencia', 'favoritos_contados'], batch_size=500,
+        )
+
+        control.fecha_actualizacion = ahora
+        control.save()
+
+        if recursos:
+            carrera_ids = list(
+                Recurso.carreras.through.objects.filter(recurso_id__in=list(recursos))
+                .values_list('carrera_id', flat=True).distinct()
+            )
+            transaction.on_commit(lambda: listados.invalidar_carreras(carrera_ids))
+    return len(recursos)
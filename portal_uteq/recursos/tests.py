@@ -1,3 +1,2239 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import io
+import json
+import logging.handlers
+import os
+import random
+import re
+import smtplib
+import statistics
+import tempfile
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.contrib.messages import constants as message_constants
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core import mail
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends import locmem
+from django.core.management import CommandError, call_command
+from django.core.signals import request_started, request_finished
+from django.db import connection, connections
+from django.db.models import Q
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+
+from . import (
+    busqueda, clasificacion, condicional, correo, imagenes, importacion, listados, misiones, paginacion, perfilado, recomendaciones,
+    registros, roles, sesiones, tendencias, views, visitas,
+)
+from .models import (
+    Carrera, Recurso, Valoracion, Perfil, Mision, MisionDiariaUsuario, HistorialVisitas, UltimaVisita,
+    CorreoPendiente, RecursoSimilares, PuntoControlTendencias,
+)
+from .signals import update_streak_and_assign_missions
+
+
+# Las pruebas corren en un solo proceso, donde LocMemCache se comporta como una
+# caché compartida. Las clases que miden el camino con caché (sesiones,
+# presupuestos de consultas, ETag) lo declaran así (ver recursos/compartida.py).
+con_cache_compartida = override_settings(CACHE_COMPARTIDA=True)
+
+
+class LoginSignalQueryCountTests(TestCase):
+    """El login hace un número fijo de consultas, sin importar cuántas misiones haya."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='estudiante', password='x')
+        cls.perfil = Perfil.objects.create(user=cls.user, cedula='0102030405')
+        Mision.objects.create(key='login_diario', nombre='Login', descripcion='-', puntos_recompensa=10)
+        Mision.objects.create(key='valorar_recurso', nombre='Valorar', descripcion='-', puntos_recompensa=20)
+        Mision.objects.create(key='sugerir_recurso', nombre='Sugerir', descripcion='-', puntos_recompensa=30)
+        Mision.objects.create(key='visitar_recurso', nombre='Visitar', descripcion='-', puntos_recompensa=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self):
+        update_streak_and_assign_missions(sender=User, request=None, user=self.user)
+
+    def test_primer_login_del_dia(self):
+        self.login()  # calienta el catálogo de misiones
+        MisionDiariaUsuario.objects.all().delete()
+
+        # SAVEPOINT, bloqueo del perfil, misiones de hoy, bulk_create, UPDATE del perfil, RELEASE
+        with self.assertNumQueries(6):
+            self.login()
+
+        asignadas = MisionDiariaUsuario.objects.filter(perfil=self.perfil, fecha_asignacion=date.today())
+        self.assertEqual(asignadas.count(), 2)
+        self.assertTrue(asignadas.get(mision__key='login_diario').completada)
+
+    def test_login_repetido_no_asigna_ni_suma_puntos(self):
+        self.login()
+        puntos = Perfil.objects.get(pk=self.perfil.pk).puntos
+        self.assertEqual(puntos, 10)
+
+        # SAVEPOINT, bloqueo del perfil, misiones de hoy, UPDATE del perfil, RELEASE
+        with self.assertNumQueries(5):
+            self.login()
+
+        self.assertEqual(Perfil.objects.get(pk=self.perfil.pk).puntos, puntos)
+        self.assertEqual(MisionDiariaUsuario.objects.filter(perfil=self.perfil).count(), 2)
+
+    def test_cambio_en_mision_invalida_catalogo(self):
+        self.login()
+        MisionDiariaUsuario.objects.all().delete()
+        Mision.objects.exclude(key='login_diario').update(activa=False)
+        Mision.objects.get(key='login_diario').save()  # dispara la invalidación
+
+        self.login()
+        self.assertEqual(MisionDiariaUsuario.objects.filter(perfil=self.perfil).count(), 1)
+
+    @override_settings(CACHE_COMPARTIDA=False, CACHE_LOCAL_TIMEOUT=1)
+    def test_con_cache_por_proceso_el_catalogo_caduca(self):
+        self.login()
+        MisionDiariaUsuario.objects.all().delete()
+        # Cambio hecho en otro worker: la invalidación no llega a esta caché
+        Mision.objects.exclude(key='login_diario').update(activa=False)
+        self.assertEqual(len(misiones.catalogo_activo()), 4)
+        time.sleep(1.1)
+        self.login()
+        self.assertEqual(MisionDiariaUsuario.objects.filter(perfil=self.perfil).count(), 1)
+
+
+class AgregadosValoracionesTests(TestCase):
+    """Contadores de valoraciones en Recurso mantenidos por signals.py."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recurso, cls.otro = (
+            Recurso.objects.create(nombre=nombre, descripcion='-', url_externa='https://example.com')
+            for nombre in ('valorado', 'otro')
+        )
+        cls.usuarios = [User.objects.create_user(username=f'valorador{i}', password='x') for i in range(3)]
+
+    def valorar(self, user, puntuacion, recurso=None):
+        return Valoracion.objects.create(recurso=recurso or self.recurso, user=user, puntuacion=puntuacion, comentario='-')
+
+    def agregados(self, recurso=None):
+        recurso = Recurso.objects.get(pk=(recurso or self.recurso).pk)
+        return recurso.num_valoraciones, recurso.suma_puntuaciones, recurso.histograma_valoraciones
+
+    def test_altas_y_bajas_ajustan_los_contadores(self):
+        with CaptureQueriesContext(connection) as consultas:
+            primera = self.valorar(self.usuarios[0], 5)
+        # Un único UPDATE con F(), sin leer antes la fila del recurso
+        sobre_recurso = [c['sql'] for c in consultas.captured_queries if 'recursos_recurso"' in c['sql'].split(' WHERE')[0]]
+        self.assertEqual(len(sobre_recurso), 1)
+        self.assertTrue(sobre_recurso[0].startswith('UPDATE'))
+
+        self.valorar(self.usuarios[1], 3)
+        self.assertEqual(self.agregados(), (2, 8, {1: 0, 2: 0, 3: 1, 4: 0, 5: 1}))
+        self.assertEqual(self.agregados(self.otro), (0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}))
+
+        primera.delete()
+        self.assertEqual(self.agregados(), (1, 3, {1: 0, 2: 0, 3: 1, 4: 0, 5: 0}))
+        # Los borrados masivos (admin, cascadas) también restan
+        self.valorar(self.usuarios[2], 4)
+        Valoracion.objects.filter(recurso=self.recurso).delete()
+        self.assertEqual(self.agregados(), (0, 0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}))
+        self.assertEqual(Recurso.objects.get(pk=self.recurso.pk).puntuacion_bayesiana, Recurso.BAYES_MEDIA_PREVIA)
+
+    def test_puntuacion_bayesiana(self):
+        self.assertEqual(Recurso.calcular_puntuacion_bayesiana(0, 0), Recurso.BAYES_MEDIA_PREVIA)
+        # Una sola valoración de 5 pesa menos que varias de 4
+        self.valorar(self.usuarios[0], 5)
+        for user in self.usuarios:
+            self.valorar(user, 4, recurso=self.otro)
+        recurso, otro = Recurso.objects.get(pk=self.recurso.pk), Recurso.objects.get(pk=self.otro.pk)
+        self.assertAlmostEqual(recurso.puntuacion_bayesiana, (5 * 3.0 + 5) / 6)
+        self.assertAlmostEqual(otro.puntuacion_bayesiana, Recurso.calcular_puntuacion_bayesiana(12, 3))
+        self.assertGreater(otro.puntuacion_bayesiana, recurso.puntuacion_bayesiana)
+        self.assertEqual(recurso.promedio_valoraciones, 5)
+
+    def test_recalcular_valoraciones_detecta_y_corrige_desfases(self):
+        self.valorar(self.usuarios[0], 5)
+        self.valorar(self.usuarios[1], 2)
+        salida = io.StringIO()
+        call_command('recalcular_valoraciones', '--verificar', stdout=salida)
+        self.assertIn('son correctos', salida.getvalue())
+
+        Recurso.objects.filter(pk=self.recurso.pk).update(num_valoraciones=7, valoraciones_5=0)
+        salida = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '1 recurso(s) con agregados desfasados'):
+            call_command('recalcular_valoraciones', '--verificar', stdout=salida)
+        self.assertIn(f'Recurso {self.recurso.pk}: desfase en num_valoraciones, valoraciones_5', salida.getvalue())
+        # --verificar no escribe
+        self.assertEqual(self.agregados()[0], 7)
+
+        call_command('recalcular_valoraciones', stdout=io.StringIO())
+        self.assertEqual(self.agregados(), (2, 7, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}))
+        call_command('recalcular_valoraciones', '--verificar', stdout=io.StringIO())
+
+
+class CompletarMisionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='docente', password='x')
+        cls.perfil = Perfil.objects.create(user=cls.user, cedula='1112223334')
+        for key, puntos in [('valorar_recurso', 20), ('sugerir_recurso', 30), ('visitar_recurso', 5)]:
+            mision = Mision.objects.create(key=key, nombre=key, descripcion='-', puntos_recompensa=puntos)
+            MisionDiariaUsuario.objects.create(perfil=cls.perfil, mision=mision, fecha_asignacion=date.today())
+
+    def setUp(self):
+        cache.clear()
+        misiones.catalogo_activo()
+
+    def puntos(self):
+        return Perfil.objects.get(pk=self.perfil.pk).puntos
+
+    def test_consultas_por_completado(self):
+        # SAVEPOINT, UPDATE de la asignación, UPDATE de puntos, RELEASE
+        with self.assertNumQueries(4):
+            self.assertEqual(misiones.completar_mision(self.perfil.pk, 'valorar_recurso'), 20)
+        # Ya completada: el UPDATE condicional no toca filas y no se suman puntos
+        with self.assertNumQueries(3):
+            self.assertEqual(misiones.completar_mision(self.perfil.pk, 'valorar_recurso'), 0)
+        self.assertEqual(self.puntos(), 20)
+
+    def test_no_se_pierden_puntos_con_perfiles_desactualizados(self):
+        # Dos peticiones que cargaron el perfil antes de completar sus misiones:
+        # con el antiguo "perfil.puntos += ..." la segunda pisaba a la primera.
+        perfil_a = Perfil.objects.get(pk=self.perfil.pk)
+        perfil_b = Perfil.objects.get(pk=self.perfil.pk)
+        misiones.completar_mision(perfil_a.pk, 'valorar_recurso')
+        misiones.completar_mision(perfil_b.pk, 'sugerir_recurso')
+        self.assertEqual(self.puntos(), 50)
+
+    def test_diferida_se_aplica_al_terminar_la_peticion(self):
+        request_started.send(sender=self.__class__)
+        self.assertIsNone(misiones.completar_mision(self.perfil.pk, 'visitar_recurso', diferida=True))
+        self.assertEqual(self.puntos(), 0)
+        request_finished.send(sender=self.__class__)
+        self.assertEqual(self.puntos(), 5)
+
+    def test_la_marca_de_la_visita_solo_se_guarda_si_el_diferido_se_ejecuta(self):
+        clave = views.CLAVE_MISION_VISITA.format(perfil_id=self.perfil.pk, fecha=timezone.localdate().isoformat())
+        request_started.send(sender=self.__class__)
+        self.assertFalse(views._completar_mision_visita(self.perfil.pk, diferida=True))
+        self.assertIsNone(cache.get(clave))
+        with mock.patch.object(misiones, '_completar', side_effect=RuntimeError('BD caída')), \
+                self.assertLogs('portal_uteq.recursos.misiones', 'ERROR'):
+            request_finished.send(sender=self.__class__)
+        # El fallo no bloquea la misión el resto del día
+        self.assertIsNone(cache.get(clave))
+
+        request_started.send(sender=self.__class__)
+        views._completar_mision_visita(self.perfil.pk, diferida=True)
+        request_finished.send(sender=self.__class__)
+        self.assertTrue(cache.get(clave))
+        self.assertEqual(self.puntos(), 5)
+
+    @override_settings(TIME_ZONE='Pacific/Kiritimati')
+    def test_la_marca_y_la_asignacion_usan_el_mismo_dia(self):
+        # UTC+14: el día local casi nunca coincide con el del reloj del servidor
+        MisionDiariaUsuario.objects.update(fecha_asignacion=timezone.localdate())
+        self.assertTrue(views._completar_mision_visita(self.perfil.pk))
+        self.assertTrue(cache.get(views.CLAVE_MISION_VISITA.format(
+            perfil_id=self.perfil.pk, fecha=timezone.localdate().isoformat(),
+        )))
+
+
+@skipUnless(connection.vendor == 'postgresql', "Necesita escrituras concurrentes reales (PostgreSQL)")
+class CompletarMisionConcurrenciaBenchmark(TransactionTestCase):
+    """Muchas peticiones simultáneas sobre la misma misión: se otorga una sola vez."""
+
+    HILOS = 16
+
+    def test_una_sola_recompensa_bajo_concurrencia(self):
+        cache.clear()
+        user = User.objects.create_user(username='concurrente', password='x')
+        perfil = Perfil.objects.create(user=user, cedula='9998887776')
+        mision = Mision.objects.create(key='valorar_recurso', nombre='Valorar', descripcion='-', puntos_recompensa=20)
+        MisionDiariaUsuario.objects.create(perfil=perfil, mision=mision, fecha_asignacion=date.today())
+
+        def completar(_):
+            try:
+                return misiones.completar_mision(perfil.pk, 'valorar_recurso')
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.HILOS) as pool:
+            resultados = list(pool.map(completar, range(self.HILOS)))
+
+        self.assertEqual(sorted(resultados), [0] * (self.HILOS - 1) + [20])
+        self.assertEqual(Perfil.objects.get(pk=perfil.pk).puntos, 20)
+
+
+# Patrones del plan que indican un recorrido secuencial o una ordenación en
+# tabla temporal, por motor de base de datos
+PATRONES_PLAN = {
+    'sqlite': {
+        'secuencial': re.compile(r'\bSCAN (?!.*\bUSING\b)'),
+        'ordenacion': re.compile(r'USE TEMP B-TREE'),
+    },
+    'postgresql': {
+        'secuencial': re.compile(r'Seq Scan'),
+        'ordenacion': re.compile(r'^\s*(->\s*)?(Incremental )?Sort\b', re.MULTILINE),
+    },
+}
+
+
+@skipUnless(connection.vendor in PATRONES_PLAN, "EXPLAIN solo se interpreta en SQLite y PostgreSQL")
+class IndicesConsultasFrecuentesTests(TestCase):
+    """
+    Cada consulta frecuente debe resolverse con un índice (ver Meta.indexes de
+    los modelos y la migración 0021). Si alguien cambia el filtro o el orden
+    de una de ellas, o borra su índice, el plan pasa a recorrer la tabla
+    entera u ordenar en una tabla temporal y la prueba falla mostrando el plan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.carrera = Carrera.objects.create(nombre='Software')
+        cls.user = User.objects.create_user(username='explain', password='x')
+        cls.perfil = Perfil.objects.create(user=cls.user, cedula='5556667778', carrera=cls.carrera)
+        cls.mision = Mision.objects.create(key='visitar_recurso', nombre='Visitar', descripcion='-')
+        MisionDiariaUsuario.objects.create(perfil=cls.perfil, mision=cls.mision, fecha_asignacion=date.today())
+        for i in range(20):
+            recurso = Recurso.objects.create(
+                nombre=f'Recurso {i}', descripcion='-', url_externa='https://example.com', tipo='ia',
+                estado=Recurso.ESTADO_APROBADO if i % 2 else Recurso.ESTADO_PENDIENTE,
+            )
+            recurso.carreras.add(cls.carrera)
+            HistorialVisitas.objects.create(perfil=cls.perfil, recurso=recurso)
+            UltimaVisita.objects.create(perfil=cls.perfil, recurso=recurso)
+        Valoracion.objects.create(recurso=recurso, user=cls.user, puntuacion=4, comentario='-')
+        cls.recurso = recurso
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Con tablas tan pequeñas el planificador preferiría recorrerlas
+            # enteras; así solo elige Seq Scan o Sort si no hay alternativa.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+
+    def assertUsaIndice(self, queryset, permitir_ordenacion=False):
+        plan = queryset.explain()
+        patrones = PATRONES_PLAN[connection.vendor]
+        self.assertIsNone(patrones['secuencial'].search(plan), f"Recorrido secuencial:\n{plan}")
+        if not permitir_ordenacion:
+            self.assertIsNone(patrones['ordenacion'].search(plan), f"Ordenación en tabla temporal:\n{plan}")
+
+    def test_listado_recientes(self):
+        # Misma forma que listados.entradas_listado()
+        self.assertUsaIndice(
+            Recurso.objects.filter(carreras__id=self.carrera.pk, tipo='ia', estado=Recurso.ESTADO_APROBADO)
+            .order_by('-fecha_creacion', '-pk').values_list('pk', 'fecha_creacion')
+        )
+
+    def test_listado_mejor_valorados(self):
+        self.assertUsaIndice(
+            Recurso.objects.filter(carreras__id=self.carrera.pk, tipo='ia', estado=Recurso.ESTADO_APROBADO)
+            .order_by('-puntuacion_bayesiana', '-fecha_creacion', '-pk')
+            .values_list('pk', 'puntuacion_bayesiana', 'fecha_creacion')
+        )
+
+    def test_listado_populares_y_tendencia(self):
+        for campo in ('puntuacion_popularidad', 'puntuacion_tendencia'):
+            with self.subTest(campo=campo):
+                self.assertUsaIndice(
+                    Recurso.objects.filter(carreras__id=self.carrera.pk, tipo='ia', estado=Recurso.ESTADO_APROBADO)
+                    .order_by(f'-{campo}', '-fecha_creacion', '-pk').values_list('pk', campo, 'fecha_creacion')
+                )
+
+    def test_pagina_siguiente_del_listado(self):
+        # Misma forma que listados._despues_de() con cursor: keyset con LIMIT
+        for campo in ('puntuacion_bayesiana', 'puntuacion_tendencia'):
+            with self.subTest(campo=campo):
+                fecha = timezone.now()
+                self.assertUsaIndice(
+                    Recurso.objects.filter(carreras__id=self.carrera.pk, tipo='ia', estado=Recurso.ESTADO_APROBADO)
+                    .filter(
+                        Q(**{f'{campo}__lt': 1.0})
+                        | Q(**{campo: 1.0, 'fecha_creacion__lt': fecha})
+                        | Q(**{campo: 1.0, 'fecha_creacion': fecha, 'id__lt': self.recurso.pk})
+                    )
+                    .order_by(f'-{campo}', '-fecha_creacion', '-id').values_list('pk', campo, 'fecha_creacion', 'id')[:10]
+                )
+
+    def test_conteo_por_estado(self):
+        self.assertUsaIndice(Recurso.objects.filter(estado=Recurso.ESTADO_PENDIENTE).order_by().values('pk'))
+
+    def test_mision_pendiente(self):
+        # Filtro del UPDATE condicional de misiones.completar_mision()
+        self.assertUsaIndice(
+            MisionDiariaUsuario.objects.filter(
+                perfil_id=self.perfil.pk, fecha_asignacion=date.today(), mision_id=self.mision.pk, completada=False
+            ).values('pk')
+        )
+
+    def test_misiones_del_dia(self):
+        # El dashboard las ordena por completada y nombre de la misión: son
+        # unas pocas filas por perfil y día, así que se permite ordenarlas.
+        self.assertUsaIndice(
+            MisionDiariaUsuario.objects.filter(perfil_id=self.perfil.pk, fecha_asignacion=date.today())
+            .select_related('mision').order_by('completada', 'mision__nombre'),
+            permitir_ordenacion=True,
+        )
+
+    def test_historial_de_visitas(self):
+        self.assertUsaIndice(HistorialVisitas.objects.filter(perfil_id=self.perfil.pk).order_by('-fecha_visita')[:6])
+
+    def test_ultimas_visitas(self):
+        self.assertUsaIndice(
+            UltimaVisita.objects.filter(perfil_id=self.perfil.pk).select_related('recurso').order_by('-fecha_visita')[:6]
+        )
+
+    def test_valoraciones_de_un_recurso(self):
+        self.assertUsaIndice(Valoracion.objects.filter(recurso_id=self.recurso.pk).order_by('-fecha_creacion'))
+
+    def test_pagina_de_valoraciones_por_cursor(self):
+        # Misma forma que paginacion.pagina_por_fecha() en ValoracionesRecursoView
+        fecha = timezone.now()
+        self.assertUsaIndice(
+            views.ValoracionesRecursoView.consulta(self.recurso.pk)
+            .filter(Q(fecha_creacion__lt=fecha) | Q(fecha_creacion=fecha, id__lt=100))[:11]
+        )
+
+
+# --- Presupuesto de consultas y latencia por vista y rol ---
+
+ROLES = {
+    'estudiante': None,
+    'docente': 'Docente',
+    'gestor': 'Gestor de Contenido',
+}
+
+# Máximo de consultas por petición, con la plantilla ya renderizada y las
+# cachés calientes. Incluye la única fija de toda petición autenticada, la del
+# usuario: la sesión sale de la caché y su caducidad no se escribe en cada
+# petición (ver recursos/sesiones.py). Si una vista necesita más, hay que
+# justificarlo aquí; si necesita menos, conviene bajar su presupuesto.
+# resource_detail incluye la consulta del ETag (ver recursos/condicional.py),
+# que permite responder 304 con solo dos consultas; el resto es fijo (ver
+# test_detalle_consultas_fijas).
+# marcar_visita_recurso y marcar_visitas_lote comprueban que los recursos
+# existan antes de registrar la visita y completar la misión.
+PRESUPUESTO_CONSULTAS = {
+    'dashboard': {'estudiante': 8, 'docente': 9, 'gestor': 9},
+    'career_list': {'estudiante': 4, 'docente': 4, 'gestor': 4},
+    'resource_type_list': {'estudiante': 4, 'docente': 4, 'gestor': 4},
+    'resource_list': {'estudiante': 6, 'docente': 6, 'gestor': 6},
+    'resource_list_cargar_mas': {'estudiante': 6, 'docente': 6, 'gestor': 6},
+    'resource_detail': {'estudiante': 5, 'docente': 5, 'gestor': 5},
+    'valoraciones_recurso': {'estudiante': 2, 'docente': 2, 'gestor': 2},
+    'favorite_resources_list': {'estudiante': 4, 'docente': 4, 'gestor': 4},
+    'toggle_favorite_resource': {'estudiante': 5, 'docente': 5, 'gestor': 5},
+    'marcar_visita_recurso': {'estudiante': 6, 'docente': 6, 'gestor': 6},
+    'marcar_visitas_lote': {'estudiante': 6, 'docente': 6, 'gestor': 6},
+    'agregar_valoracion_ajax': {'estudiante': 12, 'docente': 12, 'gestor': 12},
+}
+
+
+class EscenarioVistasMixin:
+    """
+    Datos con forma de producción (varias carreras, recursos de todos los
+    tipos y estados, valoraciones, visitas, favoritos y misiones del día) y
+    un usuario por rol.
+    """
+    RECURSOS = 60
+    VALORADORES = 12
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.carreras = [Carrera.objects.create(nombre=f'Carrera {i}') for i in range(4)]
+        cls.misiones = [
+            Mision.objects.create(key=key, nombre=nombre, descripcion='-')
+            for key, nombre in Mision.KEY_CHOICES
+        ]
+        tipos = [tipo for tipo, _ in Recurso.TIPO_CHOICES]
+        cls.usuarios = {}
+        for i, (rol, grupo) in enumerate(ROLES.items()):
+            user = User.objects.create_user(username=rol, password='x')
+            if grupo:
+                user.groups.add(Group.objects.get_or_create(name=grupo)[0])
+            Perfil.objects.create(user=user, cedula=f'{i:010d}', carrera=cls.carreras[0])
+            cls.usuarios[rol] = user
+
+        cls.recursos = []
+        for i in range(cls.RECURSOS):
+            recurso = Recurso.objects.create(
+                nombre=f'Recurso {i}', descripcion=f'Descripción del recurso {i}', url_externa='https://example.com',
+                tipo=tipos[i % len(tipos)],
+                estado=Recurso.ESTADO_PENDIENTE if i % 7 == 0 else Recurso.ESTADO_APROBADO,
+                sugerido_por=cls.usuarios['docente'],
+            )
+            recurso.carreras.add(*cls.carreras[:1 + i % 3])
+            cls.recursos.append(recurso)
+        aprobados = [r for r in cls.recursos if r.estado == Recurso.ESTADO_APROBADO]
+
+        # Popularidad sesgada: los primeros recursos reciben más valoraciones
+        valoradores = [User.objects.create_user(username=f'valorador{i}', password='x') for i in range(cls.VALORADORES)]
+        for posicion, recurso in enumerate(aprobados[:10]):
+            for user in valoradores[:cls.VALORADORES - posicion]:
+                Valoracion.objects.create(recurso=recurso, user=user, puntuacion=1 + posicion % 5, comentario='-')
+        cls.recurso_popular = aprobados[0]
+        cls.recurso_sin_valorar = aprobados[-1]
+
+        hoy = date.today()
+        for user in cls.usuarios.values():
+            perfil = user.perfil
+            perfil.recursos_favoritos.add(*aprobados[1:12])
+            for recurso in aprobados[:10]:
+                HistorialVisitas.objects.create(perfil=perfil, recurso=recurso)
+                UltimaVisita.objects.create(perfil=perfil, recurso=recurso)
+            MisionDiariaUsuario.objects.bulk_create([
+                MisionDiariaUsuario(perfil=perfil, mision=mision, fecha_asignacion=hoy) for mision in cls.misiones
+            ])
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        # Descarta el buffer de visitas para que el gancho atexit no intente
+        # volcarlo cuando la base de datos de pruebas ya no existe
+        cache.clear()
+
+    def peticiones(self):
+        """Lista de (vista, método, url, datos) que se miden para cada rol."""
+        carrera = self.carreras[0]
+        listado = reverse('recursos:resource_list_by_type', args=[carrera.pk, 'ia'])
+        return [
+            ('dashboard', 'get', reverse('recursos:dashboard'), None),
+            ('career_list', 'get', reverse('recursos:career_list'), None),
+            ('resource_type_list', 'get', reverse('recursos:resource_type_list', args=[carrera.pk]), None),
+            ('resource_list', 'get', listado, None),
+            ('resource_list_cargar_mas', 'get', self.url_cargar_mas(listado), None),
+            ('resource_detail', 'get', reverse('recursos:resource_detail', args=[self.recurso_popular.pk]), None),
+            ('valoraciones_recurso', 'get', reverse('recursos:valoraciones_recurso', args=[self.recurso_popular.pk]), None),
+            ('favorite_resources_list', 'get', reverse('recursos:favorite_resources_list'), None),
+            ('toggle_favorite_resource', 'post',
+             reverse('recursos:toggle_favorite_resource', args=[self.recurso_popular.pk]), None),
+            ('marcar_visita_recurso', 'post',
+             reverse('recursos:marcar_visita_recurso', args=[self.recurso_popular.pk]), None),
+            ('marcar_visitas_lote', 'post', reverse('recursos:marcar_visitas_lote'),
+             json.dumps({'visitas': [{'recurso': r.pk} for r in self.recursos[:5]]})),
+            ('agregar_valoracion_ajax', 'post',
+             reverse('recursos:agregar_valoracion_ajax', args=[self.recurso_sin_valorar.pk]),
+             {'puntuacion': '4', 'comentario': 'Muy útil'}),
+        ]
+
+    def url_cargar_mas(self, listado):
+        self.client.force_login(self.usuarios['estudiante'])
+        return self.client.get(listado).context['url_cargar_mas']
+
+    def pedir(self, metodo, url, datos):
+        if metodo == 'get':
+            return self.client.get(url)
+        if isinstance(datos, str):
+            return self.client.post(url, datos, content_type='application/json')
+        return self.client.post(url, datos or {})
+
+
+@con_cache_compartida
+class PresupuestoConsultasVistasTests(EscenarioVistasMixin, TestCase):
+    """Ninguna vista supera su presupuesto de consultas (ver PRESUPUESTO_CONSULTAS)."""
+
+    def test_presupuesto_por_vista_y_rol(self):
+        for rol, user in self.usuarios.items():
+            for vista, metodo, url, datos in self.peticiones():
+                with self.subTest(vista=vista, rol=rol):
+                    cache.clear()
+                    self.client.force_login(user)
+                    if metodo == 'get':
+                        self.pedir(metodo, url, datos)  # calienta las cachés
+                    with CaptureQueriesContext(connection) as consultas:
+                        respuesta = self.pedir(metodo, url, datos)
+                    self.assertLess(respuesta.status_code, 400, f'{vista} respondió {respuesta.status_code}')
+                    presupuesto = PRESUPUESTO_CONSULTAS[vista][rol]
+                    self.assertLessEqual(
+                        len(consultas), presupuesto,
+                        f"{vista} ({rol}) hizo {len(consultas)} consultas, presupuesto {presupuesto}:\n"
+                        + '\n'.join(c['sql'] for c in consultas.captured_queries),
+                    )
+
+    def test_detalle_no_crece_con_las_valoraciones(self):
+        user = self.usuarios['estudiante']
+        self.client.force_login(user)
+        url_popular = reverse('recursos:resource_detail', args=[self.recurso_popular.pk])
+        url_sin_valorar = reverse('recursos:resource_detail', args=[self.recurso_sin_valorar.pk])
+        self.client.get(url_popular)
+        self.client.get(url_sin_valorar)
+        with CaptureQueriesContext(connection) as popular:
+            self.client.get(url_popular)
+        with CaptureQueriesContext(connection) as sin_valorar:
+            self.client.get(url_sin_valorar)
+        self.assertEqual(len(popular), len(sin_valorar))
+
+    def test_detalle_consultas_fijas(self):
+        # Usuario, ETag, perfil con su carrera, recurso (con sugerido_por y si
+        # es favorito) y valoraciones con sus usuarios. La misión de visita ya
+        # se completó en la primera visita y el GET no escribe nada
+        user = self.usuarios['estudiante']
+        self.client.force_login(user)
+        user.perfil.recursos_favoritos.add(self.recurso_popular)
+        for recurso, favorito in ((self.recurso_popular, True), (self.recurso_sin_valorar, False)):
+            url = reverse('recursos:resource_detail', args=[recurso.pk])
+            self.client.get(url)
+            with self.subTest(recurso=recurso.pk):
+                with CaptureQueriesContext(connection) as consultas:
+                    respuesta = self.client.get(url)
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual(len(consultas), 5, '\n'.join(c['sql'] for c in consultas.captured_queries))
+                self.assertFalse(any(
+                    c['sql'].startswith(('INSERT', 'UPDATE', 'DELETE')) for c in consultas.captured_queries
+                ))
+                self.assertIs(respuesta.context['is_favorited'], favorito)
+
+
+@skipUnless(os.environ.get('BENCHMARK_VISTAS'), "Benchmark de latencia: definir BENCHMARK_VISTAS=1")
+@con_cache_compartida
+class LatenciaVistasBenchmark(EscenarioVistasMixin, TestCase):
+    """
+    Mide la latencia de cada vista por rol (p50, p90 y p99 en milisegundos)
+    y la guarda en un JSON. Si se indica una línea base de una ejecución
+    anterior, falla cuando el p90 de alguna vista empeora más de la tolerancia.
+
+        BENCHMARK_VISTAS=1 python manage.py test portal_uteq.recursos.tests.LatenciaVistasBenchmark
+
+    Variables: BENCHMARK_VISTAS_REPETICIONES (50), BENCHMARK_VISTAS_SALIDA
+    (latencias_vistas.json), BENCHMARK_VISTAS_BASE y BENCHMARK_VISTAS_TOLERANCIA
+    (0.25, es decir, un 25 % más lento).
+    """
+    # Crean filas nuevas en cada repetición; su coste ya lo vigila el presupuesto
+    EXCLUIDAS = {'agregar_valoracion_ajax'}
+
+    def test_latencias(self):
+        repeticiones = int(os.environ.get('BENCHMARK_VISTAS_REPETICIONES', 50))
+        resultados = {}
+        for rol, user in self.usuarios.items():
+            self.client.force_login(user)
+            for vista, metodo, url, datos in self.peticiones():
+                if vista in self.EXCLUIDAS:
+                    continue
+                self.pedir(metodo, url, datos)
+                tiempos = []
+                for _ in range(repeticiones):
+                    inicio = time.perf_counter()
+                    self.pedir(metodo, url, datos)
+                    tiempos.append((time.perf_counter() - inicio) * 1000)
+                percentiles = statistics.quantiles(tiempos, n=100, method='inclusive')
+                resultados[f'{vista}:{rol}'] = {
+                    'p50_ms': round(percentiles[49], 3),
+                    'p90_ms': round(percentiles[89], 3),
+                    'p99_ms': round(percentiles[98], 3),
+                }
+
+        salida = os.environ.get('BENCHMARK_VISTAS_SALIDA', 'latencias_vistas.json')
+        with open(salida, 'w', encoding='utf-8') as fichero:
+            json.dump({
+                'fecha': timezone.now().isoformat(),
+                'motor': connection.vendor,
+                'repeticiones': repeticiones,
+                'vistas': resultados,
+            }, fichero, indent=2, sort_keys=True)
+
+        base = os.environ.get('BENCHMARK_VISTAS_BASE')
+        if base:
+            with open(base, encoding='utf-8') as fichero:
+                anteriores = json.load(fichero)['vistas']
+            tolerancia = float(os.environ.get('BENCHMARK_VISTAS_TOLERANCIA', 0.25))
+            regresiones = [
+                f"{clave}: p90 {medida['p90_ms']} ms (antes {anteriores[clave]['p90_ms']} ms)"
+                for clave, medida in resultados.items()
+                if clave in anteriores and medida['p90_ms'] > anteriores[clave]['p90_ms'] * (1 + tolerancia)
+            ]
+            if regresiones:
+                self.fail('Regresiones de latencia:\n' + '\n'.join(regresiones))
+
+
+class GenerarDatosSinteticosTests(TestCase):
+
+    def generar(self, semilla):
+        call_command(
+            'generar_datos_sinteticos', semilla=semilla, carreras=3, recursos=40, usuarios=25, valoraciones=120,
+            visitas=400, favoritos=60, sin_contrasena=True, batch_size=16, fecha_referencia='2026-03-01',
+            stdout=io.StringIO(),
+        )
+
+    def test_volumenes_y_agregados(self):
+        self.generar(1)
+        self.assertEqual(Recurso.objects.count(), 40)
+        self.assertEqual(Perfil.objects.count(), 25)
+        self.assertEqual(HistorialVisitas.objects.count(), 400)
+        self.assertEqual(
+            UltimaVisita.objects.count(),
+            HistorialVisitas.objects.values('perfil', 'recurso').distinct().count(),
+        )
+        # Los contadores de valoraciones y el índice de búsqueda quedan al día
+        call_command('recalcular_valoraciones', verificar=True, stdout=io.StringIO())
+        self.assertTrue(Recurso.objects.exclude(texto_busqueda='').exists())
+
+    def test_misma_semilla_mismos_datos(self):
+        def huella():
+            return (
+                list(Recurso.objects.order_by('nombre').values_list('tipo', 'estado', 'fecha_creacion', 'num_valoraciones')),
+                list(Valoracion.objects.order_by('user__username', 'recurso__nombre').values_list('puntuacion', 'fecha_creacion')),
+                list(Perfil.objects.order_by('user__username').values_list('puntos', 'racha_actual')),
+            )
+
+        self.generar(5)
+        primera = huella()
+        User.objects.filter(username__startswith='sintetico_').delete()
+        Recurso.objects.all().delete()
+        Carrera.objects.all().delete()
+        self.generar(5)
+        self.assertEqual(huella(), primera)
+
+
+class PerfiladoMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.personal = User.objects.create_user(username='personal', password='x', is_staff=True)
+        cls.estudiante = User.objects.create_user(username='alumno', password='x')
+        Perfil.objects.create(user=cls.estudiante, cedula='4445556667')
+
+    def setUp(self):
+        cache.clear()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+        ajustes = override_settings(PERFILADO_ACTIVO=True, PERFILADO_DIRECTORIO=self.directorio, PERFILADO_MAX_ARCHIVOS=2)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def cliente(self, user):
+        # Cliente nuevo para que cargue el middleware con los ajustes de la prueba
+        cliente = Client()
+        cliente.force_login(user)
+        return cliente
+
+    def perfiles(self):
+        return sorted(nombre for nombre in os.listdir(self.directorio) if nombre.endswith('.prof'))
+
+    def test_server_timing_para_el_personal(self):
+        respuesta = self.cliente(self.personal).get(reverse('recursos:dashboard'))
+        cabecera = respuesta['Server-Timing']
+        self.assertRegex(cabecera, r'db;dur=[\d.]+;desc="[1-9]\d* consultas"')
+        self.assertRegex(cabecera, r'tpl;dur=[\d.]+')
+        self.assertIn('aciertos', cabecera)
+        self.assertFalse(self.perfiles())
+
+    def test_sin_cabecera_para_estudiantes(self):
+        respuesta = self.cliente(self.estudiante).get(reverse('recursos:dashboard'))
+        self.assertNotIn('Server-Timing', respuesta)
+
+    def test_perfil_bajo_demanda_con_token_firmado(self):
+        url = reverse('recursos:dashboard')
+        cliente = self.cliente(self.personal)
+        respuesta = cliente.get(url, {'perfilar': perfilado.token_perfilado(self.personal)})
+        self.assertEqual(self.perfiles(), [respuesta['X-Perfil']])
+
+        # Token manipulado o de otro usuario: no se perfila
+        cliente.get(url, {'perfilar': 'falso'})
+        self.cliente(self.estudiante).get(url, {'perfilar': perfilado.token_perfilado(self.personal)})
+        self.assertEqual(len(self.perfiles()), 1)
+
+    def test_muestreo_y_rotacion(self):
+        with override_settings(PERFILADO_MUESTREO=1.0):
+            cliente = self.cliente(self.personal)
+            for _ in range(4):
+                cliente.get(reverse('recursos:career_list'))
+        self.assertEqual(len(self.perfiles()), 2)
+
+    def test_desactivado_se_retira_de_la_cadena(self):
+        with override_settings(PERFILADO_ACTIVO=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                perfilado.PerfiladoMiddleware(lambda request: None)
+
+
+class VisorRegistrosTests(TestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = os.path.join(directorio.name, 'app.log')
+        ajustes = override_settings(LOG_ARCHIVO=self.ruta, LOG_COPIAS=2)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def escribir(self, *entradas, ruta=None):
+        with open(ruta or self.ruta, 'a', encoding='utf-8') as archivo:
+            for nivel, mensaje in entradas:
+                archivo.write(f'2026-03-01 10:00:00,000 {nivel} django.request: {mensaje}\n')
+
+    def leer(self, **kwargs):
+        siguiente, entradas = registros.leer(**kwargs)
+        return siguiente, ''.join(entradas)
+
+    def test_filtra_por_nivel_y_texto_con_trazas_multilinea(self):
+        self.escribir(('INFO', 'arranque'), ('ERROR', 'Internal Server Error: /dashboard/\nTraceback:\n  ZeroDivisionError'))
+        self.escribir(('ERROR', 'Internal Server Error: /carreras/'), ('DEBUG', 'ZeroDivisionError en un debug'))
+
+        _, texto = self.leer(nivel='ERROR', contiene='zerodivision')
+        self.assertIn('/dashboard/', texto)
+        self.assertIn('  ZeroDivisionError', texto)
+        self.assertNotIn('/carreras/', texto)
+        self.assertNotIn('debug', texto)
+
+    def test_continua_desde_la_posicion_anterior(self):
+        self.escribir(('INFO', 'primera'))
+        siguiente, texto = self.leer()
+        self.assertIn('primera', texto)
+
+        self.escribir(('INFO', 'segunda'))
+        with open(self.ruta, 'a', encoding='utf-8') as archivo:
+            archivo.write('2026-03-01 10:00:01,000 INFO django: a medio escri')
+        siguiente, texto = self.leer(desde=siguiente)
+        self.assertEqual(texto.count('\n'), 1)
+        self.assertIn('segunda', texto)
+
+        # La línea a medio escribir sale entera en la lectura siguiente
+        with open(self.ruta, 'a', encoding='utf-8') as archivo:
+            archivo.write('bir\n')
+        _, texto = self.leer(desde=siguiente)
+        self.assertIn('a medio escribir', texto)
+
+    def test_sigue_la_rotacion_del_archivo(self):
+        self.escribir(('INFO', 'antes'))
+        siguiente, _ = self.leer()
+        self.escribir(('INFO', 'justo antes de rotar'))
+        os.rename(self.ruta, f'{self.ruta}.1')
+        self.escribir(('INFO', 'despues'))
+
+        _, texto = self.leer(desde=siguiente)
+        self.assertNotIn(' antes\n', texto)
+        self.assertLess(texto.index('justo antes de rotar'), texto.index('despues'))
+
+    def test_sigue_la_rotacion_externa_con_el_handler_de_settings(self):
+        configuracion = settings.LOGGING['handlers']['file']
+        self.assertEqual(configuracion['class'], 'logging.handlers.WatchedFileHandler')
+        handler = logging.handlers.WatchedFileHandler(self.ruta, encoding='utf-8')
+        handler.setFormatter(logging.Formatter(settings.LOGGING['formatters']['detallado']['format']))
+        self.addCleanup(handler.close)
+        logger = logging.getLogger('portal_uteq.tests.registros')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        logger.error('antes de logrotate')
+        siguiente, _ = self.leer()
+
+        logger.error('aun en la copia')
+        os.rename(self.ruta, f'{self.ruta}.1')  # lo que hace logrotate
+        logger.error('tras reabrir')
+        _, texto = self.leer(desde=siguiente)
+        self.assertNotIn('antes de logrotate', texto)
+        self.assertLess(texto.index('aun en la copia'), texto.index('tras reabrir'))
+        with open(self.ruta, encoding='utf-8') as archivo:
+            self.assertIn('tras reabrir', archivo.read())
+
+    def test_lee_solo_la_cola(self):
+        for i in range(2000):
+            self.escribir(('INFO', f'linea {i:04d}'))
+        _, texto = self.leer(cola=1024)
+        self.assertIn('linea 1999', texto)
+        self.assertNotIn('linea 0000', texto)
+        self.assertLess(len(texto), 1024)
+
+    def test_vista_solo_para_el_personal(self):
+        self.escribir(('ERROR', 'fallo'))
+        url = reverse('recursos:visor_registros')
+        user = User.objects.create_user(username='normal', password='x')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        user.is_staff = True
+        user.save()
+        respuesta = self.client.get(url, {'nivel': 'ERROR'})
+        self.assertTrue(respuesta.streaming)
+        self.assertIn('fallo', b''.join(respuesta.streaming_content).decode())
+        self.assertRegex(respuesta['X-Log-Siguiente'], r'^\d+:\d+$')
+
+
+@con_cache_compartida
+class SesionDeslizanteTests(TestCase):
+    """
+    Motor de sesiones de recursos/sesiones.py: la caducidad se desliza en cada
+    petición pero django_session solo se escribe cuando cambian los datos o ha
+    pasado SESION_FRACCION_ESCRITURA de la vida de la sesión.
+    """
+    PETICIONES = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='sesion', password='x')
+        Perfil.objects.create(user=cls.user, cedula='7778889990')
+
+    def setUp(self):
+        cache.clear()
+
+    def escrituras_de_sesion(self, engine):
+        """Consultas que escriben en django_session durante PETICIONES vistas autenticadas."""
+        with override_settings(SESSION_ENGINE=engine):
+            cliente = Client()
+            cliente.force_login(self.user)
+            with CaptureQueriesContext(connection) as consultas:
+                for _ in range(self.PETICIONES):
+                    self.assertEqual(cliente.get(reverse('recursos:career_list')).status_code, 200)
+        return [c['sql'] for c in consultas.captured_queries if re.match(r'(UPDATE|INSERT) .*django_session', c['sql'])]
+
+    def test_menos_escrituras_por_peticion(self):
+        por_peticion = self.escrituras_de_sesion('django.contrib.sessions.backends.db')
+        deslizante = self.escrituras_de_sesion('portal_uteq.recursos.sesiones')
+        self.assertEqual(len(por_peticion), self.PETICIONES)
+        self.assertEqual(deslizante, [])
+
+    def test_la_caducidad_se_escribe_pasada_la_fraccion(self):
+        self.client.force_login(self.user)
+        clave = self.client.session.session_key
+        cache_key = sesiones.KEY_PREFIX + clave
+        caducidad_inicial = Session.objects.get(pk=clave).expire_date
+
+        # Simula que la última escritura fue hace más de la fracción (10 % de 30 min)
+        entrada = cache.get(cache_key)
+        entrada['escrito'] -= 0.2 * settings.SESSION_COOKIE_AGE
+        cache.set(cache_key, entrada)
+        self.client.get(reverse('recursos:career_list'))
+
+        self.assertGreater(Session.objects.get(pk=clave).expire_date, caducidad_inicial)
+        self.assertAlmostEqual(cache.get(cache_key)['escrito'], time.time(), delta=5)
+
+    def test_la_cache_mantiene_la_caducidad_deslizante(self):
+        self.client.force_login(self.user)
+        cache_key = sesiones.KEY_PREFIX + self.client.session.session_key
+        expira = cache.get(cache_key)['expira']
+        time.sleep(0.01)
+        self.client.get(reverse('recursos:career_list'))
+        self.assertGreater(cache.get(cache_key)['expira'], expira)
+
+    def test_los_cambios_de_datos_se_escriben_enseguida(self):
+        self.client.force_login(self.user)
+        sesion = self.client.session
+        sesion['preferencia'] = 'oscuro'
+        sesion.save()
+        fila = Session.objects.get(pk=sesion.session_key)
+        self.assertEqual(fila.get_decoded()['preferencia'], 'oscuro')
+
+    def test_sin_cache_se_lee_de_la_base_de_datos(self):
+        self.client.force_login(self.user)
+        cache.clear()
+        respuesta = self.client.get(reverse('recursos:career_list'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['user'], self.user)
+
+    def test_logout_borra_la_entrada_de_cache(self):
+        self.client.force_login(self.user)
+        clave = self.client.session.session_key
+        self.client.post(reverse('logout'))
+        self.assertIsNone(cache.get(sesiones.KEY_PREFIX + clave))
+        self.assertFalse(Session.objects.filter(pk=clave).exists())
+
+    def sesion_en_otro_worker(self, clave, cache_del_worker):
+        """La sesión tal como la cargaría otro proceso con su propia caché."""
+        sesion = sesiones.SessionStore(clave)
+        sesion._cache = cache_del_worker
+        return sesion.load()
+
+    def test_logout_llega_a_otro_worker_con_cache_compartida(self):
+        with tempfile.TemporaryDirectory() as directorio, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio,
+        }}):
+            otra = FileBasedCache(directorio, {})
+            self.client.force_login(self.user)
+            clave = self.client.session.session_key
+            self.assertEqual(self.sesion_en_otro_worker(clave, otra)['_auth_user_id'], str(self.user.pk))
+            self.client.post(reverse('logout'))
+            self.assertEqual(self.sesion_en_otro_worker(clave, otra), {})
+
+    @override_settings(CACHE_COMPARTIDA=None)
+    def test_con_cache_por_proceso_el_logout_no_deja_la_sesion_en_otro_worker(self):
+        self.client.force_login(self.user)
+        clave = self.client.session.session_key
+        # Otro worker con su LocMemCache ya tenía la sesión cacheada
+        otra = LocMemCache('otro-worker', {})
+        otra.set(sesiones.KEY_PREFIX + clave, {
+            'datos': dict(self.client.session.items()), 'expira': time.time() + 600, 'escrito': time.time(),
+        })
+        self.assertIsNone(cache.get(sesiones.KEY_PREFIX + clave))
+        self.client.post(reverse('logout'))
+        # Sin caché compartida el motor solo usa la base de datos
+        self.assertEqual(self.sesion_en_otro_worker(clave, otra), {})
+
+
+class ConexionContada(locmem.EmailBackend):
+    """Backend locmem que cuenta las conexiones abiertas y falla para ciertos destinatarios."""
+    aperturas = 0
+    rechazados = set()
+
+    def open(self):
+        ConexionContada.aperturas += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for mensaje in messages:
+            if set(mensaje.to) & self.rechazados:
+                raise smtplib.SMTPRecipientsRefused({destino: (550, b'No existe') for destino in mensaje.to})
+        return super().send_messages(messages)
+
+
+@override_settings(CORREO_LOTE=5, CORREO_MAX_INTENTOS=3, CORREO_ESPERA_BASE=60, CORREO_ESPERA_MAXIMA=90)
+class BandejaCorreoTests(TestCase):
+
+    def setUp(self):
+        ConexionContada.aperturas = 0
+        ConexionContada.rechazados = set()
+
+    def encolar(self, cantidad, prefijo='alumno'):
+        return [correo.encolar('Bienvenida', 'Hola', [f'{prefijo}{i}@uteq.edu.ec']) for i in range(cantidad)]
+
+    def test_el_registro_encola_sin_enviar(self):
+        carrera = Carrera.objects.create(nombre='Software')
+        respuesta = self.client.post(reverse('recursos:register'), {
+            'first_name': 'Ana', 'last_name': 'Pérez Soto', 'email': 'ana@uteq.edu.ec',
+            'cedula': '0912345678', 'carrera': carrera.pk,
+        })
+        self.assertRedirects(respuesta, reverse('login'), fetch_redirect_response=False)
+        self.assertEqual(mail.outbox, [])
+        pendiente = CorreoPendiente.objects.get()
+        self.assertEqual(pendiente.destinatarios, ['ana@uteq.edu.ec'])
+        self.assertIn('0912345678*', pendiente.cuerpo)
+
+        correo.enviar_pendientes()
+        self.assertEqual(len(mail.outbox), 1)
+        pendiente.refresh_from_db()
+        self.assertEqual(pendiente.estado, CorreoPendiente.ESTADO_ENVIADO)
+        self.assertEqual(pendiente.cuerpo, '')
+
+    def test_lotes_con_una_conexion(self):
+        self.encolar(12)
+        salida = io.StringIO()
+        with override_settings(EMAIL_BACKEND='portal_uteq.recursos.tests.ConexionContada'):
+            call_command('enviar_correos', stdout=salida)
+        self.assertEqual(len(mail.outbox), 12)
+        # Tres lotes (5 + 5 + 2), una conexión por lote
+        self.assertEqual(ConexionContada.aperturas, 3)
+        self.assertIn('12 correo(s) enviados', salida.getvalue())
+        self.assertFalse(CorreoPendiente.objects.filter(estado=CorreoPendiente.ESTADO_PENDIENTE).exists())
+
+    def test_reintento_con_espera_exponencial(self):
+        self.encolar(2)
+        ConexionContada.rechazados = {'alumno1@uteq.edu.ec'}
+        conexion = ConexionContada()
+        antes = timezone.now()
+        self.assertEqual(correo.enviar_pendientes(conexion=conexion), (1, 1))
+        fallido = CorreoPendiente.objects.get(estado=CorreoPendiente.ESTADO_PENDIENTE)
+        self.assertEqual(fallido.intentos, 1)
+        self.assertIn('SMTPRecipientsRefused', fallido.ultimo_error)
+        self.assertGreaterEqual(fallido.proximo_intento, antes + correo.espera(1))
+
+        # Aún no vence: el worker no lo toca
+        self.assertEqual(correo.enviar_pendientes(conexion=conexion), (0, 0))
+        self.assertEqual([correo.espera(n).total_seconds() for n in (1, 2, 3)], [60, 90, 90])
+
+        with self.assertLogs('portal_uteq.recursos.correo', 'ERROR'):
+            for _ in range(2):
+                CorreoPendiente.objects.filter(pk=fallido.pk).update(proximo_intento=timezone.now())
+                correo.enviar_pendientes(conexion=conexion)
+        fallido.refresh_from_db()
+        self.assertEqual(fallido.intentos, 3)
+        self.assertEqual(fallido.estado, CorreoPendiente.ESTADO_FALLIDO)
+
+    def test_sin_servidor_se_reprograma_el_lote(self):
+        self.encolar(3)
+
+        class SinServidor(locmem.EmailBackend):
+            def open(self):
+                raise ConnectionRefusedError('smtp caído')
+
+        with self.assertLogs('portal_uteq.recursos.correo', 'WARNING'):
+            self.assertEqual(correo.enviar_pendientes(conexion=SinServidor()), (0, 3))
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(CorreoPendiente.objects.filter(intentos=0).exists())
+
+
+# Hasher rápido: aquí se prueba el reparto del trabajo, no PBKDF2
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportacionEstudiantesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.software = Carrera.objects.create(nombre='Software')
+        cls.agronomia = Carrera.objects.create(nombre='Agronomía')
+        User.objects.create_user(username='jperez')
+        User.objects.create_user(username='jperez1')
+        Perfil.objects.create(user=User.objects.create_user(username='antiguo'), cedula='0000000001')
+
+    def csv(self, *filas, cabecera='nombres,apellidos,email,cedula,carrera'):
+        return io.StringIO('\n'.join((cabecera,) + filas) + '\n')
+
+    def test_mismas_reglas_que_el_registro(self):
+        self.assertEqual(importacion.username_base('María José', 'Núñez', ''), 'mnunez')
+        self.assertEqual(importacion.username_base('Juan', 'Pérez García', 'x@uteq.edu.ec'), 'jperezg')
+        self.assertEqual(importacion.username_base('', '', 'ana.mora@uteq.edu.ec'), 'ana.mora')
+
+    def test_colisiones_con_una_consulta_por_lote(self):
+        archivo = self.csv(
+            'Juan,Pérez,juan@uteq.edu.ec,0900000001,Software',
+            'Julia,Pérez,julia@uteq.edu.ec,0900000002,Software',
+            'José,Pérez García,jose@uteq.edu.ec,0900000003,%d' % self.agronomia.pk,
+            'Ana,Mora,,0900000004,',
+        )
+        with CaptureQueriesContext(connection) as consultas:
+            creados, errores = importacion.importar(archivo, procesos=1)
+        self.assertEqual((creados, errores), (4, []))
+        prefijos = [c for c in consultas.captured_queries if 'LIKE' in c['sql'] and 'auth_user' in c['sql']]
+        self.assertEqual(len(prefijos), 1)
+        inserciones = [c for c in consultas.captured_queries if c['sql'].startswith('INSERT INTO "auth_user"')]
+        self.assertEqual(len(inserciones), 1)
+
+        perfiles = {p.cedula: p for p in Perfil.objects.select_related('user').filter(cedula__startswith='09')}
+        self.assertEqual(
+            [perfiles[f'090000000{i}'].user.username for i in range(1, 5)],
+            ['jperez2', 'jperez3', 'jperezg', 'amora'],
+        )
+        self.assertEqual(perfiles['0900000001'].carrera, self.software)
+        self.assertEqual(perfiles['0900000003'].carrera, self.agronomia)
+        self.assertIsNone(perfiles['0900000004'].carrera)
+
+        # Un correo por estudiante con email, con la contraseña temporal que funciona
+        pendiente = CorreoPendiente.objects.get(destinatarios=['juan@uteq.edu.ec'])
+        contrasena = re.search(r'0900000001\*\d{4}', pendiente.cuerpo).group()
+        self.assertTrue(perfiles['0900000001'].user.check_password(contrasena))
+        self.assertEqual(CorreoPendiente.objects.count(), 3)
+
+    def test_filas_con_errores_se_omiten(self):
+        archivo = self.csv(
+            'Luis,Vera,luis@uteq.edu.ec,0900000010,Software',
+            'Luis,Vera,otro@uteq.edu.ec,0900000010,Software',
+            'Carla,Loor,carla@uteq.edu.ec,0000000001,Software',
+            'Pedro,Macías,pedro@uteq.edu.ec,0900000011,Medicina',
+            'Sofía,Cedeño,no-es-un-email,0900000012,Software',
+            ',Intriago,diego@uteq.edu.ec,0900000013,Software',
+        )
+        creados, errores = importacion.importar(archivo, procesos=1, enviar_correo=False)
+        self.assertEqual(creados, 1)
+        self.assertEqual([linea for linea, _ in errores], [3, 4, 5, 6, 7])
+        self.assertFalse(CorreoPendiente.objects.exists())
+
+        creados, errores = importacion.importar(self.csv('Luis,Vera', cabecera='nombres,apellidos'), procesos=1)
+        self.assertEqual(creados, 0)
+        self.assertIn('Faltan columnas', errores[0][1])
+
+    def test_username_ocupado_durante_la_importacion_se_reintenta(self):
+        asignar = importacion.asignar_usernames
+
+        def ocupado_tras_consultar(bases):
+            # Un registro simultáneo ocupa el username tras la consulta de prefijos
+            usernames = asignar(bases)
+            if not User.objects.filter(username='lvera').exists():
+                User.objects.create_user(username='lvera')
+            return usernames
+
+        with mock.patch.object(importacion, 'asignar_usernames', ocupado_tras_consultar):
+            creados, errores = importacion.importar(
+                self.csv('Luis,Vera,luis@uteq.edu.ec,0900000030,Software'), procesos=1, enviar_correo=False
+            )
+        self.assertEqual((creados, errores), (1, []))
+        self.assertEqual(Perfil.objects.get(cedula='0900000030').user.username, 'lvera1')
+
+    def test_lote_que_sigue_fallando_se_informa_sin_deshacer_los_anteriores(self):
+        filas = [f'Estudiante{i},Zambrano,,07{i:08d},Software' for i in range(3)]
+
+        def siempre_ocupado(bases):
+            return ['jperez'] * len(bases)
+
+        with mock.patch.object(importacion, 'LOTE', 2):
+            asignar = importacion.asignar_usernames
+            llamadas = iter([asignar, siempre_ocupado, siempre_ocupado, siempre_ocupado])
+            with mock.patch.object(importacion, 'asignar_usernames', lambda bases: next(llamadas)(bases)):
+                creados, errores = importacion.importar(self.csv(*filas), procesos=1, enviar_correo=False)
+        self.assertEqual(creados, 2)
+        self.assertEqual([linea for linea, _ in errores], [4])
+        self.assertEqual(Perfil.objects.filter(cedula__startswith='07').count(), 2)
+
+    def test_cedula_registrada_durante_la_importacion(self):
+        asignar = importacion.asignar_usernames
+
+        def cedula_ocupada(bases):
+            if not Perfil.objects.filter(cedula='0900000031').exists():
+                Perfil.objects.create(user=User.objects.create_user(username='rapido'), cedula='0900000031')
+            return asignar(bases)
+
+        with mock.patch.object(importacion, 'asignar_usernames', cedula_ocupada):
+            creados, errores = importacion.importar(
+                self.csv('Ana,Loor,,0900000031,Software', 'Eva,Loor,,0900000032,Software'),
+                procesos=1, enviar_correo=False,
+            )
+        self.assertEqual(creados, 1)
+        self.assertEqual([linea for linea, _ in errores], [2])
+        self.assertIn('ya ha sido registrada', errores[0][1])
+
+    def test_comando_con_varios_procesos(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as archivo:
+            archivo.write('nombres;apellidos;email;cedula;carrera\n')
+            for i in range(20):
+                archivo.write(f'Estudiante{i};Zambrano;e{i}@uteq.edu.ec;08{i:08d};Software\n')
+        self.addCleanup(os.remove, archivo.name)
+        salida = io.StringIO()
+        call_command('importar_estudiantes', archivo.name, '--procesos', '2', '--sin-correo', stdout=salida, stderr=io.StringIO())
+        self.assertIn('20 estudiante(s) importados', salida.getvalue())
+        self.assertEqual(Perfil.objects.filter(cedula__startswith='08', carrera=self.software).count(), 20)
+
+    # El admin usa {% static %}: sin collectstatic no hay manifiesto
+    @override_settings(STORAGES={
+        **settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    })
+    def test_importacion_desde_el_admin(self):
+        admin = User.objects.create_superuser(username='admin', password='x', email='admin@uteq.edu.ec')
+        self.client.force_login(admin)
+        url = reverse('admin:auth_user_importar_estudiantes')
+        self.assertContains(self.client.get(reverse('admin:auth_user_changelist')), url)
+        archivo = SimpleUploadedFile(
+            'estudiantes.csv',
+            'nombres,apellidos,email,cedula,carrera\n'
+            'Eva,Loor,eva@uteq.edu.ec,0900000020,Software\nIván,Loor,,0900000021,Software\n'.encode(),
+        )
+        with mock.patch.object(importacion, 'ProcessPoolExecutor') as pool:
+            respuesta = self.client.post(url, {'archivo': archivo, 'enviar_correo': 'on'})
+        pool.assert_not_called()
+        self.assertRedirects(respuesta, reverse('admin:auth_user_changelist'))
+        self.assertTrue(User.objects.filter(username='eloor', perfil__cedula='0900000020').exists())
+        self.assertTrue(User.objects.filter(username='iloor', perfil__cedula='0900000021').exists())
+        self.assertEqual(CorreoPendiente.objects.count(), 1)
+
+
+class VariantesImagenesTests(TestCase):
+    """Variantes WebP/JPEG generadas con Pillow en almacenamiento local (ver imagenes.py)."""
+
+    def setUp(self):
+        cache.clear()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = override_settings(MEDIA_ROOT=directorio.name, STORAGES={
+            **settings.STORAGES, 'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        })
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def foto(self, ancho=1600, alto=1000):
+        """JPEG con ruido, que comprime tan mal como una foto real."""
+        from PIL import Image
+        imagen = Image.frombytes('RGB', (ancho, alto), random.Random(0).randbytes(ancho * alto * 3))
+        salida = io.BytesIO()
+        imagen.save(salida, 'JPEG', quality=90)
+        return SimpleUploadedFile('portada.jpg', salida.getvalue(), content_type='image/jpeg')
+
+    def carrera_con_imagen(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Carrera.objects.create(nombre='Software', imagen=self.foto(**kwargs))
+
+    def test_variantes_al_subir(self):
+        carrera = self.carrera_con_imagen()
+        variantes = imagenes.variantes(carrera.imagen)
+        self.assertEqual([ancho for ancho, _ in variantes['webp']], list(imagenes.ANCHOS))
+        self.assertEqual([ancho for ancho, _ in variantes['jpeg']], list(imagenes.ANCHOS))
+        self.assertEqual((variantes['ancho'], variantes['alto']), (1600, 1000))
+        self.assertTrue(variantes['marcador'].startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(variantes['marcador']), 1500)
+
+        # La variante que usan las tarjetas pesa un orden de magnitud menos
+        storage = carrera.imagen.storage
+        ruta = imagenes._ruta_derivados(carrera.imagen.name)
+        self.assertLess(storage.size(f'{ruta}/480.webp') * 10, carrera.imagen.size)
+        self.assertLess(storage.size(f'{ruta}/480.jpg') * 10, carrera.imagen.size)
+
+    def test_no_se_amplian_imagenes_pequenas(self):
+        carrera = self.carrera_con_imagen(ancho=100, alto=80)
+        self.assertEqual([ancho for ancho, _ in imagenes.variantes(carrera.imagen)['jpeg']], [100])
+
+    def test_resultado_cacheado(self):
+        carrera = self.carrera_con_imagen()
+        imagenes.variantes(carrera.imagen)
+        carrera.imagen.storage.delete(f'{imagenes._ruta_derivados(carrera.imagen.name)}/manifest.json')
+        self.assertIsNotNone(imagenes.variantes(carrera.imagen))
+
+    def test_etiqueta_en_el_listado_de_carreras(self):
+        carrera = self.carrera_con_imagen()
+        user = User.objects.create_user(username='alumno', password='x')
+        Perfil.objects.create(user=user, cedula='1231231231')
+        self.client.force_login(user)
+        html = self.client.get(reverse('recursos:career_list')).content.decode()
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertRegex(html, r'srcset="[^"]*/120\.webp 120w, [^"]*/240\.webp 240w')
+        self.assertNotIn(f'src="{carrera.imagen.url}"', html)
+
+    def test_transformaciones_de_cloudinary(self):
+        url = 'https://res.cloudinary.com/demo/image/upload/v1/media/carreras_imagenes/portada.jpg'
+        self.assertEqual(
+            imagenes._transformar(url, 'w_240,c_limit,f_webp,q_auto'),
+            'https://res.cloudinary.com/demo/image/upload/w_240,c_limit,f_webp,q_auto/v1/media/carreras_imagenes/portada.jpg',
+        )
+
+
+class ClasificacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.software, cls.agronomia = Carrera.objects.create(nombre='Software'), Carrera.objects.create(nombre='Agronomía')
+        cls.perfiles = {}
+        for i, (nombre, puntos, carrera) in enumerate([
+            ('ana', 50, cls.software), ('luis', 30, cls.software), ('eva', 30, cls.agronomia), ('pedro', 10, cls.software),
+        ]):
+            user = User.objects.create_user(username=nombre, password='x', first_name=nombre.capitalize(), last_name='Mora')
+            cls.perfiles[nombre] = Perfil.objects.create(user=user, cedula=f'55{i:08d}', carrera=carrera, puntos=puntos)
+        Mision.objects.create(key='valorar_recurso', nombre='Valorar', descripcion='-', puntos_recompensa=25)
+
+    def setUp(self):
+        cache.clear()
+        clasificacion.invalidar()
+
+    def test_top_y_posicion_con_empates(self):
+        self.assertEqual(
+            [(fila['posicion'], fila['nombre'], fila['puntos']) for fila in clasificacion.top(3)],
+            [(1, 'Ana M.', 50), (2, 'Luis M.', 30), (2, 'Eva M.', 30)],
+        )
+        pedro = self.perfiles['pedro']
+        self.assertEqual(clasificacion.posicion(pedro.pk, pedro.puntos), (4, 4))
+        self.assertEqual(clasificacion.posicion(pedro.pk, pedro.puntos, self.software.pk), (3, 3))
+        self.assertEqual([fila['nombre'] for fila in clasificacion.top(5, self.agronomia.pk)], ['Eva M.'])
+
+    def test_los_puntos_ganados_se_aplican_sin_reconstruir(self):
+        pedro = self.perfiles['pedro']
+        clasificacion.top()
+        MisionDiariaUsuario.objects.create(perfil=pedro, mision=Mision.objects.get(), fecha_asignacion=timezone.localdate())
+        with self.captureOnCommitCallbacks(execute=True):
+            misiones.completar_mision(pedro.pk, 'valorar_recurso')
+        with self.assertNumQueries(0):
+            self.assertEqual(clasificacion.posicion(pedro.pk, 35), (2, 4))
+            self.assertEqual([fila['nombre'] for fila in clasificacion.top(2, self.software.pk)], ['Ana M.', 'Pedro M.'])
+
+    def test_la_posicion_propia_usa_los_puntos_actuales(self):
+        ana = self.perfiles['ana']
+        clasificacion.top()
+        # La tabla aún cree que Ana tiene 50; con 20 queda detrás de los de 30
+        self.assertEqual(clasificacion.posicion(ana.pk, 20), (3, 4))
+        self.assertEqual(clasificacion.posicion(ana.pk, 90), (1, 4))
+
+    def test_altas_y_bajas_invalidan(self):
+        clasificacion.top()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.perfiles['ana'].delete()
+        self.assertEqual(clasificacion.top(1)[0]['puntos'], 30)
+
+    def test_top_no_mezcla_una_reconstruccion_simultanea(self):
+        clasificacion.top()
+        tabla_original = clasificacion._tabla
+        Perfil.objects.filter(pk=self.perfiles['ana'].pk).delete()
+
+        def reconstruida_entre_lecturas(estado, carrera_id):
+            # Otro hilo reconstruye sin Ana después de que este haya tomado su tabla
+            tabla = tabla_original(estado, carrera_id)
+            clasificacion._construir('otra')
+            return tabla
+
+        with mock.patch.object(clasificacion, '_tabla', reconstruida_entre_lecturas):
+            self.assertEqual(clasificacion.top(1)[0]['nombre'], 'Ana M.')
+        self.assertEqual(clasificacion.top(1)[0]['puntos'], 30)
+
+    def test_consultas_en_tiempo_sublineal(self):
+        tabla = clasificacion.Tabla([(perfil_id, (perfil_id * 7919) % 5000) for perfil_id in range(100_000)])
+        inicio = time.perf_counter()
+        for perfil_id in range(0, 100_000, 10):
+            tabla.posicion(perfil_id, (perfil_id * 7919) % 5000)
+        por_consulta = (time.perf_counter() - inicio) / 10_000
+        self.assertLess(por_consulta, 0.001)
+        self.assertEqual(tabla.posicion(-1, 5000), 1)
+        self.assertEqual(len(tabla.top(10)), 10)
+
+    def test_dashboard_muestra_la_clasificacion(self):
+        clasificacion.top()  # fuera de una petición se construye al momento
+        self.client.force_login(self.perfiles['luis'].user)
+        respuesta = self.client.get(reverse('recursos:dashboard'))
+        self.assertContains(respuesta, 'eres el #2 de 4')
+        self.assertContains(respuesta, 'eres el #2 de 3')
+        self.assertEqual(respuesta.context['clasificacion_global'][0]['nombre'], 'Ana M.')
+
+    def test_la_peticion_no_reconstruye_la_lista_vencida(self):
+        clasificacion.top()
+        self.client.force_login(self.perfiles['luis'].user)
+        with self.captureOnCommitCallbacks(execute=True):
+            Perfil.objects.create(user=User.objects.create_user(username='zoe', first_name='Zoe', last_name='Mora'), cedula='5500000009', puntos=90)
+
+        with mock.patch.object(clasificacion, '_construir', wraps=clasificacion._construir) as construir:
+            respuesta = self.client.get(reverse('recursos:dashboard'))
+        # La página usa la lista anterior; la nueva se construye al terminar la petición
+        self.assertEqual(respuesta.context['clasificacion_global'][0]['nombre'], 'Ana M.')
+        construir.assert_called_once()
+        respuesta = self.client.get(reverse('recursos:dashboard'))
+        self.assertEqual(respuesta.context['clasificacion_global'][0]['nombre'], 'Zoe M.')
+
+    def test_un_fallo_al_reconstruir_tras_la_respuesta_solo_se_registra(self):
+        clasificacion.top()
+        clasificacion.invalidar()
+        self.client.force_login(self.perfiles['luis'].user)
+        with mock.patch.object(clasificacion, '_construir', side_effect=RuntimeError('BD caída')), \
+                self.assertLogs('portal_uteq.recursos.clasificacion', 'ERROR'):
+            self.assertEqual(self.client.get(reverse('recursos:dashboard')).status_code, 200)
+
+
+class RecomendacionesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.carrera = Carrera.objects.create(nombre='Software')
+        cls.recursos = {
+            nombre: Recurso.objects.create(
+                nombre=nombre, descripcion='-', url_externa='https://example.com', tipo='ia',
+                estado=Recurso.ESTADO_APROBADO,
+            )
+            for nombre in ('a', 'b', 'c', 'd')
+        }
+        cls.perfiles = {}
+        for i, nombre in enumerate(('u1', 'u2', 'u3')):
+            user = User.objects.create_user(username=nombre, password='x')
+            cls.perfiles[nombre] = Perfil.objects.create(user=user, cedula=f'66{i:08d}', carrera=cls.carrera)
+        # u1 y u2 usan a y b; u3 usa c y d
+        for perfil, nombres in (('u1', 'ab'), ('u2', 'ab'), ('u3', 'cd')):
+            for nombre in nombres:
+                HistorialVisitas.objects.create(perfil=cls.perfiles[perfil], recurso=cls.recursos[nombre])
+        cls.perfiles['u2'].recursos_favoritos.add(cls.recursos['b'])
+
+    def setUp(self):
+        cache.clear()
+
+    def vecinos(self, nombre):
+        return [otro_id for otro_id, _ in RecursoSimilares.objects.get(recurso=self.recursos[nombre]).vecinos]
+
+    def test_vecinos_por_interacciones_compartidas(self):
+        self.assertEqual(recomendaciones.calcular(), (4, 4))
+        self.assertEqual(self.vecinos('a'), [self.recursos['b'].pk])
+        self.assertEqual(self.vecinos('c'), [self.recursos['d'].pk])
+        self.assertEqual(recomendaciones.similares(self.recursos['a'].pk), [self.recursos['b']])
+
+    def test_la_ejecucion_incremental_solo_recalcula_lo_que_cambio(self):
+        recomendaciones.calcular()
+        self.assertEqual(recomendaciones.calcular(), (0, 4))
+        HistorialVisitas.objects.create(perfil=self.perfiles['u3'], recurso=self.recursos['a'])
+        # a cambió y b lo tenía como vecino
+        self.assertEqual(recomendaciones.calcular(), (2, 4))
+        self.assertEqual(self.vecinos('a')[0], self.recursos['b'].pk)
+        self.assertCountEqual(self.vecinos('a')[1:], [self.recursos['c'].pk, self.recursos['d'].pk])
+        # c y d no se recalculan, pero a entra en sus listas
+        self.assertEqual(self.vecinos('c'), [self.recursos['d'].pk, self.recursos['a'].pk])
+        incremental = {nombre: self.vecinos(nombre) for nombre in 'abcd'}
+        self.assertEqual(recomendaciones.calcular(completo=True), (4, 4))
+        self.assertEqual({nombre: self.vecinos(nombre) for nombre in 'abcd'}, incremental)
+
+    def test_la_ejecucion_incremental_solo_lee_las_interacciones_afectadas(self):
+        recomendaciones.calcular()
+        HistorialVisitas.objects.create(perfil=self.perfiles['u3'], recurso=self.recursos['c'])
+        with mock.patch.object(recomendaciones, '_interacciones', wraps=recomendaciones._interacciones) as interacciones:
+            self.assertEqual(recomendaciones.calcular(), (2, 4))
+        # Los vectores de c y d (su vecino) y luego lo que hizo u3, nunca todo
+        self.assertEqual(interacciones.call_args_list[0].kwargs, {'recursos': {self.recursos['c'].pk, self.recursos['d'].pk}})
+        self.assertEqual(interacciones.call_args_list[1].kwargs, {'perfiles': {self.perfiles['u3'].pk}})
+
+    def test_los_cambios_de_favoritos_recalculan_el_recurso(self):
+        recomendaciones.calcular()
+        # Pasar el favorito a otro perfil no altera el conteo, pero el alta tiene ID nuevo
+        self.perfiles['u2'].recursos_favoritos.remove(self.recursos['b'])
+        self.perfiles['u1'].recursos_favoritos.add(self.recursos['b'])
+        self.assertEqual(recomendaciones.calcular(), (2, 4))
+        # Una baja no deja ID, pero cambia el conteo
+        self.perfiles['u1'].recursos_favoritos.remove(self.recursos['b'])
+        self.assertEqual(recomendaciones.calcular(), (2, 4))
+        self.assertEqual(recomendaciones.calcular(), (0, 4))
+
+    def test_los_recursos_no_aprobados_no_se_recomiendan(self):
+        recomendaciones.calcular()
+        Recurso.objects.filter(pk=self.recursos['b'].pk).update(estado=Recurso.ESTADO_PENDIENTE)
+        # Hasta el próximo cálculo la lista precalculada se filtra al cargarla
+        recomendaciones.invalidar()
+        self.assertEqual(recomendaciones.similares(self.recursos['a'].pk), [])
+        self.assertEqual(recomendaciones.calcular(), (1, 3))
+        self.assertFalse(RecursoSimilares.objects.filter(recurso=self.recursos['b']).exists())
+        self.assertEqual(self.vecinos('a'), [])
+
+    def test_para_perfil_descarta_lo_que_ya_conoce(self):
+        recomendaciones.calcular()
+        UltimaVisita.objects.create(perfil=self.perfiles['u3'], recurso=self.recursos['c'])
+        self.assertEqual(recomendaciones.para_perfil(self.perfiles['u3'].pk), [self.recursos['d']])
+        self.perfiles['u3'].recursos_favoritos.add(self.recursos['d'])
+        recomendaciones.invalidar()
+        self.assertEqual(recomendaciones.para_perfil(self.perfiles['u3'].pk), [])
+
+    def test_vistas_muestran_las_recomendaciones(self):
+        call_command('calcular_recomendaciones', stdout=io.StringIO())
+        UltimaVisita.objects.create(perfil=self.perfiles['u1'], recurso=self.recursos['a'])
+        self.client.force_login(self.perfiles['u1'].user)
+        respuesta = self.client.get(reverse('recursos:dashboard'))
+        self.assertContains(respuesta, 'Recomendados para ti')
+        self.assertEqual(respuesta.context['recomendados'], [self.recursos['b']])
+        respuesta = self.client.get(reverse('recursos:resource_detail', args=[self.recursos['a'].pk]))
+        self.assertContains(respuesta, 'Recursos similares')
+        self.assertEqual(respuesta.context['similares'], [self.recursos['b']])
+
+
+class TendenciasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.carrera = Carrera.objects.create(nombre='Software')
+        cls.clasico, cls.nuevo = (
+            Recurso.objects.create(
+                nombre=nombre, descripcion='-', url_externa='https://example.com', tipo='ia',
+                estado=Recurso.ESTADO_APROBADO,
+            )
+            for nombre in ('clasico', 'nuevo')
+        )
+        for recurso in (cls.clasico, cls.nuevo):
+            recurso.carreras.add(cls.carrera)
+        user = User.objects.create_user(username='tendencias', password='x')
+        cls.perfil = Perfil.objects.create(user=user, cedula='7700000001', carrera=cls.carrera)
+        cls.ahora = timezone.now()
+        # El clásico tuvo 10 visitas hace 30 días; el nuevo, 3 hoy
+        HistorialVisitas.objects.bulk_create(
+            [HistorialVisitas(perfil=cls.perfil, recurso=cls.clasico, fecha_visita=cls.ahora - timezone.timedelta(days=30))] * 10
+            + [HistorialVisitas(perfil=cls.perfil, recurso=cls.nuevo, fecha_visita=cls.ahora)] * 3
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def orden(self, sort):
+        return [pk for pk, _ in listados.entradas_listado(self.carrera.pk, 'ia', sort)]
+
+    def test_popularidad_y_tendencia_decaen_a_distinto_ritmo(self):
+        self.assertEqual(tendencias.actualizar(self.ahora), 2)
+        self.clasico.refresh_from_db()
+        # Una vida media de 30 días deja las 10 visitas en 5
+        self.assertAlmostEqual(self.clasico.puntuacion_popularidad, 5.0)
+        self.assertEqual(self.orden('populares'), [self.clasico.pk, self.nuevo.pk])
+        self.assertEqual(self.orden('tendencia'), [self.nuevo.pk, self.clasico.pk])
+
+    def test_solo_se_suman_los_eventos_nuevos(self):
+        tendencias.actualizar(self.ahora)
+        self.assertEqual(tendencias.actualizar(self.ahora), 0)
+        self.assertEqual(PuntoControlTendencias.objects.get().ultima_visita_id, HistorialVisitas.objects.latest('pk').pk)
+
+        self.perfil.recursos_favoritos.add(self.clasico)
+        Valoracion.objects.create(recurso=self.clasico, user=self.perfil.user, puntuacion=5, comentario='-')
+        # Una consulta por tipo de evento y una escritura para todos los recursos cambiados
+        with self.assertNumQueries(11):
+            self.assertEqual(tendencias.actualizar(self.ahora), 1)
+        self.clasico.refresh_from_db()
+        self.assertEqual(self.clasico.favoritos_contados, 1)
+        self.assertAlmostEqual(
+            self.clasico.puntuacion_tendencia,
+            10 * 0.5 ** 10 + tendencias.PESO_FAVORITO + tendencias.PESO_VALORACION,
+        )
+        # Las puntuaciones nuevas invalidan los listados cacheados
+        self.assertEqual(self.orden('tendencia'), [self.clasico.pk, self.nuevo.pk])
+
+        self.perfil.recursos_favoritos.remove(self.clasico)
+        tendencias.actualizar(self.ahora)
+        self.clasico.refresh_from_db()
+        self.assertEqual(self.clasico.favoritos_contados, 0)
+        self.assertAlmostEqual(self.clasico.puntuacion_tendencia, 10 * 0.5 ** 10 + tendencias.PESO_VALORACION)
+
+    def test_visita_confirmada_tarde_con_id_menor_se_suma(self):
+        tendencias.actualizar(self.ahora)
+        marca = PuntoControlTendencias.objects.get().ultima_visita_id
+        # La transacción con el ID marca + 1 aún no se ha confirmado; la de marca + 2 sí
+        HistorialVisitas.objects.create(pk=marca + 2, perfil=self.perfil, recurso=self.nuevo, fecha_visita=self.ahora)
+        self.assertEqual(tendencias.actualizar(self.ahora), 1)
+        control = PuntoControlTendencias.objects.get()
+        self.assertEqual((control.ultima_visita_id, list(control.huecos_visitas)), (marca + 2, [str(marca + 1)]))
+
+        HistorialVisitas.objects.create(pk=marca + 1, perfil=self.perfil, recurso=self.clasico, fecha_visita=self.ahora)
+        self.assertEqual(tendencias.actualizar(self.ahora), 1)
+        self.clasico.refresh_from_db()
+        self.assertAlmostEqual(self.clasico.puntuacion_tendencia, 10 * 0.5 ** 10 + tendencias.PESO_VISITA)
+        self.assertEqual(PuntoControlTendencias.objects.get().huecos_visitas, {})
+
+    def test_los_huecos_que_no_se_llenan_caducan(self):
+        tendencias.actualizar(self.ahora)
+        marca = PuntoControlTendencias.objects.get().ultima_visita_id
+        HistorialVisitas.objects.create(pk=marca + 2, perfil=self.perfil, recurso=self.nuevo, fecha_visita=self.ahora)
+        tendencias.actualizar(self.ahora)
+        # Un rollback: el ID marca + 1 no aparecerá nunca
+        tendencias.actualizar(self.ahora + tendencias.VENTANA_HUECOS + timezone.timedelta(seconds=1))
+        self.assertEqual(PuntoControlTendencias.objects.get().huecos_visitas, {})
+
+    def test_reescalado_conserva_el_orden(self):
+        tendencias.actualizar(self.ahora)
+        lejos = self.ahora + timezone.timedelta(days=3 * tendencias.LIMITE_EXPONENTE)
+        HistorialVisitas.objects.create(perfil=self.perfil, recurso=self.clasico, fecha_visita=lejos)
+        tendencias.actualizar(lejos)
+        self.assertEqual(PuntoControlTendencias.objects.get().fecha_base, lejos)
+        self.clasico.refresh_from_db()
+        self.assertAlmostEqual(self.clasico.puntuacion_tendencia, tendencias.PESO_VISITA)
+        self.assertAlmostEqual(self.clasico.puntuacion_popularidad, 5.0 * 0.5 ** (3 * tendencias.LIMITE_EXPONENTE / 30) + 1.0)
+
+    def test_listado_ordenado_por_tendencia(self):
+        call_command('actualizar_tendencias', stdout=io.StringIO())
+        self.client.force_login(self.perfil.user)
+        respuesta = self.client.get(
+            reverse('recursos:resource_list_by_type', args=[self.carrera.pk, 'ia']), {'sort': 'tendencia'}
+        )
+        self.assertEqual([recurso.pk for recurso in respuesta.context['recursos']], [self.nuevo.pk, self.clasico.pk])
+        self.assertContains(respuesta, '<option value="tendencia" selected>')
+
+
+@con_cache_compartida
+class FavoritosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recursos = Recurso.objects.bulk_create([
+            Recurso(nombre=f'Favorito {i}', descripcion='-', url_externa='https://example.com', estado=Recurso.ESTADO_APROBADO)
+            for i in range(300)
+        ])
+        cls.nuevo = Perfil.objects.create(user=User.objects.create_user(username='nuevo', password='x'), cedula='8800000001')
+        cls.experto = Perfil.objects.create(user=User.objects.create_user(username='experto', password='x'), cedula='8800000002')
+        cls.experto.recursos_favoritos.add(*cls.recursos[1:])
+
+    def setUp(self):
+        cache.clear()
+
+    def alternar(self, perfil, recurso_id, **datos):
+        self.client.force_login(perfil.user)
+        return self.client.post(
+            reverse('recursos:toggle_favorite_resource', args=[recurso_id]),
+            json.dumps(datos), content_type='application/json',
+        )
+
+    def test_alternar_no_depende_del_numero_de_favoritos(self):
+        consultas = {}
+        for perfil in (self.nuevo, self.experto):
+            self.alternar(perfil, self.recursos[0].pk)  # calienta la caché del perfil
+            self.alternar(perfil, self.recursos[0].pk)
+            with CaptureQueriesContext(connection) as capturadas:
+                respuesta = self.alternar(perfil, self.recursos[0].pk)
+            self.assertTrue(respuesta.json()['is_favorited'])
+            consultas[perfil.user.username] = len(capturadas)
+        self.assertEqual(consultas['nuevo'], consultas['experto'])
+        self.assertEqual(self.experto.recursos_favoritos.count(), 300)
+
+    def test_fijar_el_estado_es_idempotente(self):
+        recurso = self.recursos[5]
+        for _ in range(2):
+            self.assertTrue(self.alternar(self.nuevo, recurso.pk, favorito=True).json()['is_favorited'])
+        self.assertEqual(list(self.nuevo.recursos_favoritos.all()), [recurso])
+        for _ in range(2):
+            self.assertFalse(self.alternar(self.nuevo, recurso.pk, favorito=False).json()['is_favorited'])
+        self.assertFalse(self.nuevo.recursos_favoritos.exists())
+        self.assertEqual(self.alternar(self.nuevo, recurso.pk, favorito='si').status_code, 400)
+        self.assertEqual(self.alternar(self.nuevo, 999999).status_code, 404)
+
+    def test_estado_de_varios_recursos_en_una_consulta(self):
+        self.client.force_login(self.experto.user)
+        url = reverse('recursos:estado_favoritos')
+        ids = ','.join(str(recurso.pk) for recurso in self.recursos[:3])
+        self.client.get(url, {'ids': ids})
+        # Solo la del usuario de la sesión y la de los favoritos
+        with self.assertNumQueries(2):
+            respuesta = self.client.get(url, {'ids': ids})
+        self.assertEqual(respuesta.json()['favoritos'], {
+            str(self.recursos[0].pk): False, str(self.recursos[1].pk): True, str(self.recursos[2].pk): True,
+        })
+        self.assertEqual(self.client.get(url, {'ids': 'a,b'}).status_code, 400)
+        demasiados = ','.join(str(recurso.pk) for recurso in self.recursos[:101])
+        self.assertEqual(self.client.get(url, {'ids': demasiados}).status_code, 400)
+
+
+@con_cache_compartida
+class GetCondicionalTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.carrera = Carrera.objects.create(nombre='Software')
+        cls.recurso = Recurso.objects.create(
+            nombre='Recurso', descripcion='-', url_externa='https://example.com', tipo='ia',
+            estado=Recurso.ESTADO_APROBADO,
+        )
+        cls.recurso.carreras.add(cls.carrera)
+        cls.user = User.objects.create_user(username='condicional', password='x')
+        cls.perfil = Perfil.objects.create(user=cls.user, cedula='9900000001', carrera=cls.carrera)
+        cls.mision = Mision.objects.create(key='visitar_recurso', nombre='Visitar', descripcion='-')
+        cls.urls = {
+            'career_list': reverse('recursos:career_list'),
+            'resource_list': reverse('recursos:resource_list_by_type', args=[cls.carrera.pk, 'ia']),
+            'resource_detail': reverse('recursos:resource_detail', args=[cls.recurso.pk]),
+        }
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def revalidar(self, url):
+        """Pide la página y luego la revalida con su ETag; devuelve la segunda respuesta."""
+        etag = self.client.get(url)['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_paginas_sin_cambios_responden_304_sin_consultas_principales(self):
+        # Solo la del usuario de la sesión; el detalle añade la del ETag
+        for vista, consultas in (('career_list', 1), ('resource_list', 1), ('resource_detail', 2)):
+            with self.subTest(vista=vista):
+                etag = self.client.get(self.urls[vista])['ETag']
+                with self.assertNumQueries(consultas):
+                    respuesta = self.client.get(self.urls[vista], HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(respuesta.status_code, 304)
+                self.assertEqual(respuesta['ETag'], etag)
+                self.assertIn('no-cache', respuesta['Cache-Control'])
+                self.assertIn('private', respuesta['Cache-Control'])
+
+    def test_cambios_de_contenido_invalidan(self):
+        etags = {vista: self.client.get(url)['ETag'] for vista, url in self.urls.items()}
+        Valoracion.objects.create(recurso=self.recurso, user=self.user, puntuacion=5, comentario='-')
+        Carrera.objects.create(nombre='Agronomía')
+        for vista, url in self.urls.items():
+            with self.subTest(vista=vista):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[vista]).status_code, 200)
+
+    def test_favoritos_y_otros_usuarios_invalidan(self):
+        etag = self.client.get(self.urls['resource_list'])['ETag']
+        self.client.post(reverse('recursos:toggle_favorite_resource', args=[self.recurso.pk]))
+        self.assertEqual(self.client.get(self.urls['resource_list'], HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(self.urls['resource_list'])['ETag']
+        self.perfil.recursos_favoritos.remove(self.recurso)
+        self.assertEqual(self.client.get(self.urls['resource_list'], HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        otro = User.objects.create_user(username='otro', password='x')
+        self.client.force_login(otro)
+        self.assertEqual(self.client.get(self.urls['career_list'], HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_last_modified_en_el_detalle(self):
+        respuesta = self.client.get(self.urls['resource_detail'])
+        self.assertEqual(
+            self.client.get(self.urls['resource_detail'], HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified']).status_code,
+            304,
+        )
+
+    def test_la_mision_de_visita_cuenta_aunque_la_respuesta_sea_304(self):
+        self.client.get(self.urls['resource_detail'])
+        # Al día siguiente (misión pendiente y sin la marca del día en caché),
+        # el navegador revalida la página que ya tenía
+        MisionDiariaUsuario.objects.update(completada=False)
+        cache.delete(views.CLAVE_MISION_VISITA.format(perfil_id=self.perfil.pk, fecha=timezone.localdate().isoformat()))
+        self.assertEqual(self.revalidar(self.urls['resource_detail']).status_code, 304)
+        self.assertTrue(MisionDiariaUsuario.objects.get().completada)
+
+    def test_con_mensajes_pendientes_se_renderiza(self):
+        etag = self.client.get(self.urls['career_list'])['ETag']
+        # Un mensaje pendiente en la cookie, como lo deja messages.success()
+        almacen = CookieStorage(RequestFactory().get('/'))
+        almacen.add(message_constants.INFO, 'Aviso')
+        respuesta = HttpResponse()
+        almacen.update(respuesta)
+        self.client.cookies[almacen.cookie_name] = respuesta.cookies[almacen.cookie_name].value
+        self.assertEqual(self.client.get(self.urls['career_list'], HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_recurso_inexistente_responde_404(self):
+        self.assertEqual(self.client.get(reverse('recursos:resource_detail', args=[999999])).status_code, 404)
+
+    @override_settings(CACHE_COMPARTIDA=False, CACHE_LOCAL_TIMEOUT=1)
+    def test_con_cache_por_proceso_las_versiones_caducan(self):
+        # Otro worker no ve las invalidaciones de este: sus versiones no pueden durar para siempre
+        anteriores = condicional.version_global(), condicional.version_usuario(self.user.pk)
+        self.assertEqual((condicional.version_global(), condicional.version_usuario(self.user.pk)), anteriores)
+        time.sleep(1.1)
+        self.assertNotEqual(condicional.version_global(), anteriores[0])
+        self.assertNotEqual(condicional.version_usuario(self.user.pk), anteriores[1])
+
+
+@con_cache_compartida
+class PaginacionCursorTests(TestCase):
+    """"Cargar más" por cursor en el listado de recursos y en favoritos (ver paginacion.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.carrera = Carrera.objects.create(nombre='Software')
+        cls.recursos = Recurso.objects.bulk_create([
+            Recurso(nombre=f'Paginado {i}', descripcion='-', url_externa='https://example.com', tipo='ia', estado=Recurso.ESTADO_APROBADO)
+            for i in range(22)
+        ])
+        cls.carrera.recursos.add(*cls.recursos)
+        # Grupos con la misma fecha: el id desempata el cursor
+        base = timezone.now()
+        for i, recurso in enumerate(cls.recursos):
+            Recurso.objects.filter(pk=recurso.pk).update(fecha_creacion=base - timezone.timedelta(minutes=i // 4))
+        cls.orden = list(Recurso.objects.order_by('-fecha_creacion', '-id').values_list('pk', flat=True))
+        cls.user = User.objects.create_user(username='paginador', password='x')
+        cls.perfil = Perfil.objects.create(user=cls.user, cedula='8950000001', carrera=cls.carrera)
+        cls.perfil.recursos_favoritos.add(*cls.recursos)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def recorrer(self, url, nombre_contexto):
+        respuesta = self.client.get(url)
+        vistos = [recurso.pk for recurso in respuesta.context[nombre_contexto]]
+        paginas = 1
+        while url := respuesta.context['url_cargar_mas']:
+            self.assertIn('fragmento=1', url)
+            respuesta = self.client.get(url)
+            # El fragmento trae solo las tarjetas y la URL siguiente, sin la página completa
+            self.assertNotContains(respuesta, '<html')
+            siguiente = respuesta.context['url_cargar_mas']
+            if siguiente:
+                self.assertContains(respuesta, f'data-siguiente-url="{escape(siguiente)}"')
+            vistos += [recurso.pk for recurso in respuesta.context[nombre_contexto]]
+            paginas += 1
+        return vistos, paginas
+
+    def test_listado_de_recursos_sin_repetir_ni_saltar(self):
+        url = reverse('recursos:resource_list_by_type', args=[self.carrera.pk, 'ia'])
+        vistos, paginas = self.recorrer(url, 'recursos')
+        self.assertEqual(vistos, self.orden)
+        self.assertEqual(paginas, 3)
+
+    def test_cada_pagina_es_una_consulta_keyset_acotada(self):
+        url = reverse('recursos:resource_list_by_type', args=[self.carrera.pk, 'ia'])
+        self.client.force_login(User.objects.create_user(username='sin_perfil', password='x'))
+        siguiente = self.client.get(url).context['url_cargar_mas']
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(siguiente)
+        listado = [c['sql'] for c in consultas.captured_queries if 'recursos_recurso_carreras' in c['sql']]
+        self.assertEqual(len(listado), 1)
+        self.assertIn('LIMIT 10', listado[0])
+        self.assertNotIn('OFFSET', listado[0])
+        # La caché guarda la página, no el listado entero
+        self.assertEqual(len(listados.entradas_listado(self.carrera.pk, 'ia', 'recientes', limite=10)), 10)
+
+    def test_favoritos_primero_y_luego_el_resto(self):
+        user = User.objects.create_user(username='con_favoritos', password='x')
+        perfil = Perfil.objects.create(user=user, cedula='8950000002', carrera=self.carrera)
+        favoritos = [self.orden[i] for i in (3, 10, 21)]
+        perfil.recursos_favoritos.add(*favoritos)
+        self.client.force_login(user)
+        esperado = favoritos + [pk for pk in self.orden if pk not in favoritos]
+        url = reverse('recursos:resource_list_by_type', args=[self.carrera.pk, 'ia'])
+        vistos, paginas = self.recorrer(url, 'recursos')
+        self.assertEqual(vistos, esperado)
+        self.assertEqual(paginas, 3)
+        respuesta = self.client.get(url)
+        self.assertEqual([r.is_favorite for r in respuesta.context['recursos']], [True] * 3 + [False] * 6)
+        # La paginación clásica sigue el mismo orden
+        respuesta = self.client.get(url, {'page': 2})
+        self.assertEqual([r.pk for r in respuesta.context['recursos']], esperado[9:18])
+
+    def test_favoritos_sin_repetir_ni_saltar(self):
+        vistos, paginas = self.recorrer(reverse('recursos:favorite_resources_list'), 'recursos_favoritos')
+        self.assertEqual(vistos, self.orden)
+        self.assertEqual(paginas, 3)
+
+    def test_favoritos_sin_offset_ni_count(self):
+        url = reverse('recursos:favorite_resources_list')
+        siguiente = self.client.get(url).context['url_cargar_mas']
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(siguiente)
+        sql = [consulta['sql'] for consulta in consultas.captured_queries]
+        self.assertFalse([c for c in sql if 'COUNT(' in c or 'OFFSET' in c])
+
+    def test_cursor_manipulado_o_invalido_empieza_desde_el_principio(self):
+        for nombre_url, args, nombre_contexto in (
+            ('recursos:resource_list_by_type', [self.carrera.pk, 'ia'], 'recursos'),
+            ('recursos:favorite_resources_list', [], 'recursos_favoritos'),
+        ):
+            url = reverse(nombre_url, args=args)
+            for cursor in ('no-firmado', paginacion.codificar_cursor(['x', 'y']), paginacion.codificar_cursor([1])):
+                with self.subTest(url=url, cursor=cursor):
+                    respuesta = self.client.get(url, {'cursor': cursor, 'fragmento': '1'})
+                    self.assertEqual(respuesta.status_code, 200)
+                    self.assertEqual([r.pk for r in respuesta.context[nombre_contexto]], self.orden[:9])
+
+    def test_page_usa_la_paginacion_clasica(self):
+        respuesta = self.client.get(reverse('recursos:favorite_resources_list'), {'page': 2})
+        self.assertEqual([r.pk for r in respuesta.context['recursos_favoritos']], self.orden[9:18])
+        self.assertIsNone(respuesta.context['url_cargar_mas'])
+
+
+@con_cache_compartida
+class ValoracionesPaginadasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recurso = Recurso.objects.create(
+            nombre='Popular', descripcion='-', url_externa='https://example.com', estado=Recurso.ESTADO_APROBADO
+        )
+        cls.lector = User.objects.create_user(username='lector', password='x')
+        Perfil.objects.create(user=cls.lector, cedula='8900000001')
+        autores = [User.objects.create_user(username=f'autor{i}', first_name=f'Autor{i}', password='x') for i in range(25)]
+        Valoracion.objects.bulk_create([
+            Valoracion(recurso=cls.recurso, user=user, puntuacion=1 + i % 5, comentario=f'Comentario {i}')
+            for i, user in enumerate(autores + [cls.lector])
+        ])
+        # Varias valoraciones con la misma fecha: el id desempata el cursor
+        base = timezone.now()
+        for i, valoracion in enumerate(Valoracion.objects.order_by('id')):
+            Valoracion.objects.filter(pk=valoracion.pk).update(fecha_creacion=base - timezone.timedelta(minutes=i // 4))
+        cls.orden = list(Valoracion.objects.order_by('-fecha_creacion', '-id').values_list('pk', flat=True))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.lector)
+
+    def test_el_detalle_solo_trae_la_primera_pagina(self):
+        respuesta = self.client.get(reverse('recursos:resource_detail', args=[self.recurso.pk]))
+        self.assertEqual([v.pk for v in respuesta.context['valoraciones']], self.orden[:10])
+        self.assertContains(respuesta, 'id="load-more-comments-button"')
+        # El mismo script de "Cargar más" que los listados (_cargar_mas.html)
+        self.assertContains(respuesta, 'function activarCargarMas(', count=1)
+        # Su valoración es de las más antiguas, pero el formulario ya no se ofrece
+        self.assertTrue(respuesta.context['user_has_commented'])
+
+    def test_el_cursor_recorre_todas_sin_repetir(self):
+        url = self.client.get(reverse('recursos:resource_detail', args=[self.recurso.pk])).context['url_mas_valoraciones']
+        vistas = self.orden[:10]
+        while url:
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.client.get(url)
+            # Usuario de la sesión y una página de valoraciones con sus autores
+            self.assertEqual(len(consultas), 2)
+            vistas += [v.pk for v in respuesta.context['valoraciones']]
+            url = respuesta.context.get('url_cargar_mas')
+        self.assertEqual(vistas, self.orden)
+        # La más antigua es la del lector, que no tiene nombre
+        self.assertContains(respuesta, '<strong>lector</strong>', html=False)
+
+    def test_cursor_manipulado_empieza_desde_el_principio(self):
+        url = reverse('recursos:valoraciones_recurso', args=[self.recurso.pk])
+        respuesta = self.client.get(url, {'cursor': 'no-firmado'})
+        self.assertEqual([v.pk for v in respuesta.context['valoraciones']], self.orden[:10])
+
+
+@con_cache_compartida
+@override_settings(VISITAS_BUFFER_TAMANO=3, VISITAS_BUFFER_INTERVALO=30)
+class BufferVisitasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='visitante', password='x')
+        cls.perfil = Perfil.objects.create(user=cls.user, cedula='9100000001')
+        cls.recursos = [
+            Recurso.objects.create(nombre=f'Visitado {i}', descripcion='-', url_externa='https://example.com')
+            for i in range(3)
+        ]
+        Mision.objects.create(key='visitar_recurso', nombre='Visitar', descripcion='-', puntos_recompensa=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_se_vuelca_al_llenarse(self):
+        visitas.registrar_visita(self.perfil.pk, self.recursos[0].pk)
+        visitas.registrar_visita(self.perfil.pk, self.recursos[1].pk)
+        self.assertFalse(HistorialVisitas.objects.exists())
+        visitas.registrar_visita(self.perfil.pk, self.recursos[0].pk)
+        self.assertEqual(HistorialVisitas.objects.count(), 3)
+        self.assertEqual(UltimaVisita.objects.count(), 2)
+        self.assertIsNone(cache.get(visitas.CLAVE_BUFFER))
+
+    def test_se_vuelca_cuando_el_buffer_es_antiguo(self):
+        visitas.registrar_visita(self.perfil.pk, self.recursos[0].pk)
+        buffer = cache.get(visitas.CLAVE_BUFFER)
+        buffer['desde'] -= 31
+        cache.set(visitas.CLAVE_BUFFER, buffer, None)
+        visitas.registrar_visita(self.perfil.pk, self.recursos[1].pk)
+        self.assertEqual(HistorialVisitas.objects.count(), 2)
+
+    def test_el_comando_vacia_lo_pendiente(self):
+        visitas.registrar_visita(self.perfil.pk, self.recursos[0].pk)
+        visitas.registrar_visita(self.perfil.pk, self.recursos[1].pk)
+        salida = io.StringIO()
+        call_command('vaciar_visitas', stdout=salida)
+        self.assertIn('2 visita(s)', salida.getvalue())
+        self.assertEqual(HistorialVisitas.objects.count(), 2)
+        self.assertEqual(visitas.vaciar_buffer(), 0)
+
+    def test_descarta_recursos_borrados_mientras_esperaban(self):
+        borrado = Recurso.objects.create(nombre='Borrado', descripcion='-', url_externa='https://example.com')
+        visitas.registrar_visita(self.perfil.pk, borrado.pk)
+        visitas.registrar_visita(self.perfil.pk, self.recursos[0].pk)
+        borrado.delete()
+        self.assertEqual(visitas.vaciar_buffer(), 1)
+
+    def test_un_evento_atrasado_no_retrasa_la_ultima_visita(self):
+        ahora = timezone.now()
+        recurso = self.recursos[0].pk
+        visitas.registrar_visitas(self.perfil.pk, [(recurso, ahora)])
+        visitas.vaciar_buffer()
+        # Un buffer volcado más tarde con una visita anterior
+        visitas.registrar_visitas(self.perfil.pk, [(recurso, ahora - timezone.timedelta(minutes=5))])
+        visitas.vaciar_buffer()
+        self.assertEqual(UltimaVisita.objects.get(perfil=self.perfil, recurso_id=recurso).fecha_visita, ahora)
+        self.assertEqual(HistorialVisitas.objects.count(), 2)
+        # Una visita posterior sí la avanza
+        despues = ahora + timezone.timedelta(seconds=1)
+        visitas.registrar_visitas(self.perfil.pk, [(recurso, despues)])
+        visitas.vaciar_buffer()
+        self.assertEqual(UltimaVisita.objects.get(perfil=self.perfil, recurso_id=recurso).fecha_visita, despues)
+        self.assertEqual(UltimaVisita.objects.count(), 1)
+
+    @override_settings(CACHE_COMPARTIDA=False)
+    def test_sin_cache_compartida_se_inserta_al_momento(self):
+        visitas.registrar_visita(self.perfil.pk, self.recursos[0].pk)
+        self.assertEqual(HistorialVisitas.objects.count(), 1)
+        self.assertIsNone(cache.get(visitas.CLAVE_BUFFER))
+
+    @override_settings(CACHE_COMPARTIDA=False, VISITAS_ANTIGUEDAD_MAXIMA=600)
+    def test_el_lote_no_acepta_fechas_antiguas_ni_futuras(self):
+        self.client.force_login(self.user)
+        ahora = timezone.now()
+        respuesta = self.client.post(reverse('recursos:marcar_visitas_lote'), json.dumps({'visitas': [
+            {'recurso': self.recursos[0].pk, 'fecha': '2020-01-01T00:00:00+00:00'},
+            {'recurso': self.recursos[1].pk, 'fecha': (ahora + timezone.timedelta(days=1)).isoformat()},
+            {'recurso': 999999},
+        ]}), content_type='application/json')
+        self.assertEqual(respuesta.json()['registradas'], 2)
+        fechas = dict(HistorialVisitas.objects.values_list('recurso_id', 'fecha_visita'))
+        self.assertAlmostEqual(fechas[self.recursos[0].pk], ahora - timezone.timedelta(seconds=600), delta=timezone.timedelta(seconds=5))
+        self.assertAlmostEqual(fechas[self.recursos[1].pk], ahora, delta=timezone.timedelta(seconds=5))
+
+    def test_visita_a_un_recurso_inexistente_no_completa_la_mision(self):
+        self.client.force_login(self.user)
+        MisionDiariaUsuario.objects.filter(perfil=self.perfil).update(completada=False)
+        respuesta = self.client.post(reverse('recursos:marcar_visita_recurso', args=[999999]))
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertFalse(MisionDiariaUsuario.objects.filter(perfil=self.perfil, completada=True).exists())
+        self.assertIsNone(cache.get(visitas.CLAVE_BUFFER))
+
+
+@con_cache_compartida
+class RolesCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.docente = Group.objects.create(name='Docente')
+        cls.gestor = Group.objects.create(name='Gestor de Contenido')
+        cls.user = User.objects.create_user(username='rol', password='x')
+        cls.user.groups.add(cls.docente, cls.gestor)
+
+    def setUp(self):
+        cache.clear()
+
+    def grupos(self):
+        # Un objeto nuevo, como en la siguiente petición
+        return roles.grupos_de(User.objects.get(pk=self.user.pk))
+
+    def test_con_la_cache_caliente_no_hay_consultas(self):
+        self.assertEqual(self.grupos(), {'Docente', 'Gestor de Contenido'})
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(roles.en_grupo(user, 'Docente'))
+            self.assertTrue(roles.en_alguno(user, ['Gestor de Contenido']))
+
+    def test_quitar_un_grupo_invalida(self):
+        self.grupos()
+        self.user.groups.remove(self.docente)
+        self.assertEqual(self.grupos(), {'Gestor de Contenido'})
+
+    def test_vaciar_los_grupos_desde_el_grupo_invalida(self):
+        self.grupos()
+        self.gestor.user_set.clear()
+        self.assertEqual(self.grupos(), {'Docente'})
+
+    def test_borrar_un_grupo_invalida(self):
+        self.grupos()
+        self.docente.delete()
+        self.assertEqual(self.grupos(), {'Gestor de Contenido'})
+
+    def test_cambiar_permisos_de_un_grupo_invalida_las_paginas(self):
+        self.grupos()
+        version = condicional.version_global()
+        self.docente.permissions.add(Permission.objects.get(codename='add_recurso'))
+        self.assertNotEqual(condicional.version_global(), version)
+        self.assertEqual(self.grupos(), {'Docente', 'Gestor de Contenido'})
+        self.assertTrue(User.objects.get(pk=self.user.pk).has_perm('recursos.add_recurso'))
+
+    @override_settings(CACHE_COMPARTIDA=False, CACHE_LOCAL_TIMEOUT=1)
+    def test_con_cache_por_proceso_un_rol_retirado_en_otro_worker_caduca(self):
+        self.grupos()
+        # Sin señales, como si el cambio lo hubiera atendido otro worker
+        User.groups.through.objects.filter(user=self.user, group=self.gestor).delete()
+        self.assertIn('Gestor de Contenido', self.grupos())
+        time.sleep(1.1)
+        self.assertEqual(self.grupos(), {'Docente'})
+
+
+@con_cache_compartida
+class InvalidacionListadosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.software, cls.redes = Carrera.objects.create(nombre='Software'), Carrera.objects.create(nombre='Redes')
+        cls.recurso = Recurso.objects.create(
+            nombre='Listado', descripcion='-', url_externa='https://example.com', tipo='ia', estado=Recurso.ESTADO_APROBADO,
+        )
+        cls.recurso.carreras.add(cls.software)
+        cls.user = User.objects.create_user(username='listado', password='x')
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, carrera, sort_by='recientes'):
+        return [pk for pk, _ in listados.entradas_listado(carrera.pk, 'ia', sort_by)]
+
+    def test_agregar_y_quitar_carreras(self):
+        self.assertEqual(self.ids(self.redes), [])
+        self.recurso.carreras.add(self.redes)
+        self.assertEqual(self.ids(self.redes), [self.recurso.pk])
+        self.recurso.carreras.remove(self.software)
+        self.assertEqual(self.ids(self.software), [])
+
+    def test_cambios_desde_la_carrera(self):
+        self.assertEqual(self.ids(self.redes), [])
+        self.redes.recursos.add(self.recurso)
+        self.assertEqual(self.ids(self.redes), [self.recurso.pk])
+        self.software.recursos.clear()
+        self.assertEqual(self.ids(self.software), [])
+
+    def test_vaciar_las_carreras_del_recurso(self):
+        self.assertEqual(self.ids(self.software), [self.recurso.pk])
+        self.recurso.carreras.clear()
+        self.assertEqual(self.ids(self.software), [])
+
+    def test_cambio_de_estado(self):
+        self.assertEqual(self.ids(self.software), [self.recurso.pk])
+        self.recurso.estado = Recurso.ESTADO_RECHAZADO
+        self.recurso.save()
+        self.assertEqual(self.ids(self.software), [])
+        self.recurso.estado = Recurso.ESTADO_APROBADO
+        self.recurso.save()
+        self.assertEqual(self.ids(self.software), [self.recurso.pk])
+
+    def test_borrar_el_recurso(self):
+        self.assertEqual(self.ids(self.software), [self.recurso.pk])
+        self.recurso.delete()
+        self.assertEqual(self.ids(self.software), [])
+
+    def test_valoraciones_reordenan_los_mejor_valorados(self):
+        otro = Recurso.objects.create(
+            nombre='Otro', descripcion='-', url_externa='https://example.com', tipo='ia', estado=Recurso.ESTADO_APROBADO,
+        )
+        otro.carreras.add(self.software)
+        antes = self.ids(self.software, 'valorados')
+        version = listados.version_carrera(self.software.pk)
+        valoracion = Valoracion.objects.create(recurso_id=antes[-1], user=self.user, puntuacion=5, comentario='-')
+        self.assertNotEqual(listados.version_carrera(self.software.pk), version)
+        self.assertEqual(self.ids(self.software, 'valorados')[0], antes[-1])
+        version = listados.version_carrera(self.software.pk)
+        valoracion.delete()
+        self.assertNotEqual(listados.version_carrera(self.software.pk), version)
+        self.assertEqual(self.ids(self.software, 'valorados'), antes)
+
+    @override_settings(CACHE_COMPARTIDA=False, CACHE_LOCAL_TIMEOUT=1)
+    def test_con_cache_por_proceso_los_cambios_de_otro_worker_caducan(self):
+        self.assertEqual(self.ids(self.software), [self.recurso.pk])
+        # Sin señales, como si el cambio lo hubiera atendido otro worker
+        Recurso.objects.filter(pk=self.recurso.pk).update(estado=Recurso.ESTADO_RECHAZADO)
+        self.assertEqual(self.ids(self.software), [self.recurso.pk])
+        time.sleep(1.1)
+        self.assertEqual(self.ids(self.software), [])
+
+
+@skipUnless(connection.vendor == 'sqlite', "Índice FTS5 de SQLite")
+class BusquedaFts5Tests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.software, cls.redes = Carrera.objects.create(nombre='Software'), Carrera.objects.create(nombre='Redes')
+
+    def setUp(self):
+        cache.clear()
+
+    def crear(self, nombre, descripcion='-', carrera=None, tipo='ia', estado=Recurso.ESTADO_APROBADO):
+        recurso = Recurso.objects.create(
+            nombre=nombre, descripcion=descripcion, url_externa='https://example.com', tipo=tipo, estado=estado,
+        )
+        recurso.carreras.add(carrera or self.software)
+        return recurso
+
+    def test_ignora_tildes_y_mayusculas(self):
+        recurso = self.crear('Programación Lógica')
+        for texto in ('programacion logica', 'LÓGICA', 'progr'):
+            with self.subTest(texto=texto):
+                self.assertEqual(busqueda.buscar_ids(texto), [recurso.pk])
+
+    def test_ordena_por_relevancia(self):
+        de_paso = self.crear('Introducción', 'Un curso largo de muchas cosas distintas que al final menciona python')
+        central = self.crear('Python', 'Python desde cero: python avanzado')
+        self.assertEqual(busqueda.buscar_ids('python'), [central.pk, de_paso.pk])
+
+    def test_el_indice_sigue_a_los_cambios(self):
+        recurso = self.crear('Redes neuronales')
+        self.assertEqual(busqueda.buscar_ids('neuronales'), [recurso.pk])
+        recurso.nombre = 'Bases de datos'
+        recurso.save()
+        self.assertEqual(busqueda.buscar_ids('neuronales'), [])
+        self.assertEqual(busqueda.buscar_ids('datos'), [recurso.pk])
+        recurso.delete()
+        self.assertEqual(busqueda.buscar_ids('datos'), [])
+
+    def test_los_filtros_se_aplican_antes_del_limite(self):
+        # Los resultados más relevantes del catálogo son de otra carrera
+        for i in range(3):
+            self.crear(f'Python python python {i}', carrera=self.redes)
+        propio = self.crear('Curso extenso de bases de datos con algo de python', carrera=self.software)
+        self.crear('Python pendiente', carrera=self.software, estado=Recurso.ESTADO_PENDIENTE)
+        self.crear('Python web', carrera=self.software, tipo='web')
+        with mock.patch.object(busqueda, 'MAX_RESULTADOS', 2):
+            self.assertEqual(
+                busqueda.buscar_ids('python', carrera_id=self.software.pk, tipo='ia', estado=Recurso.ESTADO_APROBADO),
+                [propio.pk],
+            )
+            self.assertEqual([pk for pk, _ in listados.entradas_listado(self.software.pk, 'ia', 'recientes', 'python')], [propio.pk])
+
+
+class UltimaVisitaTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reciente', password='x')
+        cls.perfil = Perfil.objects.create(user=cls.user, cedula='9100000002')
+        cls.recursos = [
+            Recurso.objects.create(nombre=f'Reciente {i}', descripcion='-', url_externa='https://example.com')
+            for i in range(8)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_el_panel_muestra_las_ultimas_visitas_sin_repetir(self):
+        ahora = timezone.now()
+        # Los recursos 0..7 en orden y, al final, otra vez el 2 y el 5
+        eventos = [(recurso.pk, ahora - timezone.timedelta(minutes=20 - i)) for i, recurso in enumerate(self.recursos)]
+        eventos += [(self.recursos[2].pk, ahora - timezone.timedelta(minutes=2)), (self.recursos[5].pk, ahora)]
+        visitas.registrar_visitas(self.perfil.pk, eventos)
+        visitas.vaciar_buffer()
+        self.assertEqual(HistorialVisitas.objects.count(), 10)
+        self.assertEqual(UltimaVisita.objects.count(), 8)
+
+        self.client.force_login(self.user)
+        respuesta = self.client.get(reverse('recursos:dashboard'))
+        self.assertEqual(
+            [visita.recurso_id for visita in respuesta.context['historial_visitas']],
+            [self.recursos[i].pk for i in (5, 2, 7, 6, 4, 3)],
+        )
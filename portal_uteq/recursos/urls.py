@@ -29,15 +29,21 @@ urlpatterns = [
     # URL para la nueva vista de detalle de un recurso
     path('recurso/<int:pk>/', views.ResourceDetailView.as_view(), name='resource_detail'),
 
+    # URL para cargar más valoraciones (paginación por cursor) al hacer scroll
+    path('recurso/<int:pk>/valoraciones/', views.ValoracionesRecursoView.as_view(), name='valoraciones_recurso'),
     # URL para añadir valoraciones (comentarios) vía AJAX
     path('recurso/<int:pk>/valorar/', views.agregar_valoracion_ajax, name='agregar_valoracion_ajax'),
     # URL para añadir/quitar un recurso de favoritos via AJAX
     path('recurso/<int:pk>/toggle_favorite/', views.toggle_favorite_resource, name='toggle_favorite_resource'),
+    # URL para consultar el estado de favorito de varios recursos a la vez
+    path('recursos/favoritos/estado/', views.estado_favoritos_ajax, name='estado_favoritos'),
     # URL para ver la lista de recursos favoritos del usuario
     path('mis-favoritos/', views.FavoriteResourceListView.as_view(), name='favorite_resources_list'),
     # URL para marcar una visita a un recurso (para misiones)
     path('recurso/<int:pk>/marcar-visita/', views.marcar_visita_recurso_ajax, name='marcar_visita_recurso'),
+    # URL para registrar varias visitas en una sola petición
+    path('recursos/marcar-visitas/', views.marcar_visitas_lote_ajax, name='marcar_visitas_lote'),
 
-    # URL TEMPORAL PARA DEPURACION - ¡ELIMINAR DESPUES DE USAR!
-    path('debug-log-view-secret-admin-only-12345/', views.debug_log_view, name='debug_log_view'),
+    # Visor del log para el personal (streaming desde el final del archivo)
+    path('personal/registros/', views.visor_registros, name='visor_registros'),
 ]
\ No newline at end of file
@@ -1,20 +1,28 @@
 from django.views.generic import ListView, TemplateView, CreateView, RedirectView
 from django.contrib.auth.mixins import LoginRequiredMixin, AccessMixin
 from django.urls import reverse_lazy, reverse
-from django.db.models import Count, Avg
-from datetime import date, datetime
-from .models import Carrera, Recurso, Valoracion, Perfil, MisionDiariaUsuario
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Subquery, Value
+from datetime import timedelta
+from .models import Carrera, Recurso, Valoracion, Perfil, MisionDiariaUsuario, UltimaVisita
 from .forms import SugerenciaRecursoForm, ValoracionForm, CustomUserCreationForm
+from . import clasificacion, condicional, correo, listados, misiones, paginacion, recomendaciones, registros, roles, visitas
+from .condicional import GetCondicionalMixin
+from .paginacion import PaginacionCursorMixin
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import FormMixin
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, redirect
-from django.contrib.auth import login
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
+import json
 
 class RegisterView(CreateView):
     form_class = CustomUserCreationForm
@@ -27,30 +35,20 @@ class RegisterView(CreateView):
         return super().dispatch(request, *args, **kwargs)
 
     def form_valid(self, form):
-        user, temporary_password = form.save()
-        self.object = user # Manually set self.object as per CreateView's contract
-        
-        # Enviar correo de bienvenida con la contraseña temporal
-        try:
+        # El correo de bienvenida se guarda en la bandeja de salida en la misma
+        # transacción que el usuario; lo envía el comando enviar_correos
+        with transaction.atomic():
+            user, temporary_password = form.save()
+            self.object = user # Manually set self.object as per CreateView's contract
+
             subject = render_to_string('registration/email_subject.txt').strip()
             body = render_to_string('registration/email_body.txt', {
                 'user': user,
                 'temporary_password': temporary_password
             })
-            
-            send_mail(
-                subject,
-                body,
-                'no-reply@uteq.edu.ec', # Remitente
-                [user.email],         # Destinatario
-                fail_silently=False,
-            )
-            messages.success(self.request, '¡Registro exitoso! Revisa tu correo electrónico para obtener tu contraseña temporal.')
-        except Exception as e:
-            # Opcional: registrar el error y notificar al usuario
-            print(f"Error al enviar correo de bienvenida: {e}")
-            messages.warning(self.request, 'Se creó tu cuenta, pero hubo un error al enviar el correo de bienvenida. Contacta a soporte.')
+            correo.encolar(subject, body, [user.email], remitente='no-reply@uteq.edu.ec')
 
+        messages.success(self.request, '¡Registro exitoso! Revisa tu correo electrónico para obtener tu contraseña temporal.')
         return redirect(self.get_success_url())
 
 class GroupRequiredMixin(AccessMixin):
@@ -61,7 +59,7 @@ class GroupRequiredMixin(AccessMixin):
         if not request.user.is_authenticated:
             return self.handle_no_permission()
         
-        if request.user.is_superuser or request.user.groups.filter(name__in=self.group_names).exists():
+        if request.user.is_superuser or roles.en_alguno(request.user, self.group_names):
             return super().dispatch(request, *args, **kwargs)
             
         return self.handle_no_permission()
@@ -77,25 +75,7 @@ class SugerenciaRecursoCreateView(LoginRequiredMixin, GroupRequiredMixin, Create
         response = super().form_valid(form) # Primero llamamos al form_valid original
 
         # --- Lógica de Gamificación: Completar misión "Sugerir un Recurso" ---
-        from datetime import date, datetime
-        user = self.request.user
-        if hasattr(user, 'perfil'):
-            user_profile = user.perfil
-            today_date = date.today()
-
-            sugerir_mision_user = MisionDiariaUsuario.objects.filter(
-                perfil=user_profile,
-                fecha_asignacion=today_date,
-                mision__key='sugerir_recurso',
-                completada=False
-            ).first()
-
-            if sugerir_mision_user:
-                sugerir_mision_user.completada = True
-                sugerir_mision_user.fecha_completado = datetime.now()
-                sugerir_mision_user.save()
-                user_profile.puntos += sugerir_mision_user.mision.puntos_recompensa
-                user_profile.save()
+        misiones.completar_mision(visitas.perfil_id_de(self.request.user), 'sugerir_recurso')
         # --- Fin Lógica de Gamificación ---
 
         return response
@@ -120,40 +100,39 @@ class DashboardView(LoginRequiredMixin, TemplateView):
 
         # Añadir datos de gamificación para todos los usuarios autenticados
         if user.is_authenticated and hasattr(user, 'perfil'):
-            from .models import HistorialVisitas
             context['user_puntos'] = user.perfil.puntos
             context['user_racha'] = user.perfil.racha_actual
+
+            # Clasificación precalculada en memoria (ver clasificacion.py)
+            perfil = user.perfil
+            context['clasificacion_global'] = clasificacion.top(5)
+            context['mi_posicion'], context['total_clasificados'] = clasificacion.posicion(perfil.pk, perfil.puntos)
+            if perfil.carrera_id:
+                context['clasificacion_carrera'] = clasificacion.top(5, perfil.carrera_id)
+                context['mi_posicion_carrera'], context['total_clasificados_carrera'] = clasificacion.posicion(
+                    perfil.pk, perfil.puntos, perfil.carrera_id
+                )
+            context['recomendados'] = recomendaciones.para_perfil(perfil.pk)
             
             # Recuperar misiones diarias del usuario para hoy
-            today_date = date.today()
+            today_date = timezone.localdate()
             context['misiones_diarias'] = MisionDiariaUsuario.objects.filter(
                 perfil=user.perfil,
                 fecha_asignacion=today_date
             ).select_related('mision').order_by('completada', 'mision__nombre')
 
-            # Recuperar historial de visitas (últimos 5 recursos únicos)
-            all_visits = HistorialVisitas.objects.filter(
+            # Recuperar historial de visitas (últimos 6 recursos únicos), servido
+            # por el índice (perfil, -fecha_visita) de UltimaVisita
+            context['historial_visitas'] = UltimaVisita.objects.filter(
                 perfil=user.perfil
-            ).select_related('recurso').order_by('-fecha_visita')
-            
-            unique_visited_recursos = []
-            seen_recurso_ids = set()
-
-            for visit in all_visits:
-                if visit.recurso.id not in seen_recurso_ids:
-                    unique_visited_recursos.append(visit)
-                    seen_recurso_ids.add(visit.recurso.id)
-                    if len(unique_visited_recursos) >= 6:
-                        break
-            
-            context['historial_visitas'] = unique_visited_recursos
+            ).select_related('recurso').order_by('-fecha_visita')[:6]
 
-        if user.is_superuser or user.groups.filter(name='Gestor de Contenido').exists():
+        if user.is_superuser or roles.en_grupo(user, 'Gestor de Contenido'):
             context['dashboard_type'] = 'admin_gestor'
             context['recursos_pendientes'] = Recurso.objects.filter(estado=Recurso.ESTADO_PENDIENTE).count()
             context['carreras_con_recursos'] = Carrera.objects.annotate(num_recursos=Count('recursos')).filter(num_recursos__gt=0).order_by('-num_recursos')[:6]
 
-        elif user.groups.filter(name='Docente').exists():
+        elif roles.en_grupo(user, 'Docente'):
             context['dashboard_type'] = 'docente'
             context['mis_sugerencias_pendientes'] = Recurso.objects.filter(
                 sugerido_por=user, 
@@ -177,11 +156,15 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             
         return context
 
-class CareerListView(LoginRequiredMixin, ListView):
+class CareerListView(LoginRequiredMixin, GetCondicionalMixin, ListView):
     model = Carrera
     template_name = 'recursos/career_list.html'
     context_object_name = 'carreras'
 
+    def partes_etag(self):
+        # Las carreras solo cambian con la versión global (ver condicional.py)
+        return []
+
 # Nueva vista para mostrar los tipos de recursos de una carrera
 class ResourceTypeListView(LoginRequiredMixin, TemplateView):
     template_name = 'recursos/resource_type_list.html'
@@ -221,62 +204,37 @@ class ResourceTypeListView(LoginRequiredMixin, TemplateView):
         context['tipos_de_recurso'] = tipos_metadata
         return context
 
-from django.db.models import Q, Avg, Value, Exists, OuterRef
-from django.db.models.functions import Coalesce
 
 # ... (el resto de las importaciones se mantienen igual)
 # ... (el resto de las vistas se mantienen igual hasta ResourceListView)
 
 # Vista modificada para listar los recursos filtrados por tipo, con búsqueda y ordenamiento
-class ResourceListView(LoginRequiredMixin, ListView):
+class ResourceListView(LoginRequiredMixin, GetCondicionalMixin, PaginacionCursorMixin, ListView):
     model = Recurso
     template_name = 'recursos/resource_list.html'
+    template_fragmento = 'recursos/_resource_cards.html'
     context_object_name = 'recursos'
-    paginate_by = 9 # Opcional: para paginar los resultados
+    paginate_by = 9 # Por cursor ("Cargar más"); con ?page=N, paginación clásica
 
     def get_queryset(self):
         # Parámetros de la URL
-        query = self.request.GET.get('q')
+        query = self.request.GET.get('q', '')
         sort_by = self.request.GET.get('sort', 'recientes')
         user = self.request.user
 
-        # 1. Anotación base para la calificación promedio
-        queryset = Recurso.objects.filter(
-            carreras__id=self.kwargs['pk'],
-            tipo=self.kwargs['tipo'],
-            estado=Recurso.ESTADO_APROBADO
-        ).annotate(
-            avg_rating=Coalesce(Avg('valoraciones__puntuacion'), Value(0.0))
-        )
+        # Páginas keyset: las comunes a todos los usuarios se cachean por
+        # carrera con versión y los favoritos del usuario van primero (ver listados.py)
+        perfil_id = user.perfil.pk if user.is_authenticated and hasattr(user, 'perfil') else None
+        return listados.ListadoRecursos(self.kwargs['pk'], self.kwargs['tipo'], sort_by, query, perfil_id)
 
-        # 2. Lógica de Búsqueda
-        if query:
-            queryset = queryset.filter(
-                Q(nombre__icontains=query) | Q(descripcion__icontains=query)
-            )
+    def pagina_por_cursor(self, queryset, cursor, tamano):
+        return queryset.pagina_despues_de(cursor, tamano)
 
-        # 3. Lógica de Ordenamiento con Prioridad para Favoritos
-        if user.is_authenticated and hasattr(user, 'perfil'):
-            # Anotar si el recurso es favorito para el usuario actual
-            favoritos_del_usuario = user.perfil.recursos_favoritos.all()
-            queryset = queryset.annotate(
-                is_favorite=Exists(favoritos_del_usuario.filter(pk=OuterRef('pk')))
-            )
-            
-            # Ordenar por favoritos primero, luego por el criterio seleccionado
-            if sort_by == 'valorados':
-                queryset = queryset.order_by('-is_favorite', '-avg_rating', '-fecha_creacion')
-            else: # 'recientes' o cualquier otro valor
-                queryset = queryset.order_by('-is_favorite', '-fecha_creacion')
-        else:
-            # Ordenamiento original si el usuario no está logueado o no tiene perfil
-            if sort_by == 'valorados':
-                queryset = queryset.order_by('-avg_rating', '-fecha_creacion')
-            else:
-                queryset = queryset.order_by('-fecha_creacion')
+    def partes_etag(self):
+        # La versión de la carrera cambia con sus recursos, sus valoraciones y
+        # las puntuaciones de tendencia; la ruta incluye búsqueda, orden y página
+        return [listados.version_carrera(self.kwargs['pk']), self.request.get_full_path()]
 
-        return queryset.distinct()
-        
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         # Pasamos la carrera y el tipo de recurso para usarlos en el template
@@ -287,17 +245,12 @@ class ResourceListView(LoginRequiredMixin, ListView):
         # Pasamos los parámetros de búsqueda al contexto para mantener su estado en el template
         context['q'] = self.request.GET.get('q', '')
         context['sort'] = self.request.GET.get('sort', 'recientes')
-        
-        # Añadimos los IDs de los recursos favoritos del usuario para la lógica del frontend
-        if self.request.user.is_authenticated and hasattr(self.request.user, 'perfil'):
-            context['favorite_resource_ids'] = list(self.request.user.perfil.recursos_favoritos.values_list('id', flat=True))
-        else:
-            context['favorite_resource_ids'] = []
-            
+        # El estado de favorito de cada tarjeta ya viene en recurso.is_favorite
+        # (y /recursos/favoritos/estado/ lo refresca en el navegador)
         return context
 
 # Vista de detalle del recurso con comentarios y formulario
-class ResourceDetailView(LoginRequiredMixin, FormMixin, DetailView):
+class ResourceDetailView(LoginRequiredMixin, GetCondicionalMixin, FormMixin, DetailView):
     model = Recurso
     template_name = 'recursos/resource_detail.html'
     context_object_name = 'recurso'
@@ -306,53 +259,77 @@ class ResourceDetailView(LoginRequiredMixin, FormMixin, DetailView):
     def get_success_url(self):
         return reverse('recursos:resource_detail', kwargs={'pk': self.object.pk})
 
+    def get(self, request, *args, **kwargs):
+        # --- Lógica de Gamificación: Completar misión "Visitar un Recurso" ---
+        # Se difiere hasta después de enviar la respuesta (el GET no espera a la
+        # escritura) y solo la primera visita del día llega a la base de datos.
+        # Va antes del GET condicional para contar también los 304.
+        _completar_mision_visita(visitas.perfil_id_de(request.user), diferida=True)
+        return super().get(request, *args, **kwargs)
+
+    def get_perfil(self):
+        """
+        Perfil del usuario con su carrera, en una consulta. Se deja en
+        ``request.user.perfil`` para que el menú lateral no vuelva a pedirlos.
+        """
+        if not hasattr(self, '_perfil'):
+            user = self.request.user
+            self._perfil = Perfil.objects.select_related('carrera').filter(user_id=user.pk).first()
+            if self._perfil is not None:
+                user.perfil = self._perfil
+        return self._perfil
+
+    def get_queryset(self):
+        # Una consulta: el recurso, quién lo sugirió, si es favorito del usuario
+        # y si ya lo valoró (su valoración puede no estar en la primera página)
+        perfil = self.get_perfil()
+        es_favorito = Value(False)
+        if perfil is not None:
+            es_favorito = Exists(Perfil.recursos_favoritos.through.objects.filter(
+                perfil_id=perfil.pk, recurso_id=OuterRef('pk')
+            ))
+        ya_valorado = Exists(Valoracion.objects.filter(recurso_id=OuterRef('pk'), user_id=self.request.user.pk))
+        return Recurso.objects.select_related('sugerido_por').annotate(es_favorito=es_favorito, ya_valorado=ya_valorado)
+
+    def partes_etag(self):
+        # Las valoraciones no se editan: las altas mueven la última fecha y las
+        # bajas el contador. Una sola consulta por el índice (recurso, -fecha_creacion).
+        ultima_valoracion = Valoracion.objects.filter(recurso=OuterRef('pk')).order_by('-fecha_creacion')
+        fila = Recurso.objects.filter(pk=self.kwargs['pk']).annotate(
+            ultima_valoracion=Subquery(ultima_valoracion.values('fecha_creacion')[:1])
+        ).values_list('fecha_actualizacion', 'ultima_valoracion', 'num_valoraciones').first()
+        if fila is None:
+            return None  # La vista completa responde 404
+        fecha_actualizacion, ultima_valoracion, num_valoraciones = fila
+        self._ultima_modificacion = max(filter(None, (fecha_actualizacion, ultima_valoracion)))
+        return [fecha_actualizacion, ultima_valoracion, num_valoraciones, recomendaciones.version()]
+
+    def ultima_modificacion(self):
+        return self._ultima_modificacion
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        recurso = self.get_object()
+        recurso = self.object
 
-        # --- Lógica de Gamificación: Completar misión "Visitar un Recurso" ---
-        if self.request.user.is_authenticated and hasattr(self.request.user, 'perfil'):
-            from django.utils import timezone
-            user_profile = self.request.user.perfil
-            today_date = date.today()
-
-            visitar_mision_user = MisionDiariaUsuario.objects.filter(
-                perfil=user_profile,
-                fecha_asignacion=today_date,
-                mision__key='visitar_recurso',
-                completada=False
-            ).first()
-
-            if visitar_mision_user:
-                visitar_mision_user.completada = True
-                visitar_mision_user.fecha_completado = timezone.now()
-                visitar_mision_user.save()
-                user_profile.puntos += visitar_mision_user.mision.puntos_recompensa
-                user_profile.save()
-        # --- Fin Lógica de Gamificación ---
-        
-        # Obtenemos valoraciones y calculamos el promedio
-        valoraciones = recurso.valoraciones.all()
+        # Solo la primera página de valoraciones, con sus usuarios en la misma
+        # consulta; el resto se pide a ValoracionesRecursoView al hacer scroll.
+        # El promedio y el número vienen de los contadores del recurso
+        valoraciones, clave_siguiente = paginacion.pagina_por_fecha(
+            ValoracionesRecursoView.consulta(recurso.pk), None, ValoracionesRecursoView.paginate_by
+        )
         context['valoraciones'] = valoraciones
-        context['average_rating'] = valoraciones.aggregate(Avg('puntuacion'))['puntuacion__avg']
+        if clave_siguiente is not None:
+            context['url_mas_valoraciones'] = '{}?{}'.format(
+                reverse('recursos:valoraciones_recurso', kwargs={'pk': recurso.pk}),
+                urlencode({'cursor': paginacion.codificar_cursor(clave_siguiente)}),
+            )
+        context['average_rating'] = recurso.promedio_valoraciones
 
-        # Comprobamos si el usuario ya ha valorado este recurso
-        user_has_commented = False
-        if self.request.user.is_authenticated:
-            user_has_commented = valoraciones.filter(user=self.request.user).exists()
-        
-        context['user_has_commented'] = user_has_commented
-        
-        # Lógica para verificar si el recurso es favorito para el usuario actual
-        if self.request.user.is_authenticated and hasattr(self.request.user, 'perfil'):
-            context['is_favorited'] = self.request.user.perfil.recursos_favoritos.filter(pk=recurso.pk).exists()
-        else:
-            context['is_favorited'] = False
+        context['user_has_commented'] = recurso.ya_valorado
+        context['is_favorited'] = recurso.es_favorito
 
-        # Añadimos el formulario al contexto si el usuario no ha comentado
-        if not user_has_commented:
-            context['form'] = self.get_form()
-            
+        # Vecinos precalculados por calcular_recomendaciones (ver recomendaciones.py)
+        context['similares'] = recomendaciones.similares(recurso.pk)
         return context
 
     def post(self, request, *args, **kwargs):
@@ -379,6 +356,33 @@ class ResourceDetailView(LoginRequiredMixin, FormMixin, DetailView):
         valoracion.save()
         return super().form_valid(form)
 
+class ValoracionesRecursoView(LoginRequiredMixin, PaginacionCursorMixin, ListView):
+    """
+    Fragmento HTML con una página de valoraciones de un recurso, de la más
+    reciente a la más antigua. Lo pide resource_detail.html al llegar al final
+    de la lista; cada fragmento trae la URL de la página siguiente.
+    """
+    template_name = 'recursos/_valoraciones.html'
+    template_fragmento = 'recursos/_valoraciones.html'
+    context_object_name = 'valoraciones'
+    paginate_by = 10
+
+    @staticmethod
+    def consulta(recurso_id):
+        # Keyset sobre (fecha_creacion, id) por el índice valoracion_recurso_fecha;
+        # el nombre de quien valoró sale en la misma consulta
+        return (
+            Valoracion.objects.filter(recurso_id=recurso_id).select_related('user')
+            .order_by('-fecha_creacion', '-id')
+        )
+
+    def get_queryset(self):
+        return self.consulta(self.kwargs['pk'])
+
+    def pagina_por_cursor(self, queryset, cursor, tamano):
+        return paginacion.pagina_por_fecha(queryset, cursor, tamano)
+
+
 @login_required
 @require_POST
 def agregar_valoracion_ajax(request, pk):
@@ -396,29 +400,15 @@ def agregar_valoracion_ajax(request, pk):
         valoracion.save()
 
         # --- Lógica de Gamificación: Completar misión "Valorar un Recurso" ---
-        user_profile = request.user.perfil
-        today_date = date.today()
-
-        valorar_mision_user = MisionDiariaUsuario.objects.filter(
-            perfil=user_profile,
-            fecha_asignacion=today_date,
-            mision__key='valorar_recurso',
-            completada=False
-        ).first()
-
-        if valorar_mision_user:
-            valorar_mision_user.completada = True
-            valorar_mision_user.fecha_completado = datetime.now()
-            valorar_mision_user.save()
-            user_profile.puntos += valorar_mision_user.mision.puntos_recompensa
-            user_profile.save()
+        misiones.completar_mision(visitas.perfil_id_de(request.user), 'valorar_recurso')
         # --- Fin Lógica de Gamificación ---
 
-        # Después de guardar, recalculamos las estadísticas
-        stats = recurso.valoraciones.aggregate(
-            new_avg_rating=Avg('puntuacion'),
-            new_rating_count=Count('id')
-        )
+        # Después de guardar, leemos los contadores ya actualizados por la señal
+        recurso.refresh_from_db(fields=['num_valoraciones', 'suma_puntuaciones'])
+        stats = {
+            'new_avg_rating': recurso.promedio_valoraciones,
+            'new_rating_count': recurso.num_valoraciones,
+        }
 
         data = {
             'status': 'success',
@@ -433,19 +423,24 @@ def agregar_valoracion_ajax(request, pk):
     else:
         return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
 
-class FavoriteResourceListView(LoginRequiredMixin, ListView):
+class FavoriteResourceListView(LoginRequiredMixin, PaginacionCursorMixin, ListView):
     model = Recurso
     template_name = 'recursos/favorite_resources_list.html'
+    template_fragmento = 'recursos/_favorite_cards.html'
     context_object_name = 'recursos_favoritos'
-    paginate_by = 9 # Opcional: para paginar los resultados
+    paginate_by = 9 # Por cursor ("Cargar más"); con ?page=N, paginación clásica
 
     def get_queryset(self):
         # Asegurarse de que el usuario tenga un perfil antes de intentar acceder a los favoritos
         if hasattr(self.request.user, 'perfil'):
             # Devolver los recursos favoritos del perfil del usuario actual
-            return self.request.user.perfil.recursos_favoritos.all().order_by('-fecha_creacion')
+            return self.request.user.perfil.recursos_favoritos.all().order_by('-fecha_creacion', '-id')
         return Recurso.objects.none() # Si no hay perfil, devolver un queryset vacío
 
+    def pagina_por_cursor(self, queryset, cursor, tamano):
+        # Keyset sobre (fecha_creacion, id): sin OFFSET ni COUNT(*)
+        return paginacion.pagina_por_fecha(queryset, cursor, tamano)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['page_title'] = 'Mis Recursos Favoritos'
@@ -456,80 +451,186 @@ class FavoriteResourceListView(LoginRequiredMixin, ListView):
 @require_POST
 def marcar_visita_recurso_ajax(request, pk):
     """
-    Marca la misión 'visitar_recurso' como completada y registra la visita
-    en el historial del usuario.
+    Registra la visita en el buffer del historial (ver visitas.py) y marca la
+    misión 'visitar_recurso' como completada. Tras la primera visita del día
+    solo se consulta que el recurso exista.
     """
-    recurso = get_object_or_404(Recurso, pk=pk)
-    if hasattr(request.user, 'perfil'):
-        user_profile = request.user.perfil
-        
-        # --- Registrar en el historial de visitas ---
-        from .models import HistorialVisitas
-        HistorialVisitas.objects.create(perfil=user_profile, recurso=recurso)
-        
-        # --- Lógica de Gamificación ---
-        today_date = date.today()
-
-        visitar_mision_user = MisionDiariaUsuario.objects.filter(
-            perfil=user_profile,
-            fecha_asignacion=today_date,
-            mision__key='visitar_recurso',
-            completada=False
-        ).first()
-
-        if visitar_mision_user:
-            visitar_mision_user.completada = True
-            visitar_mision_user.fecha_completado = datetime.now()
-            visitar_mision_user.save()
-            user_profile.puntos += visitar_mision_user.mision.puntos_recompensa
-            user_profile.save()
+    if not Recurso.objects.filter(pk=pk).exists():
+        return JsonResponse({'status': 'error', 'message': 'El recurso no existe.'}, status=404)
+    perfil_id = visitas.perfil_id_de(request.user)
+    if perfil_id:
+        visitas.registrar_visita(perfil_id, pk)
+        if _completar_mision_visita(perfil_id):
             return JsonResponse({'status': 'success', 'message': 'Misión completada y visita registrada.'})
 
     return JsonResponse({'status': 'success', 'message': 'Visita registrada.'})
 
 
+MAX_VISITAS_POR_LOTE = 100
+CLAVE_MISION_VISITA = 'mision:visitar_recurso:{perfil_id}:{fecha}'
+
 @login_required
 @require_POST
-def toggle_favorite_resource(request, pk):
-    recurso = get_object_or_404(Recurso, pk=pk)
-
-    if not hasattr(request.user, 'perfil'):
+def marcar_visitas_lote_ajax(request):
+    """
+    Registra varias visitas en una sola petición. Espera un cuerpo JSON:
+    {"visitas": [{"recurso": 12, "fecha": "2026-03-01T10:15:00-05:00"}, ...]}
+    La fecha es opcional; si falta, es inválida o futura se usa la actual, y
+    si es anterior a VISITAS_ANTIGUEDAD_MAXIMA se lleva a ese límite, para que
+    un cliente no pueda inventar visitas antiguas (pesan en el historial y en
+    las tendencias). Las visitas a recursos que no existen se descartan.
+    """
+    try:
+        eventos = json.loads(request.body or b'{}').get('visitas', [])
+        if not isinstance(eventos, list):
+            raise ValueError
+        ahora = timezone.now()
+        minima = ahora - timedelta(seconds=getattr(settings, 'VISITAS_ANTIGUEDAD_MAXIMA', 15 * 60))
+        visitas_validas = []
+        for evento in eventos[:MAX_VISITAS_POR_LOTE]:
+            fecha = parse_datetime(str(evento.get('fecha') or ''))
+            if fecha is not None and timezone.is_naive(fecha):
+                fecha = timezone.make_aware(fecha)
+            if fecha is None or fecha > ahora:
+                fecha = ahora
+            visitas_validas.append((int(evento['recurso']), max(fecha, minima)))
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Formato de visitas inválido.'}, status=400)
+
+    existentes = set(
+        Recurso.objects.filter(pk__in={recurso_id for recurso_id, _ in visitas_validas}).values_list('pk', flat=True)
+    )
+    visitas_validas = [(recurso_id, fecha) for recurso_id, fecha in visitas_validas if recurso_id in existentes]
+
+    perfil_id = visitas.perfil_id_de(request.user)
+    if not perfil_id:
         return JsonResponse({'status': 'error', 'message': 'El usuario no tiene un perfil asociado.'}, status=400)
 
-    user_profile = request.user.perfil
+    visitas.registrar_visitas(perfil_id, visitas_validas)
+    mision_completada = bool(visitas_validas) and _completar_mision_visita(perfil_id)
+    return JsonResponse({
+        'status': 'success',
+        'registradas': len(visitas_validas),
+        'mision_completada': mision_completada,
+    })
+
 
-    if recurso in user_profile.recursos_favoritos.all():
-        user_profile.recursos_favoritos.remove(recurso)
-        is_favorited = False
-        message = 'Recurso eliminado de favoritos.'
-    else:
-        user_profile.recursos_favoritos.add(recurso)
-        is_favorited = True
-        message = 'Recurso añadido a favoritos.'
+def _completar_mision_visita(perfil_id, diferida=False):
+    """
+    Completa la misión 'visitar_recurso' de hoy si está pendiente. El intento
+    se recuerda en caché hasta el final del día para no volver a consultarlo,
+    pero solo cuando se ejecutó: si el completado diferido falla, la
+    siguiente visita lo reintenta.
+    Con ``diferida`` la escritura se hace después de enviar la respuesta.
+    """
+    if not perfil_id:
+        return False
+    clave = CLAVE_MISION_VISITA.format(perfil_id=perfil_id, fecha=timezone.localdate().isoformat())
+    if cache.get(clave):
+        return False
+
+    puntos = misiones.completar_mision(
+        perfil_id, 'visitar_recurso', diferida=diferida,
+        al_terminar=lambda puntos: cache.set(clave, True, 60 * 60 * 24),
+    )
+    return bool(puntos)
+
+
+@login_required
+@require_POST
+def toggle_favorite_resource(request, pk):
+    """
+    Añade o quita un recurso de favoritos. Sin cuerpo alterna el estado; con
+    {"favorito": true} o {"favorito": false} lo fija, y repetir la petición
+    no cambia nada. Solo se toca la fila de la tabla intermedia (índice único
+    perfil + recurso), sin cargar los favoritos del perfil.
+    """
+    perfil_id = visitas.perfil_id_de(request.user)
+    if not perfil_id:
+        return JsonResponse({'status': 'error', 'message': 'El usuario no tiene un perfil asociado.'}, status=400)
+
+    try:
+        is_favorited = json.loads(request.body or b'{}').get('favorito')
+    except (ValueError, AttributeError):
+        is_favorited = None
+    if is_favorited is not None and not isinstance(is_favorited, bool):
+        return JsonResponse({'status': 'error', 'message': 'El campo "favorito" debe ser true o false.'}, status=400)
+
+    Favorito = Perfil.recursos_favoritos.through
+    fila = Favorito.objects.filter(perfil_id=perfil_id, recurso_id=pk)
+    if is_favorited is None:
+        # Alternar: si había fila se borra; si no, se añade
+        is_favorited = not fila.delete()[0]
+    elif not is_favorited:
+        fila.delete()
+    if is_favorited:
+        if not Recurso.objects.filter(pk=pk).exists():
+            return JsonResponse({'status': 'error', 'message': 'El recurso no existe.'}, status=404)
+        Favorito.objects.bulk_create([Favorito(perfil_id=perfil_id, recurso_id=pk)], ignore_conflicts=True)
+    # Escribir en la tabla intermedia no dispara m2m_changed (ver condicional.py)
+    condicional.invalidar_usuario(request.user.pk)
 
     return JsonResponse({
         'status': 'success',
         'is_favorited': is_favorited,
-        'message': message
+        'message': 'Recurso añadido a favoritos.' if is_favorited else 'Recurso eliminado de favoritos.',
     })
 
-from django.http import HttpResponse
-from django.conf import settings
+
+MAX_FAVORITOS_POR_CONSULTA = 100
+
+@login_required
+@require_GET
+def estado_favoritos_ajax(request):
+    """
+    Estado de favorito de varios recursos con una sola consulta:
+    ?ids=3,8,15 -> {"status": "success", "favoritos": {"3": true, "8": false, "15": true}}
+    """
+    try:
+        ids = {int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip()}
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Lista de recursos inválida.'}, status=400)
+    if len(ids) > MAX_FAVORITOS_POR_CONSULTA:
+        return JsonResponse({
+            'status': 'error', 'message': f'Como máximo {MAX_FAVORITOS_POR_CONSULTA} recursos por consulta.',
+        }, status=400)
+
+    perfil_id = visitas.perfil_id_de(request.user)
+    favoritos = set()
+    if perfil_id and ids:
+        favoritos = set(
+            Perfil.recursos_favoritos.through.objects.filter(perfil_id=perfil_id, recurso_id__in=ids)
+            .values_list('recurso_id', flat=True)
+        )
+    return JsonResponse({'status': 'success', 'favoritos': {str(pk): pk in favoritos for pk in sorted(ids)}})
+
+from django.http import HttpResponse, StreamingHttpResponse
 from django.contrib.admin.views.decorators import staff_member_required
 
 @staff_member_required
-def debug_log_view(request):
+def visor_registros(request):
     """
-    Una vista temporal para depuración en producción.
-    Muestra el contenido del archivo de log.
-    ¡¡¡ELIMINAR DESPUÉS DE LA DEPURACIÓN!!!
+    Muestra el final del log en texto plano, en streaming y con memoria acotada
+    (ver registros.py). Parámetros opcionales:
+    - desde: posición devuelta en la cabecera X-Log-Siguiente de la lectura
+      anterior, para leer solo lo nuevo (sigue las rotaciones que hace logrotate).
+    - bytes: cuántos bytes del final leer si no hay ``desde`` (64 KB por defecto).
+    - nivel: nivel mínimo (DEBUG, INFO, WARNING, ERROR, CRITICAL).
+    - contiene: texto que debe aparecer en la entrada (sin distinguir mayúsculas).
     """
-    log_file_path = settings.BASE_DIR / 'django_errors.log'
     try:
-        with open(log_file_path, 'r') as f:
-            log_content = f.read()
-        return HttpResponse(log_content, content_type='text/plain; charset=utf-8')
-    except FileNotFoundError:
-        return HttpResponse("El archivo de log 'django_errors.log' no se ha creado todavía. Provoca el error 500 primero.", content_type='text/plain; charset=utf-8')
-    except Exception as e:
-        return HttpResponse(f"Error al leer el archivo de log: {e}", content_type='text/plain; charset=utf-8')
+        cola = min(int(request.GET.get('bytes', registros.COLA_POR_DEFECTO)), 50 * 1024 * 1024)
+    except ValueError:
+        cola = registros.COLA_POR_DEFECTO
+    siguiente, entradas = registros.leer(
+        desde=request.GET.get('desde'),
+        nivel=request.GET.get('nivel'),
+        contiene=request.GET.get('contiene'),
+        cola=max(cola, 0),
+    )
+    if siguiente is None:
+        return HttpResponse("El archivo de log todavía no existe.", content_type='text/plain; charset=utf-8')
+    response = StreamingHttpResponse(entradas, content_type='text/plain; charset=utf-8')
+    response['X-Log-Siguiente'] = siguiente
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,192 @@
+# portal_uteq/recursos/visitas.py
+"""
+Ingesta en lotes del historial de visitas.
+
+Las vistas no insertan en HistorialVisitas directamente: añaden el evento a un
+buffer guardado en la caché compartida (Redis) y este se vuelca con bulk_create
+cuando alcanza VISITAS_BUFFER_TAMANO eventos o cuando, al llegar otro evento,
+el más antiguo supera VISITAS_BUFFER_INTERVALO segundos; en el mismo volcado se
+actualiza UltimaVisita (una fila por perfil y recurso).
+
+Como el buffer vive en Redis y no en el worker, un worker que muere (SIGKILL,
+falta de memoria) no se lleva los eventos: los vuelca la siguiente petición o
+el comando ``vaciar_visitas --cada N``, que conviene tener corriendo para que
+el buffer no espere a otro clic. El gancho atexit solo adelanta ese volcado.
+
+Sin caché compartida las visitas se insertan al momento (ver compartida.py).
+"""
+import atexit
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import compartida
+
+logger = logging.getLogger(__name__)
+
+CLAVE_BUFFER = 'visitas:buffer'
+CLAVE_BLOQUEO = 'visitas:buffer:bloqueo'
+CLAVE_PERFIL = 'visitas:perfil:{user_id}'
+
+BLOQUEO_TIMEOUT = 5
+BLOQUEO_REINTENTOS = 50
+
+
+def _tamano_maximo():
+    return getattr(settings, 'VISITAS_BUFFER_TAMANO', 100)
+
+
+def _intervalo_maximo():
+    return getattr(settings, 'VISITAS_BUFFER_INTERVALO', 30)
+
+
+class _Bloqueo:
+    """Cerrojo simple sobre la caché basado en cache.add (atómico)."""
+
+    def __init__(self):
+        self.token = uuid.uuid4().hex
+        self.adquirido = False
+
+    def __enter__(self):
+        for _ in range(BLOQUEO_REINTENTOS):
+            if cache.add(CLAVE_BLOQUEO, self.token, BLOQUEO_TIMEOUT):
+                self.adquirido = True
+                break
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        if self.adquirido and cache.get(CLAVE_BLOQUEO) == self.token:
+            cache.delete(CLAVE_BLOQUEO)
+
+
+def perfil_id_de(user):
+    """
+    Devuelve el id del Perfil del usuario (o None) sin consultar la base de
+    datos en cada clic.
+    """
+    clave = CLAVE_PERFIL.format(user_id=user.pk)
+    perfil_id = cache.get(clave)
+    if perfil_id is None:
+        from .models import Perfil
+        perfil_id = Perfil.objects.filter(user_id=user.pk).values_list('pk', flat=True).first() or 0
+        cache.set(clave, perfil_id, 60 * 60)
+    return perfil_id or None
+
+
+def registrar_visitas(perfil_id, eventos):
+    """
+    Añade visitas al buffer. ``eventos`` es una lista de tuplas
+    (recurso_id, fecha_visita). Si el buffer está lleno o es antiguo, se vuelca.
+    """
+    if not eventos:
+        return
+    filas = [(perfil_id, recurso_id, fecha or timezone.now()) for recurso_id, fecha in eventos]
+    if not compartida.cache_compartida():
+        _insertar(filas)
+        return
+
+    with _Bloqueo() as bloqueo:
+        if not bloqueo.adquirido:
+            # Sin cerrojo no arriesgamos perder eventos: se escriben directamente
+            _insertar(filas)
+            return
+        buffer = cache.get(CLAVE_BUFFER) or {'desde': time.time(), 'filas': []}
+        buffer['filas'].extend(filas)
+        lleno = (
+            len(buffer['filas']) >= _tamano_maximo()
+            or time.time() - buffer['desde'] >= _intervalo_maximo()
+        )
+        if lleno:
+            cache.delete(CLAVE_BUFFER)
+        else:
+            cache.set(CLAVE_BUFFER, buffer, None)
+
+    if lleno:
+        _insertar(buffer['filas'])
+
+
+def registrar_visita(perfil_id, recurso_id, fecha=None):
+    registrar_visitas(perfil_id, [(recurso_id, fecha)])
+
+
+def vaciar_buffer():
+    """Vuelca todos los eventos pendientes. Devuelve cuántas filas se insertaron."""
+    with _Bloqueo() as bloqueo:
+        if not bloqueo.adquirido:
+            return 0
+        buffer = cache.get(CLAVE_BUFFER)
+        cache.delete(CLAVE_BUFFER)
+    if not buffer:
+        return 0
+    return _insertar(buffer['filas'])
+
+
+def _insertar(filas):
+    from .models import HistorialVisitas, Perfil, Recurso, UltimaVisita
+
+    # Descartamos eventos de recursos o perfiles borrados mientras esperaban,
+    # para que una sola fila inválida no haga fallar todo el lote.
+    recursos_validos = set(Recurso.objects.filter(pk__in={f[1] for f in filas}).values_list('pk', flat=True))
+    perfiles_validos = set(Perfil.objects.filter(pk__in={f[0] for f in filas}).values_list('pk', flat=True))
+    visitas = [
+        HistorialVisitas(perfil_id=perfil_id, recurso_id=recurso_id, fecha_visita=fecha)
+        for perfil_id, recurso_id, fecha in filas
+        if perfil_id in perfiles_validos and recurso_id in recursos_validos
+    ]
+    # Upsert de la última visita por (perfil, recurso), quedándonos con la más
+    # reciente de cada par dentro del lote.
+    ultimas = {}
+    for visita in visitas:
+        par = (visita.perfil_id, visita.recurso_id)
+        if par not in ultimas or visita.fecha_visita > ultimas[par].fecha_visita:
+            ultimas[par] = UltimaVisita(perfil_id=par[0], recurso_id=par[1], fecha_visita=visita.fecha_visita)
+
+    with transaction.atomic():
+        HistorialVisitas.objects.bulk_create(visitas, batch_size=500)
+        _actualizar_ultimas(list(ultimas.values()))
+    return len(visitas)
+
+
+def _actualizar_ultimas(ultimas):
+    """
+    Upsert de UltimaVisita que solo avanza la fecha: un evento que llega tarde
+    (un buffer volcado después, una fecha del cliente) no puede sustituir a
+    una visita posterior ya guardada.
+    """
+    from .models import UltimaVisita
+
+    if not ultimas:
+        return
+    if connection.vendor in ('sqlite', 'postgresql'):
+        tabla = connection.ops.quote_name(UltimaVisita._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {tabla} (perfil_id, recurso_id, fecha_visita) VALUES (%s, %s, %s) "
+                "ON CONFLICT (perfil_id, recurso_id) DO UPDATE SET fecha_visita = excluded.fecha_visita "
+                f"WHERE {tabla}.fecha_visita < excluded.fecha_visita",
+                [
+                    (ultima.perfil_id, ultima.recurso_id, connection.ops.adapt_datetimefield_value(ultima.fecha_visita))
+                    for ultima in ultimas
+                ],
+            )
+        return
+    # Otros motores: se insertan los pares nuevos y se avanzan los existentes
+    UltimaVisita.objects.bulk_create(ultimas, batch_size=500, ignore_conflicts=True)
+    for ultima in ultimas:
+        UltimaVisita.objects.filter(
+            perfil_id=ultima.perfil_id, recurso_id=ultima.recurso_id, fecha_visita__lt=ultima.fecha_visita,
+        ).update(fecha_visita=ultima.fecha_visita)
+
+
+@atexit.register
+def _vaciar_al_salir():
+    try:
+        vaciar_buffer()
+    except Exception:
+        logger.exception("No se pudo vaciar el buffer de visitas al salir")
@@ -46,6 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primero, para medir también al resto de middleware. Sin PERFILADO_ACTIVO
+    # se retira solo de la cadena (ver recursos/perfilado.py).
+    'portal_uteq.recursos.perfilado.PerfiladoMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -158,25 +161,118 @@ CLOUDINARY_STORAGE = {
 }
 # DEFAULT_FILE_STORAGE está obsoleto desde Django 4.2, se configura dentro de STORAGES.
 
+# Caché. Con varios procesos (gunicorn) tiene que ser compartida: con
+# REDIS_URL se usa Redis. Sin ella, cada proceso tiene su LocMemCache y las
+# sesiones, el buffer de visitas y las versiones de ETag, roles y listados
+# pasan a un modo seguro (ver recursos/compartida.py): sesiones solo en la base
+# de datos, visitas sin buffer y datos cacheados que caducan a los
+# CACHE_LOCAL_TIMEOUT segundos. CACHE_COMPARTIDA=true/false fuerza la detección.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+CACHE_COMPARTIDA = {'true': True, 'false': False}.get(os.environ.get('CACHE_COMPARTIDA', '').lower())
+CACHE_LOCAL_TIMEOUT = int(os.environ.get('CACHE_LOCAL_TIMEOUT', 30))
+
 # Configuraci�n de Timeout de Sesi�n por Inactividad
 SESSION_COOKIE_AGE = 1800  # 30 minutos en segundos
 SESSION_SAVE_EVERY_REQUEST = True
+# La caducidad sigue deslizándose en cada petición, pero la sesión se sirve
+# desde la caché y la fila de django_session solo se reescribe si cambian los
+# datos o ha pasado esta fracción de SESSION_COOKIE_AGE (ver recursos/sesiones.py).
+SESSION_ENGINE = 'portal_uteq.recursos.sesiones'
+SESION_FRACCION_ESCRITURA = float(os.environ.get('SESION_FRACCION_ESCRITURA', 0.1))
+
+# Buffer del historial de visitas (ver recursos/visitas.py): se vuelca a la
+# base de datos al llegar a este número de eventos o a esta antigüedad (s).
+VISITAS_BUFFER_TAMANO = int(os.environ.get('VISITAS_BUFFER_TAMANO', 100))
+VISITAS_BUFFER_INTERVALO = int(os.environ.get('VISITAS_BUFFER_INTERVALO', 30))
+# Antigüedad máxima (s) que se acepta en la fecha de una visita enviada por el
+# cliente en lote; las más antiguas se registran con esa antigüedad.
+VISITAS_ANTIGUEDAD_MAXIMA = int(os.environ.get('VISITAS_ANTIGUEDAD_MAXIMA', 15 * 60))
+
+# Perfilado de peticiones (ver recursos/perfilado.py): cabecera Server-Timing y
+# volcados de cProfile por muestreo, por umbral de latencia o bajo demanda.
+PERFILADO_ACTIVO = os.environ.get('PERFILADO_ACTIVO', 'False').lower() == 'true'
+PERFILADO_MUESTREO = float(os.environ.get('PERFILADO_MUESTREO', 0))
+PERFILADO_UMBRAL_MS = float(os.environ.get('PERFILADO_UMBRAL_MS', 0))
+PERFILADO_DIRECTORIO = os.environ.get('PERFILADO_DIRECTORIO', BASE_DIR / 'perfiles')
+PERFILADO_MAX_ARCHIVOS = int(os.environ.get('PERFILADO_MAX_ARCHIVOS', 200))
+
+# Bandeja de salida de correo (ver recursos/correo.py): el comando
+# enviar_correos manda CORREO_LOTE correos por conexión SMTP y reintenta los
+# fallidos con espera exponencial desde CORREO_ESPERA_BASE hasta
+# CORREO_ESPERA_MAXIMA segundos, como mucho CORREO_MAX_INTENTOS veces.
+CORREO_LOTE = int(os.environ.get('CORREO_LOTE', 50))
+CORREO_MAX_INTENTOS = int(os.environ.get('CORREO_MAX_INTENTOS', 5))
+CORREO_ESPERA_BASE = int(os.environ.get('CORREO_ESPERA_BASE', 60))
+CORREO_ESPERA_MAXIMA = int(os.environ.get('CORREO_ESPERA_MAXIMA', 60 * 60))
+
+# Procesos para calcular los hashes de las contraseñas en la importación masiva
+# de estudiantes con el comando importar_estudiantes (ver recursos/importacion.py);
+# 0 usa todos los núcleos. El admin usa siempre un solo proceso.
+IMPORTACION_PROCESOS = int(os.environ.get('IMPORTACION_PROCESOS', 0))
+
+# Antigüedad máxima (s) de la clasificación de puntos que cada worker guarda
+# en memoria (ver recursos/clasificacion.py).
+CLASIFICACION_REFRESCO = int(os.environ.get('CLASIFICACION_REFRESCO', 120))
+
+# Órdenes "populares" y "tendencia" del listado (ver recursos/tendencias.py):
+# el peso de cada visita, favorito o valoración se reduce a la mitad cada
+# POPULARIDAD_VIDA_MEDIA_DIAS o TENDENCIA_VIDA_MEDIA_DIAS días.
+POPULARIDAD_VIDA_MEDIA_DIAS = float(os.environ.get('POPULARIDAD_VIDA_MEDIA_DIAS', 30))
+TENDENCIA_VIDA_MEDIA_DIAS = float(os.environ.get('TENDENCIA_VIDA_MEDIA_DIAS', 3))
+
+# Identificador del despliegue (por ejemplo el commit): forma parte de los ETag
+# de las páginas (ver recursos/condicional.py), así que al cambiar las
+# plantillas los navegadores no reutilizan páginas de la versión anterior.
+VERSION_DESPLIEGUE = os.environ.get('VERSION_DESPLIEGUE', '')
+
+# Configuración de Logging para capturar errores en un archivo. Con varios
+# workers de gunicorn escribiendo en el mismo archivo, ninguno lo rota: lo hace
+# logrotate fuera de la aplicación (renombrando, sin copytruncate ni compress
+# inmediato), por ejemplo:
+#
+#     /ruta/django_errors.log { size 10M  rotate 5  nocompress  missingok }
+#
+# WatchedFileHandler detecta el renombrado y cada worker reabre el archivo.
+# LOG_COPIAS es el "rotate" de logrotate: el visor del personal
+# (recursos/registros.py) busca en esas copias (.1, .2...) para seguir la rotación.
+LOG_ARCHIVO = BASE_DIR / 'django_errors.log'
+LOG_COPIAS = int(os.environ.get('LOG_COPIAS', 5))
+LOG_NIVEL = os.environ.get('LOG_NIVEL', 'DEBUG')
 
-# Configuración de Logging para capturar errores en un archivo
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'detallado': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+    },
     'handlers': {
         'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'django_errors.log',
+            'level': LOG_NIVEL,
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': LOG_ARCHIVO,
+            'encoding': 'utf-8',
+            'formatter': 'detallado',
         },
     },
     'loggers': {
         'django': {
             'handlers': ['file'],
-            'level': 'DEBUG',
+            'level': LOG_NIVEL,
             'propagate': True,
         },
     },